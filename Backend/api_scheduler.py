@@ -0,0 +1,245 @@
+import time
+import asyncio
+import threading
+import logging
+
+try:
+    from .telemetry import UPSTREAM_SECONDS, UPSTREAM_WAIT_SECONDS, UPSTREAM_ATTEMPTS, UPSTREAM_CALLS, UPSTREAM_RETRIES
+except ImportError:
+    from telemetry import UPSTREAM_SECONDS, UPSTREAM_WAIT_SECONDS, UPSTREAM_ATTEMPTS, UPSTREAM_CALLS, UPSTREAM_RETRIES
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ApiScheduler")
+
+# Priority lanes: user-facing requests always go before background scanning
+HIGH = 0
+LOW = 1
+
+# Requests/second per endpoint class (Angel One SmartAPI published limits)
+ENDPOINT_LIMITS = {
+    "historical": 3, # getCandleData
+    "ltp": 10, # ltpData
+    "quote": 10, # getMarketData
+}
+
+
+def is_rate_limit_error(err):
+    """SmartAPI reports throttling either as an exception or as a status=False payload."""
+    if isinstance(err, dict):
+        msg = str(err.get("message", "")) if err.get("status") is False else ""
+    else:
+        msg = str(err)
+    msg = msg.lower()
+    return "rate" in msg or "too many requests" in msg
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+
+    def try_take(self, now):
+        """Takes a token if one is available. Returns 0 on success, else seconds until the next token."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self):
+        self.tokens = 0.0
+
+
+class SmartApiScheduler:
+    """
+    Process-wide gate for every SmartAPI call.
+    - a token bucket per endpoint class keeps us under the per-second limits
+    - an AIMD concurrency window grows by ~1 per window of successes and halves on a rate-limit error
+    - HIGH priority callers are admitted before any waiting LOW priority caller
+    - counters for calls, throttling, rate-limit hits, retries and failures
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = SmartApiScheduler()
+        return cls._instance
+
+    def __init__(self, limits=ENDPOINT_LIMITS, max_concurrency=16, min_concurrency=1, initial_concurrency=8):
+        self._cond = threading.Condition()
+        self._buckets = {name: TokenBucket(rate) for name, rate in limits.items()}
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self._window = float(initial_concurrency)
+        self._in_flight = 0
+        self._waiting = [0, 0] # per lane
+        self.counters = {} # endpoint -> {calls, throttled, rate_limited, retries, failures}
+
+    def _count(self, endpoint, key, n=1):
+        with self._cond: # RLock, safe to re-enter from _acquire
+            c = self.counters.setdefault(endpoint, {"calls": 0, "throttled": 0, "rate_limited": 0, "retries": 0, "failures": 0})
+            c[key] += n
+
+    def _admit(self, bucket, priority):
+        """
+        One admission attempt (caller holds _cond and is counted in _waiting).
+        Returns (seconds to wait before trying again, throttled); (0, False) means admitted.
+        """
+        if priority == LOW and self._waiting[HIGH] > 0:
+            return 0.05, False
+        if self._in_flight >= int(self._window):
+            return 0.05, True
+        delay = bucket.try_take(time.monotonic()) if bucket else 0.0
+        if delay > 0:
+            return delay, True
+        self._in_flight += 1
+        return 0.0, False
+
+    def _acquire(self, endpoint, priority):
+        bucket = self._buckets.get(endpoint)
+        with self._cond:
+            self._waiting[priority] += 1
+            throttled = False
+            try:
+                while True:
+                    delay, limited = self._admit(bucket, priority)
+                    if delay == 0: break
+                    throttled |= limited
+                    self._cond.wait(delay)
+            finally:
+                self._waiting[priority] -= 1
+            if throttled:
+                self._count(endpoint, "throttled")
+
+    async def _acquire_async(self, endpoint, priority):
+        """Same gate as _acquire, but waits on the event loop instead of blocking a thread."""
+        bucket = self._buckets.get(endpoint)
+        with self._cond:
+            self._waiting[priority] += 1
+        throttled = False
+        try:
+            while True:
+                with self._cond:
+                    delay, limited = self._admit(bucket, priority)
+                if delay == 0: break
+                throttled |= limited
+                await asyncio.sleep(delay)
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+        if throttled:
+            self._count(endpoint, "throttled")
+
+    def _release(self, endpoint, rate_limited):
+        with self._cond:
+            self._in_flight -= 1
+            if rate_limited:
+                # Multiplicative decrease + pause the bucket
+                self._window = max(self.min_concurrency, self._window / 2)
+                logger.warning(f"Rate limited on {endpoint}, concurrency window -> {self._window:.1f}")
+                bucket = self._buckets.get(endpoint)
+                if bucket: bucket.drain()
+            else:
+                # Additive increase: about +1 per full window of successful calls
+                self._window = min(self.max_concurrency, self._window + 1.0 / self._window)
+            self._cond.notify_all()
+
+    def _started(self, endpoint, queued):
+        now = time.perf_counter()
+        UPSTREAM_WAIT_SECONDS.labels(endpoint).observe(now - queued)
+        self._count(endpoint, "calls")
+        return now
+
+    def _finished(self, endpoint, started, rate_limited, error=False):
+        """Releases the slot and records one attempt's latency and outcome."""
+        self._release(endpoint, rate_limited)
+        UPSTREAM_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        outcome = "rate_limited" if rate_limited else "error" if error else "ok"
+        UPSTREAM_CALLS.labels(endpoint, outcome).inc()
+        if rate_limited:
+            self._count(endpoint, "rate_limited")
+
+    def _retrying(self, endpoint):
+        self._count(endpoint, "retries")
+        UPSTREAM_RETRIES.labels(endpoint).inc()
+
+    def call(self, endpoint, fn, *args, priority=LOW, retries=3, **kwargs):
+        """
+        Runs fn(*args, **kwargs) under the limits of `endpoint`.
+        Rate-limit failures are retried with backoff; the last error/response is returned or raised.
+        """
+        for attempt in range(retries):
+            queued = time.perf_counter()
+            self._acquire(endpoint, priority)
+            started = self._started(endpoint, queued)
+            try:
+                res = fn(*args, **kwargs)
+            except Exception as e:
+                limited = is_rate_limit_error(e)
+                self._finished(endpoint, started, limited, error=True)
+                if limited and attempt < retries - 1:
+                    self._retrying(endpoint)
+                    time.sleep(0.5 * (attempt + 1))
+                    continue
+                self._count(endpoint, "failures")
+                UPSTREAM_ATTEMPTS.labels(endpoint).observe(attempt + 1)
+                raise
+
+            limited = is_rate_limit_error(res) if isinstance(res, dict) else False
+            self._finished(endpoint, started, limited)
+            if limited:
+                if attempt < retries - 1:
+                    self._retrying(endpoint)
+                    time.sleep(0.5 * (attempt + 1))
+                    continue
+                self._count(endpoint, "failures")
+            UPSTREAM_ATTEMPTS.labels(endpoint).observe(attempt + 1)
+            return res
+
+    async def acall(self, endpoint, fn, *args, priority=LOW, retries=3, **kwargs):
+        """
+        Async twin of call(): awaits fn(*args, **kwargs) under the same limits and counters,
+        so coroutine callers and thread callers share one budget.
+        """
+        for attempt in range(retries):
+            queued = time.perf_counter()
+            await self._acquire_async(endpoint, priority)
+            started = self._started(endpoint, queued)
+            try:
+                res = await fn(*args, **kwargs)
+            except Exception as e:
+                limited = is_rate_limit_error(e)
+                self._finished(endpoint, started, limited, error=True)
+                if limited and attempt < retries - 1:
+                    self._retrying(endpoint)
+                    await asyncio.sleep(0.5 * (attempt + 1))
+                    continue
+                self._count(endpoint, "failures")
+                UPSTREAM_ATTEMPTS.labels(endpoint).observe(attempt + 1)
+                raise
+
+            limited = is_rate_limit_error(res) if isinstance(res, dict) else False
+            self._finished(endpoint, started, limited)
+            if limited:
+                if attempt < retries - 1:
+                    self._retrying(endpoint)
+                    await asyncio.sleep(0.5 * (attempt + 1))
+                    continue
+                self._count(endpoint, "failures")
+            UPSTREAM_ATTEMPTS.labels(endpoint).observe(attempt + 1)
+            return res
+
+    def stats(self):
+        with self._cond:
+            return {
+                "concurrency_limit": round(self._window, 2),
+                "in_flight": self._in_flight,
+                "waiting_high": self._waiting[HIGH],
+                "waiting_low": self._waiting[LOW],
+                "endpoints": {k: dict(v) for k, v in self.counters.items()},
+            }
@@ -0,0 +1,293 @@
+"""
+Backtest of the scanner's strength score and breakout signals over stored daily candles.
+Every indicator is recomputed for every day of every symbol as (symbols x days) array
+operations; a rule set is then scored in a few array passes, so parameter sweeps are cheap
+and spread over a process pool.
+
+Signals fire on a day's close; forward returns are close-to-close over each horizon.
+Usage: python Backend/backtest.py [--since 2015-01-01] [--horizons 1,5,10,20]
+                                  [--sweep "rsi_bull=45,50,55;macd_pts=10,15,20"] [--workers N]
+"""
+import os
+import sys
+import time
+import argparse
+import itertools
+import logging
+import concurrent.futures
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from .metrics_engine import SCORE_RULES, BREAKOUT_PERIODS, RSI_PERIOD, A12, A26, A9, strength_score
+    from .candle_store import CandleStore
+except ImportError:
+    from metrics_engine import SCORE_RULES, BREAKOUT_PERIODS, RSI_PERIOD, A12, A26, A9, strength_score
+    from candle_store import CandleStore
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Backtest")
+
+HORIZONS = (1, 5, 10, 20) # trading days
+SENTIMENT_SIGNALS = (("STRONG BUY", 1), ("Bullish", 1), ("Bearish", -1), ("STRONG SELL", -1))
+
+
+def build_panel(items):
+    """
+    Date-aligned (symbols x days) OHLC panel from [(symbol, token, candles), ...].
+    Closes are carried forward over a symbol's missing days (the other fields take the
+    carried close), and `listed` marks the days that had a real candle.
+    """
+    dates = sorted({c[0][:10] for _, _, candles in items for c in candles})
+    col = {d: j for j, d in enumerate(dates)}
+    shape = (len(items), len(dates))
+    ohlc = np.full((4,) + shape, np.nan)
+    for i, (_, _, candles) in enumerate(items):
+        if not candles: continue
+        cols = np.fromiter((col[c[0][:10]] for c in candles), dtype=np.int64, count=len(candles))
+        ohlc[:, i, cols] = np.array([c[1:5] for c in candles], dtype=np.float64).T
+    listed = ~np.isnan(ohlc[3])
+
+    # Carry the last close forward inside each symbol's history
+    close = ohlc[3]
+    idx = np.where(listed, np.arange(shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    close = close[np.arange(shape[0])[:, None], idx]
+    for k in range(3):
+        ohlc[k] = np.where(listed, ohlc[k], close)
+    ohlc[3] = close
+    return {
+        "symbols": [x[0] for x in items], "tokens": [x[1] for x in items], "dates": dates,
+        "open": ohlc[0], "high": ohlc[1], "low": ohlc[2], "close": ohlc[3], "listed": listed,
+    }
+
+
+def load_panel(store=None, tokens=None, since=None, symbols=None):
+    """Panel of the stored daily candles (all stored tokens by default)."""
+    store = store or CandleStore.get_instance()
+    tokens = tokens or store.tokens()
+    symbols = symbols or {}
+    items = [(symbols.get(t, t), t, store.get_candles(t, since=since)) for t in tokens]
+    return build_panel([x for x in items if x[2]])
+
+
+def rolling_rsi(close, history, period=RSI_PERIOD):
+    """RSI of every day: simple mean of the last `period` gains/losses, like metrics_engine.rolling_rsi."""
+    delta = np.diff(close, axis=1, prepend=np.nan)
+    delta = np.where(np.isnan(delta), 0.0, delta)
+    gain = np.cumsum(np.where(delta > 0, delta, 0.0), axis=1)
+    loss = np.cumsum(np.where(delta < 0, -delta, 0.0), axis=1)
+    gain[:, period:] -= gain[:, :-period].copy()
+    loss[:, period:] -= loss[:, :-period].copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + gain / loss)
+    rsi = np.where(loss == 0, np.where(gain > 0, 100.0, np.nan), rsi)
+    # The live scanner scores a missing RSI as 50
+    return np.where((history >= period) & ~np.isnan(rsi), rsi, 50.0)
+
+
+def macd_above_signal(close):
+    """MACD(12, 26, 9) above its signal line, every day (EWMs start at each symbol's first close)."""
+    n, width = close.shape
+    e12 = np.full(n, np.nan)
+    e26 = np.full(n, np.nan)
+    sig = np.full(n, np.nan)
+    above = np.zeros((n, width), dtype=bool)
+    for t in range(width): # one vector step per day, across all symbols
+        col = close[:, t]
+        e12 = np.where(np.isnan(e12), col, (1 - A12) * e12 + A12 * col)
+        e26 = np.where(np.isnan(e26), col, (1 - A26) * e26 + A26 * col)
+        macd = e12 - e26
+        sig = np.where(np.isnan(sig), macd, (1 - A9) * sig + A9 * macd)
+        above[:, t] = macd > sig
+    return above
+
+
+def prior_extremes(high, low, history, period):
+    """High/low of the `period` days before each day; NaN where history is short (same rule as prior_high_low)."""
+    n, width = high.shape
+    if width <= period:
+        nan = np.full((n, width), np.nan)
+        return nan, nan
+    hi = np.where(np.isnan(high), -np.inf, high)
+    lo = np.where(np.isnan(low), np.inf, low)
+    max_h = np.full((n, width), np.nan)
+    min_l = np.full((n, width), np.nan)
+    max_h[:, period:] = sliding_window_view(hi, period, axis=1)[:, :-1].max(axis=2)
+    min_l[:, period:] = sliding_window_view(lo, period, axis=1)[:, :-1].min(axis=2)
+    valid = history >= period + 2
+    return np.where(valid, max_h, np.nan), np.where(valid, min_l, np.nan)
+
+
+def forward_returns(close, horizons=HORIZONS):
+    """horizon -> % return from each day's close to the close `horizon` days later (NaN past the end)."""
+    out = {}
+    for h in horizons:
+        fwd = np.full(close.shape, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fwd[:, :-h] = (close[:, h:] / close[:, :-h] - 1) * 100
+        out[h] = fwd.astype(np.float32)
+    return out
+
+
+def features(panel, horizons=HORIZONS):
+    """Everything that does not depend on the score rules, computed once per panel."""
+    close, listed = panel["close"], panel["listed"]
+    history = np.cumsum(listed, axis=1) # candles seen so far (the live scanner's `lengths`)
+    prev = np.concatenate([np.full((close.shape[0], 1), np.nan), close[:, :-1]], axis=1)
+    breakouts = {}
+    for label, period in BREAKOUT_PERIODS:
+        max_h, min_l = prior_extremes(panel["high"], panel["low"], history, period)
+        breakouts[f"Bullish Breakout {label}"] = (close > max_h, 1)
+        breakouts[f"Bearish Breakout {label}"] = (close < min_l, -1)
+    return {
+        "rsi": rolling_rsi(close, history),
+        "macd_above": macd_above_signal(close),
+        "up_day": close > prev,
+        "buyers": close > panel["open"],
+        # Same validity rule as the live scanner: 5 candles of history
+        "active": listed & (history >= 5),
+        "breakouts": breakouts,
+        "forward": forward_returns(close, horizons),
+    }
+
+
+def signal_stats(mask, direction, forward, baseline):
+    """Per horizon: signal count, mean forward return %, hit rate % (moved the signal's way), edge over all days."""
+    out = {}
+    for h, fwd in forward.items():
+        r = fwd[mask]
+        r = r[~np.isnan(r)]
+        if not len(r):
+            out[h] = {"n": 0, "mean": None, "hit_rate": None, "edge": None}
+            continue
+        mean = float(r.mean())
+        out[h] = {
+            "n": int(len(r)),
+            "mean": round(mean, 3),
+            "hit_rate": round(float((r * direction > 0).mean() * 100), 1),
+            "edge": round((mean - baseline[h]) * direction, 3),
+        }
+    return out
+
+
+def evaluate(feat, rules=None, breakouts=True):
+    """Scores every symbol-day under `rules` (SCORE_RULES overrides) and reports each signal's forward returns."""
+    rules = {**SCORE_RULES, **(rules or {})}
+    score = strength_score(feat["rsi"], feat["macd_above"], feat["up_day"], feat["buyers"], rules)
+    active = feat["active"]
+    baseline = {}
+    for h, fwd in feat["forward"].items():
+        r = fwd[active]
+        baseline[h] = float(np.nanmean(r)) if np.isfinite(r).any() else 0.0
+
+    bands = {
+        "STRONG BUY": score > rules["strong_buy"],
+        "Bullish": (score > rules["bullish"]) & (score <= rules["strong_buy"]),
+        "Bearish": (score < rules["bearish"]) & (score >= rules["strong_sell"]),
+        "STRONG SELL": score < rules["strong_sell"],
+    }
+    signals = {name: signal_stats(bands[name] & active, direction, feat["forward"], baseline)
+               for name, direction in SENTIMENT_SIGNALS}
+    if breakouts:
+        for name, (mask, direction) in feat["breakouts"].items():
+            signals[name] = signal_stats(mask & active, direction, feat["forward"], baseline)
+    return {"rules": rules, "baseline": {h: round(v, 3) for h, v in baseline.items()}, "signals": signals}
+
+
+# --- Parameter sweeps over a process pool ---
+_worker_features = None
+
+
+def _init_worker(feat):
+    global _worker_features
+    _worker_features = feat
+
+
+def _run_chunk(combos):
+    return [evaluate(_worker_features, combo, breakouts=False) for combo in combos]
+
+
+def parse_grid(spec):
+    """'rsi_bull=45,50,55;macd_pts=10,15' -> {'rsi_bull': [45, 50, 55], 'macd_pts': [10, 15]}"""
+    grid = {}
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        name, values = part.split("=")
+        if name.strip() not in SCORE_RULES:
+            raise ValueError(f"Unknown score rule: {name.strip()}")
+        grid[name.strip()] = [float(v) for v in values.split(",")]
+    return grid
+
+
+def sweep(feat, grid, workers=None, chunk=8):
+    """
+    Evaluates every combination of `grid` ({rule: [values]}) on a process pool.
+    The features are shipped to each worker once; each task is a chunk of rule sets.
+    Returns one evaluate() result per combination, in grid order.
+    """
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+    chunks = [combos[i:i + chunk] for i in range(0, len(combos), chunk)]
+    workers = workers or min(len(chunks), os.cpu_count() or 1)
+    if workers <= 1:
+        _init_worker(feat)
+        return [r for c in chunks for r in _run_chunk(c)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(feat,)) as ex:
+        return [r for res in ex.map(_run_chunk, chunks) for r in res]
+
+
+def rank(results, signal="STRONG BUY", horizon=5, min_signals=30):
+    """Sweep results ordered by the edge of `signal` at `horizon` (rule sets with too few signals last)."""
+    def key(res):
+        s = res["signals"][signal][horizon]
+        return (s["n"] >= min_signals, s["edge"] if s["edge"] is not None else -np.inf)
+    return sorted(results, key=key, reverse=True)
+
+
+def _print_report(report, horizons):
+    print(f"{'signal':28s}" + "".join(f"{f'{h}d n / mean% / hit% / edge':>34s}" for h in horizons))
+    print(f"{'all days (mean%)':28s}" + "".join(f"{report['baseline'][h]:>34.3f}" for h in horizons))
+    for name, stats in report["signals"].items():
+        cells = []
+        for h in horizons:
+            s = stats[h]
+            cells.append("-" if not s["n"] else f"{s['n']} / {s['mean']:.2f} / {s['hit_rate']:.1f} / {s['edge']:+.2f}")
+        print(f"{name:28s}" + "".join(f"{c:>34s}" for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the scanner's score and breakout signals on stored candles")
+    parser.add_argument("--since", help="first day (YYYY-MM-DD), default: everything stored")
+    parser.add_argument("--horizons", default=",".join(map(str, HORIZONS)))
+    parser.add_argument("--sweep", help='rule grid, e.g. "rsi_bull=45,50,55;macd_pts=10,15,20"')
+    parser.add_argument("--signal", default="STRONG BUY", help="signal the sweep is ranked by")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    horizons = tuple(int(h) for h in args.horizons.split(","))
+
+    start = time.perf_counter()
+    panel = load_panel(since=args.since)
+    if not panel["symbols"]:
+        sys.exit("No stored candles: run the scanner (or backfill the candle store) first")
+    feat = features(panel, horizons)
+    print(f"{len(panel['symbols'])} symbols x {len(panel['dates'])} days "
+          f"({panel['dates'][0]} .. {panel['dates'][-1]}), features in {time.perf_counter() - start:.2f}s\n")
+
+    _print_report(evaluate(feat), horizons)
+
+    if args.sweep:
+        grid = parse_grid(args.sweep)
+        start = time.perf_counter()
+        results = sweep(feat, grid, workers=args.workers)
+        print(f"\nSweep: {len(results)} rule sets in {time.perf_counter() - start:.2f}s, ranked by {args.signal} edge at {horizons[1] if len(horizons) > 1 else horizons[0]}d")
+        for res in rank(results, args.signal, horizons[1] if len(horizons) > 1 else horizons[0])[:args.top]:
+            params = {k: res["rules"][k] for k in grid}
+            s = res["signals"][args.signal]
+            print(f"  {params}  " + "  ".join(f"{h}d: n={s[h]['n']} edge={s[h]['edge']}" for h in horizons))
+
+
+if __name__ == "__main__":
+    main()
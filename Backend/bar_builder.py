@@ -0,0 +1,195 @@
+import time
+import threading
+import logging
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+try:
+    from .subscriptions import NSE_CM
+except ImportError:
+    from subscriptions import NSE_CM
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("BarBuilder")
+
+# Intraday timeframes built from ticks: label -> bar length in seconds
+TIMEFRAMES = {"1m": 60, "5m": 300, "15m": 900, "60m": 3600}
+BAR_DEPTH = 400 # bars kept per token and timeframe (~1.5 sessions of 1m bars)
+IST = timezone(timedelta(hours=5, minutes=30))
+SESSION_ALIGN = 13500 # 09:15 IST as seconds past 00:00 UTC, so 60m bars run 09:15-10:15 like NSE's
+
+
+def bar_start(ts, seconds):
+    """Start (unix seconds) of the bar containing `ts`, aligned to the 09:15 session open."""
+    return (int(ts) - SESSION_ALIGN) // seconds * seconds + SESSION_ALIGN
+
+
+class BarSeries:
+    """
+    OHLCV bars of one timeframe for every token, in fixed-size ring buffers.
+    Storage is one (tokens, depth) array per field, so a whole timeframe can be handed to
+    the vectorized metrics engine without building per-token lists. Not thread-safe on its
+    own; BarBuilder serializes access.
+    """
+
+    def __init__(self, seconds, depth=BAR_DEPTH, capacity=256):
+        self.seconds = seconds
+        self.depth = depth
+        self.rows = {} # token -> row index
+        self.tokens = [] # row index -> token
+        self.version = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        shape = (capacity, self.depth)
+        self.start = np.zeros(shape, dtype=np.int64)
+        self.ohlc = np.full((4,) + shape, np.nan)
+        self.volume = np.zeros(shape)
+        self.head = np.zeros(capacity, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+    def _row(self, token):
+        row = self.rows.get(token)
+        if row is not None:
+            return row
+        row = len(self.tokens)
+        if row == len(self.head):
+            old = (self.start, self.ohlc, self.volume, self.head, self.count)
+            self._alloc(2 * row)
+            self.start[:row], self.ohlc[:, :row], self.volume[:row], self.head[:row], self.count[:row] = (
+                old[0], old[1], old[2], old[3], old[4])
+        self.rows[token] = row
+        self.tokens.append(token)
+        return row
+
+    def update(self, tokens, ts, prices, volumes):
+        """
+        Folds one trade per token (unique tokens; unix seconds, price, volume traded since the
+        token's previous tick) into each token's current bar, opening a new bar where the
+        trade falls past it. Late ticks fold into the current bar.
+        """
+        rows = np.fromiter((self._row(t) for t in tokens), dtype=np.int64, count=len(tokens))
+        begin = (np.asarray(ts, dtype=np.int64) - SESSION_ALIGN) // self.seconds * self.seconds + SESSION_ALIGN
+        prices = np.asarray(prices, dtype=np.float64)
+        volumes = np.asarray(volumes, dtype=np.float64)
+        head = self.head[rows]
+        started = self.count[rows] > 0
+        same = started & (begin <= self.start[rows, head])
+
+        r, h, p = rows[same], head[same], prices[same]
+        if len(r):
+            np.maximum.at(self.ohlc[1], (r, h), p)
+            np.minimum.at(self.ohlc[2], (r, h), p)
+            self.ohlc[3, r, h] = p
+            self.volume[r, h] += volumes[same]
+
+        new = ~same
+        r = rows[new]
+        if len(r):
+            h = np.where(started[new], (head[new] + 1) % self.depth, 0)
+            self.head[r] = h
+            self.start[r, h] = begin[new]
+            self.ohlc[:, r, h] = prices[new]
+            self.volume[r, h] = volumes[new]
+            self.count[r] = np.minimum(self.count[r] + 1, self.depth)
+        self.version += 1
+
+    def arrays(self, tokens=None):
+        """
+        Right-aligned (oldest left, current bar in column -1) arrays for `tokens`
+        (default: all), NaN-padded like metrics_engine.stack_candles.
+        Returns tokens, opens, highs, lows, closes, volumes, starts, lengths.
+        """
+        tokens = list(self.tokens if tokens is None else [t for t in tokens if t in self.rows])
+        rows = np.array([self.rows[t] for t in tokens], dtype=np.int64)
+        if not len(rows):
+            empty = np.empty((0, self.depth))
+            return tokens, empty, empty, empty, empty, empty, empty.astype(np.int64), np.empty(0, dtype=np.int64)
+        cols = (self.head[rows, None] + 1 + np.arange(self.depth)) % self.depth
+        counts = self.count[rows]
+        pad = np.arange(self.depth)[None, :] < (self.depth - counts)[:, None]
+        ohlc = np.where(pad, np.nan, self.ohlc[:, rows[:, None], cols])
+        volumes = np.where(pad, 0.0, self.volume[rows[:, None], cols])
+        starts = np.where(pad, 0, self.start[rows[:, None], cols])
+        return tokens, ohlc[0], ohlc[1], ohlc[2], ohlc[3], volumes, starts, counts
+
+    def candles(self, token, limit=None):
+        """The token's bars in SmartAPI candle format ([ts, o, h, l, c, v]), oldest first."""
+        if token not in self.rows:
+            return []
+        _, o, h, l, c, v, starts, counts = self.arrays([token])
+        k = int(counts[0])
+        if limit: k = min(k, limit)
+        out = []
+        for j in range(self.depth - k, self.depth):
+            ts = datetime.fromtimestamp(int(starts[0, j]), IST).strftime("%Y-%m-%dT%H:%M:%S+05:30")
+            out.append([ts, float(o[0, j]), float(h[0, j]), float(l[0, j]), float(c[0, j]), int(v[0, j])])
+        return out
+
+
+class BarBuilder:
+    """
+    Builds 1m/5m/15m/60m bars from websocket ticks (zero REST calls).
+    Fed the ingestor's coalesced batches (one vectorized update per timeframe per batch),
+    so a bar's high/low is sampled at the batch interval (50 ms) rather than from every trade. Volume comes from the difference in
+    the day's cumulative traded volume (Quote/SnapQuote ticks; LTP ticks carry none).
+    """
+
+    def __init__(self, timeframes=TIMEFRAMES, depth=BAR_DEPTH):
+        self._lock = threading.Lock()
+        self.series = {label: BarSeries(seconds, depth) for label, seconds in timeframes.items()}
+        self._day_volume = {} # token -> last cumulative volume seen
+        self.ticks = 0
+
+    def on_ticks(self, tokens, ts, prices, day_volumes):
+        """One trade per token: unix seconds, price, day's cumulative volume (None when unknown)."""
+        with self._lock:
+            traded = []
+            for token, day_volume in zip(tokens, day_volumes):
+                last = self._day_volume.get(token)
+                # First tick of a token, LTP-mode tick or a new session (counter reset): nothing to attribute
+                if day_volume is None or last is None or day_volume < last:
+                    traded.append(0.0)
+                else:
+                    traded.append(day_volume - last)
+                if day_volume is not None:
+                    self._day_volume[token] = day_volume
+            for series in self.series.values():
+                series.update(tokens, ts, prices, traded)
+            self.ticks += len(tokens)
+
+    def apply_ticks(self, batch, now=None):
+        """
+        Applies one TickIngestor batch ({(exchange_type, token): SmartWebSocketV2 tick}).
+        Bars are built for the cash segment (equities and indices) only.
+        """
+        now = now or time.time()
+        tokens, ts, prices, volumes = [], [], [], []
+        for (exchange_type, token), tick in batch.items():
+            ltp = tick.get('last_traded_price')
+            if exchange_type != NSE_CM or not ltp: continue
+            stamp = tick.get('exchange_timestamp')
+            tokens.append(token)
+            ts.append(stamp / 1000.0 if stamp else now)
+            prices.append(ltp / 100.0)
+            volumes.append(tick.get('volume_trade_for_the_day'))
+        if tokens:
+            self.on_ticks(tokens, ts, prices, volumes)
+
+    def version(self, timeframe):
+        return self.series[timeframe].version
+
+    def arrays(self, timeframe, tokens=None):
+        with self._lock:
+            return self.series[timeframe].arrays(tokens)
+
+    def candles(self, token, timeframe, limit=None):
+        with self._lock:
+            return self.series[timeframe].candles(token, limit)
+
+    def stats(self):
+        with self._lock:
+            return {"ticks": self.ticks, "tokens": len(next(iter(self.series.values())).tokens),
+                    "bars": {label: int(s.count.sum()) for label, s in self.series.items()}}
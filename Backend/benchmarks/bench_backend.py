@@ -0,0 +1,242 @@
+"""
+Offline benchmark suite: scan cycle, metrics engine, tick path and /god-mode latency.
+Runs entirely on synthetic data through the replay fakes, no Angel One account needed.
+Usage: python Backend/benchmarks/bench_backend.py [sizes, default 200,2000,10000]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import concurrent.futures
+from datetime import datetime, timedelta
+
+import numpy as np
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+TMP = tempfile.mkdtemp(prefix="ngta-bench-")
+os.environ.setdefault("CANDLE_DB_PATH", os.path.join(TMP, "candles.db"))
+# The endpoint benchmark imports the app as an API worker reading our snapshot file, offline
+SNAPSHOT_PATH = os.path.join(TMP, "snapshot.bin")
+os.environ.update({"NGTA_ROLE": "api", "NGTA_SNAPSHOT_PATH": SNAPSHOT_PATH, "SMARTAPI_REPLAY": TMP})
+
+import logging # noqa: E402
+logging.disable(logging.WARNING)
+
+from replay import FakeSmartConnect, FakeWebSocket, synthetic_universe # noqa: E402
+from api_scheduler import SmartApiScheduler, LOW # noqa: E402
+from candle_store import CandleStore # noqa: E402
+from breakout_index import BreakoutIndex # noqa: E402
+from metrics_engine import calculate_metrics_batch # noqa: E402
+from market_store import MarketStore # noqa: E402
+from tick_ingest import TickIngestor # noqa: E402
+from shared_snapshot import SharedSnapshotWriter # noqa: E402
+
+
+def pct(samples, p):
+    return float(np.percentile(samples, p)) * 1000 if samples else float("nan")
+
+
+def bench_metrics(universe):
+    calculate_metrics_batch(universe[:50], with_state=True) # warm-up
+    start = time.perf_counter()
+    rows, states = calculate_metrics_batch(universe, with_state=True)
+    elapsed = time.perf_counter() - start
+    return rows, states, {"metrics_s": elapsed, "metrics_sym_per_s": len(universe) / elapsed}
+
+
+def bench_scan_cycle(universe, db_path):
+    """Two scanner cycles (cold: full history, warm: incremental) through the fake SmartConnect."""
+    api = FakeSmartConnect(candles={tok: candles for _, tok, candles in universe})
+    # Upstream limits off: this measures our own overhead, not Angel One's 3 req/s
+    scheduler = SmartApiScheduler(limits={}, max_concurrency=16, initial_concurrency=16)
+    store = CandleStore(db_path)
+    indexes = {}
+    market = MarketStore()
+    to_date = datetime.now()
+    from_date = to_date - timedelta(days=400)
+    fmt = "%Y-%m-%d %H:%M"
+
+    def process_item(item):
+        sym, tok, _ = item
+        last_ts = store.last_timestamp(tok)
+        fetch_from = datetime.strptime(last_ts[:10], "%Y-%m-%d") if last_ts else from_date
+        res = scheduler.call("historical", api.getCandleData, {
+            "exchange": "NSE", "symboltoken": tok, "interval": "ONE_DAY",
+            "fromdate": fetch_from.strftime(fmt), "todate": to_date.strftime(fmt)}, priority=LOW)
+        if res and res.get('data'):
+            store.upsert(tok, res['data'])
+        candles = store.get_candles(tok, since=from_date.strftime("%Y-%m-%d"))
+        idx = indexes.get(tok)
+        if idx is None:
+            indexes[tok] = BreakoutIndex(candles)
+        else:
+            idx.sync(candles)
+        return (sym, tok, candles)
+
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=scheduler.max_concurrency) as ex:
+            fetched = list(ex.map(process_item, universe))
+        rows, _ = calculate_metrics_batch(fetched, with_state=True, indexes=indexes)
+        market.update_rows(rows)
+        market.publish()
+        timings.append(time.perf_counter() - start)
+    return {"cycle_cold_s": timings[0], "cycle_warm_s": timings[1]}
+
+
+TICK_HZ = 2 # ticks per symbol per second in the paced run (NSE Quote mode sends about one)
+TICK_CAPACITY = 100_000 # same ring buffer as the app's TickIngestor
+
+
+def _drain(ingestor, timeout=30):
+    drained_by = time.perf_counter() + timeout
+    while ingestor.stats()["queue_depth"] and time.perf_counter() < drained_by:
+        time.sleep(0.005)
+    time.sleep(2 * ingestor.interval) # let the last batch finish applying
+    ingestor.stop()
+    return ingestor.stats()
+
+
+def bench_ticks(rows, states, seconds=3.0):
+    """
+    Ticks through the app's own main.apply_ticks (table, option chains, bars, telemetry) on a
+    TickIngestor configured like the app's. Two runs, neither may drop a tick:
+    - paced: every symbol ticks TICK_HZ times a second; reports tick-to-table lag
+    - saturated: the producer pushes as fast as it can but backs off while the buffer is half
+      full; reports the tick rate the ingestor sustains (a tick superseded by a newer one for the
+      same token before its batch is coalesced, not dropped) and the table updates applied behind it
+    Rates are over the time until the last tick is in the table, not until the last push.
+    """
+    import main as app_main # api role, configured at the top of this file
+    saved_store = app_main.market_store
+    app_main.market_store = MarketStore() # the scanner's table, in place of the snapshot reader
+    app_main.market_store.update_rows(rows)
+    app_main.token_map_reverse.update({row['token']: row['symbol'] for row in rows})
+    app_main.indicator_states.update(states)
+    tokens = [row['token'] for row in rows]
+    mode = app_main.EQUITY_FEED_MODE
+    ws = FakeWebSocket()
+    rng = np.random.default_rng(3)
+    pregen = [ws.synthetic_tick(1, tok, mode, rng) for tok in tokens] # seeds each token's price walk
+    lags = []
+
+    def apply(batch):
+        app_main.apply_ticks(batch)
+        now = time.time()
+        lags.extend(now - tick['exchange_timestamp'] / 1000.0 for tick in batch.values())
+
+    out = {}
+    try:
+        ingestor = TickIngestor(apply, capacity=TICK_CAPACITY)
+        ingestor.start()
+        start = time.perf_counter()
+        rounds = 0
+        while time.perf_counter() - start < seconds:
+            for tok in tokens:
+                ingestor.push(ws.synthetic_tick(1, tok, mode, rng))
+            rounds += 1
+            time.sleep(max(0.0, start + rounds / TICK_HZ - time.perf_counter()))
+        s = _drain(ingestor)
+        elapsed = time.perf_counter() - start
+        out.update({"ticks_paced_per_s": s["received"] / elapsed,
+                    "tick_lag_p50_ms": pct(lags, 50), "tick_lag_p99_ms": pct(lags, 99)})
+        dropped = s["dropped"]
+
+        lags.clear()
+        ingestor = TickIngestor(apply, capacity=TICK_CAPACITY)
+        ingestor.start()
+        start = time.perf_counter()
+        stop = start + seconds
+        while time.perf_counter() < stop:
+            while ingestor.stats()["queue_depth"] > TICK_CAPACITY // 2:
+                time.sleep(0.001)
+            stamp = int(time.time() * 1000)
+            for tick in pregen:
+                ingestor.push(dict(tick, exchange_timestamp=stamp))
+        s = _drain(ingestor)
+        elapsed = time.perf_counter() - start
+        dropped += s["dropped"]
+        out.update({"ticks_sustained_per_s": s["received"] / elapsed,
+                    "table_updates_per_s": s["applied"] / elapsed,
+                    "tick_batch_avg": s["applied"] / max(1, s["batches"]),
+                    "tick_lag_sat_p99_ms": pct(lags, 99),
+                    "ticks_dropped": dropped})
+    finally:
+        app_main.market_store = saved_store
+        app_main.token_map_reverse.clear()
+        app_main.indicator_states.clear()
+    return out
+
+
+def bench_endpoints(rows, snapshot_path, requests=300):
+    """/god-mode latency through the ASGI app (API-worker role reading the shared snapshot)."""
+    market = MarketStore()
+    market.update_rows(rows)
+    writer = SharedSnapshotWriter(snapshot_path)
+    writer.write(market.publish(), {"scanner": "Running"})
+
+    import main as app_main # api role, configured at the top of this file
+    import httpx
+
+    queries = {
+        "god_mode_full": "/god-mode",
+        "god_mode_top50": "/god-mode?limit=50",
+        "god_mode_filtered": "/god-mode?min_rsi=55&sort=rsi&fields=symbol,ltp,rsi,strength_score",
+        "god_mode_304": None,
+    }
+
+    async def run():
+        out = {}
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            etag = (await client.get("/god-mode")).headers.get("etag")
+            for name, url in queries.items():
+                samples = []
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    if url is None:
+                        r = await client.get("/god-mode", headers={"If-None-Match": etag})
+                    else:
+                        r = await client.get(url)
+                    samples.append(time.perf_counter() - start)
+                    assert r.status_code in (200, 304)
+                out[f"{name}_p50_ms"] = pct(samples, 50)
+                out[f"{name}_p99_ms"] = pct(samples, 99)
+        return out
+
+    result = asyncio.run(run())
+    writer.close()
+    return result
+
+
+def main():
+    sizes = [int(x) for x in (sys.argv[1] if len(sys.argv) > 1 else "200,2000,10000").split(",")]
+    report = {}
+    for n in sizes:
+        print(f"--- {n} symbols ---", flush=True)
+        start = time.perf_counter()
+        universe = synthetic_universe(n)
+        print(f"synthetic universe: {time.perf_counter() - start:.1f}s", flush=True)
+
+        result = {}
+        rows, states, r = bench_metrics(universe)
+        result.update(r)
+        result.update(bench_scan_cycle(universe, os.path.join(TMP, f"candles-{n}.db")))
+        result.update(bench_ticks(rows, states))
+        result.update(bench_endpoints(rows, SNAPSHOT_PATH))
+        report[n] = result
+        for k, v in result.items():
+            print(f"  {k:28s} {v:12.2f}" if isinstance(v, float) else f"  {k:28s} {v:12d}", flush=True)
+
+    print("\nsummary")
+    keys = list(next(iter(report.values())).keys())
+    print(f"  {'':28s}" + "".join(f"{n:>12d}" for n in report))
+    for k in keys:
+        print(f"  {k:28s}" + "".join(f"{report[n][k]:12.2f}" for n in report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Backtest benchmark: panel build, features, one evaluation and a parameter sweep on a synthetic universe.
+Usage: python Backend/benchmarks/bench_backtest.py [symbols, default 200] [years, default 10] [workers]
+"""
+import os
+import sys
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+
+import logging # noqa: E402
+logging.disable(logging.WARNING)
+
+from replay import synthetic_universe # noqa: E402
+from backtest import build_panel, features, evaluate, sweep, rank # noqa: E402
+
+GRID = {
+    "rsi_bull": [45, 50, 55],
+    "rsi_hot": [65, 70, 75],
+    "macd_pts": [10, 15, 20],
+    "strong_buy": [70, 75, 80],
+}
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    universe = synthetic_universe(n, days=365 * years)
+
+    timings = {}
+    start = time.perf_counter()
+    panel = build_panel(universe)
+    timings["panel_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    feat = features(panel)
+    timings["features_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = evaluate(feat)
+    timings["evaluate_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = sweep(feat, GRID, workers=workers)
+    timings["sweep_s"] = time.perf_counter() - start
+
+    print(f"{n} symbols x {len(panel['dates'])} days, sweep of {len(results)} rule sets")
+    print("  " + "  ".join(f"{k}={v:.2f}" for k, v in timings.items()))
+    s = report["signals"]["STRONG BUY"][5]
+    print(f"  default rules, STRONG BUY 5d: n={s['n']} mean={s['mean']}% hit={s['hit_rate']}%")
+    best = rank(results)[0]
+    print(f"  best edge: {({k: best['rules'][k] for k in GRID})} -> {best['signals']['STRONG BUY'][5]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Greeks engine benchmark: every F&O underlying's chain solved in one call.
+Usage: python Backend/benchmarks/bench_greeks.py [underlyings] [strikes] [expiries]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from greeks import bs_price, chain_analytics # noqa: E402
+
+
+def synthetic_universe(underlyings, strikes, expiries, seed=7):
+    """Flat arrays for `underlyings` x `expiries` chains of `strikes` strikes around spot."""
+    rng = np.random.default_rng(seed)
+    spot = rng.uniform(100, 50000, underlyings)
+    step = spot * 0.005
+    offsets = np.arange(strikes) - strikes // 2
+    k = (np.round(spot / step)[:, None] + offsets) * step[:, None] # (U, S)
+    t = (np.arange(expiries) * 7 + rng.integers(1, 7)) / 365.0 # weekly expiries
+
+    spot_a = np.repeat(spot, strikes * expiries)
+    k_a = np.tile(k, (1, expiries)).ravel()
+    t_a = np.tile(np.repeat(t, strikes), underlyings)
+    vol = rng.uniform(0.1, 0.6, spot_a.size)
+    ce = np.round(bs_price(spot_a, k_a, t_a, vol, True), 2)
+    pe = np.round(bs_price(spot_a, k_a, t_a, vol, False), 2)
+    return spot_a, k_a, t_a, ce, pe
+
+
+def main():
+    underlyings = int(sys.argv[1]) if len(sys.argv) > 1 else 190
+    strikes = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+    expiries = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    spot, k, t, ce, pe = synthetic_universe(underlyings, strikes, expiries)
+    contracts = 2 * k.size
+
+    chain_analytics(spot, k, t, ce, pe) # warm-up
+    runs = []
+    for _ in range(5):
+        start = time.perf_counter()
+        ce_res, pe_res, _ = chain_analytics(spot, k, t, ce, pe)
+        runs.append(time.perf_counter() - start)
+
+    solved = np.isfinite(ce_res['iv']).sum() + np.isfinite(pe_res['iv']).sum()
+    best = min(runs)
+    print(f"{underlyings} underlyings x {expiries} expiries x {strikes} strikes = {contracts} contracts")
+    print(f"IV + Greeks: best {best * 1000:.1f} ms, median {sorted(runs)[2] * 1000:.1f} ms "
+          f"({contracts / best / 1e6:.2f} M contracts/s), solved {solved}/{contracts}")
+
+
+if __name__ == "__main__":
+    main()
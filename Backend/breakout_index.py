@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class BreakoutIndex:
+    """
+    Sparse-table range max/min over one token's daily highs and lows.
+    Only *closed* candles are indexed: the newest candle is "today" and every
+    breakout level is measured against the days before it, so today's intraday
+    updates never touch the table. Built once in O(n log n), extended in
+    O(log n) per newly closed day, and any lookback is answered in O(1).
+    """
+
+    def __init__(self, candles=()):
+        self._max = [[]] # level k holds max(high[i : i + 2**k])
+        self._min = [[]] # level k holds min(low[i : i + 2**k])
+        self.last_closed_ts = None
+        self.sync(candles)
+
+    def __len__(self):
+        return len(self._max[0])
+
+    def _build(self, closed):
+        highs = np.array([c[2] for c in closed], dtype=np.float64)
+        lows = np.array([c[3] for c in closed], dtype=np.float64)
+        self._max, self._min = [highs.tolist()], [lows.tolist()]
+        n = len(highs)
+        k = 1
+        while (1 << k) <= n:
+            half = 1 << (k - 1)
+            highs = np.maximum(highs[:-half], highs[half:])
+            lows = np.minimum(lows[:-half], lows[half:])
+            self._max.append(highs.tolist())
+            self._min.append(lows.tolist())
+            k += 1
+        self.last_closed_ts = closed[-1][0] if closed else None
+
+    def append(self, ts, high, low):
+        """Adds one closed day to the end of the table."""
+        self._max[0].append(high)
+        self._min[0].append(low)
+        n = len(self._max[0])
+        k = 1
+        while (1 << k) <= n:
+            if k == len(self._max):
+                self._max.append([])
+                self._min.append([])
+            half = 1 << (k - 1)
+            j = n - (1 << k) # start of the new level-k window ending at the new day
+            self._max[k].append(max(self._max[k - 1][j], self._max[k - 1][j + half]))
+            self._min[k].append(min(self._min[k - 1][j], self._min[k - 1][j + half]))
+            k += 1
+        self.last_closed_ts = ts
+
+    def sync(self, candles):
+        """
+        Brings the index up to date with a candle list ([ts, o, h, l, c, v], ascending).
+        Appends only days that closed since the last sync; rebuilds if history was rewritten.
+        """
+        closed = candles[:-1]
+        if not closed:
+            return
+        if self.last_closed_ts is None or closed[-1][0] < self.last_closed_ts:
+            self._build(closed)
+            return
+
+        # Walk back to the first day we have not indexed yet
+        i = len(closed)
+        while i > 0 and closed[i - 1][0] > self.last_closed_ts:
+            i -= 1
+        if i == 0 and len(self):
+            self._build(closed) # no overlap with what we indexed
+            return
+        for c in closed[i:]:
+            self.append(c[0], c[2], c[3])
+
+    def prior_high_low(self, period):
+        """
+        (high, low) of the `period` closed days before today, or (None, None)
+        when there are not enough of them (needs period+1 closed days, i.e.
+        period+2 candles including today, same rule as the scanner always used).
+        """
+        n = len(self)
+        if period < 1 or n < period + 1:
+            return None, None
+        k = period.bit_length() - 1
+        lo, hi = n - period, n - (1 << k)
+        return (max(self._max[k][lo], self._max[k][hi]),
+                min(self._min[k][lo], self._min[k][hi]))
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import logging
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("CandleStore")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CANDLE_DB_PATH = os.getenv("CANDLE_DB_PATH", os.path.join(BASE_DIR, "candles.db"))
+
+
+class CandleStore:
+    """
+    Persistent per-token candle history backed by SQLite.
+    Candles are kept in Angel's format: [timestamp, open, high, low, close, volume].
+    Reads are served from an in-memory copy that is written through on every upsert.
+    A process that reads candles another process writes (API workers) calls invalidate()
+    to pick up the other writer's changes.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = CandleStore()
+        return cls._instance
+
+    def __init__(self, path=CANDLE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = {} # (token, interval) -> list of candles (ascending)
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS candles (
+                token TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (token, interval, ts)
+            ) WITHOUT ROWID
+        """)
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _load(self, token, interval):
+        key = (token, interval)
+        candles = self._cache.get(key)
+        if candles is None:
+            rows = self._conn().execute(
+                "SELECT ts, open, high, low, close, volume FROM candles "
+                "WHERE token = ? AND interval = ? ORDER BY ts",
+                (token, interval)
+            ).fetchall()
+            candles = [list(r) for r in rows]
+            self._cache[key] = candles
+        return candles
+
+    def invalidate(self, token, interval="ONE_DAY"):
+        """Drops the in-memory copy of a token, so the next read comes from SQLite."""
+        with self._lock:
+            self._cache.pop((token, interval), None)
+
+    def tokens(self, interval="ONE_DAY"):
+        """Every token with stored candles for `interval`."""
+        with self._lock:
+            rows = self._conn().execute("SELECT DISTINCT token FROM candles WHERE interval = ?", (interval,)).fetchall()
+            return [r[0] for r in rows]
+
+    def last_timestamp(self, token, interval="ONE_DAY"):
+        """Timestamp string of the newest stored candle, or None if nothing is stored."""
+        with self._lock:
+            candles = self._load(token, interval)
+            return candles[-1][0] if candles else None
+
+    def get_candles(self, token, interval="ONE_DAY", since=None):
+        """
+        Returns stored candles (ascending). `since` is a "YYYY-MM-DD" string;
+        timestamps are ISO strings so a lexicographic comparison is enough.
+        """
+        with self._lock:
+            candles = self._load(token, interval)
+            if since:
+                candles = [c for c in candles if c[0] >= since]
+            return list(candles)
+
+    def upsert(self, token, candles, interval="ONE_DAY"):
+        """
+        Merges freshly fetched candles into the store. A candle with an existing
+        timestamp replaces the stored one (today's candle keeps changing intraday).
+        """
+        if not candles:
+            return
+        with self._lock:
+            conn = self._conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO candles (token, interval, ts, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(token, interval, c[0], c[1], c[2], c[3], c[4], c[5] if len(c) > 5 else None) for c in candles]
+            )
+            conn.commit()
+
+            merged = {c[0]: c for c in self._load(token, interval)}
+            for c in candles:
+                merged[c[0]] = list(c)
+            self._cache[(token, interval)] = [merged[ts] for ts in sorted(merged)]
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the SmartAPI REST endpoints the app uses (login, token refresh,
+candles, LTP, quotes), serving deterministic synthetic data.
+
+In-process:  AsyncSmartApi(transport=httpx.ASGITransport(app=fake_smartapi.app), root_url="http://fake")
+Standalone:  uvicorn fake_smartapi:app --port 9000, then SMARTAPI_ROOT_URL=http://127.0.0.1:9000
+Knobs (env): FAKE_LATENCY_MS (per request), FAKE_RATE_LIMIT (requests/second per route, 0 = off)
+"""
+import os
+import time
+import asyncio
+import hashlib
+from functools import lru_cache
+from datetime import datetime, timedelta
+
+import numpy as np
+from fastapi import FastAPI, Request
+
+try:
+    from .smartapi_async import ROUTES
+except ImportError:
+    from smartapi_async import ROUTES
+
+LATENCY = float(os.getenv("FAKE_LATENCY_MS", "0")) / 1000.0
+RATE_LIMIT = float(os.getenv("FAKE_RATE_LIMIT", "0"))
+
+app = FastAPI()
+app.state.calls = {}
+_windows = {} # route -> (second, count)
+
+
+def _seed(token):
+    return int(hashlib.md5(str(token).encode()).hexdigest()[:8], 16)
+
+
+def synthetic_candles(token, days=400, end=None):
+    """Deterministic daily candles (random walk) for a token, SmartAPI format."""
+    rng = np.random.default_rng(_seed(token))
+    end = end or datetime.now().replace(hour=9, minute=15, second=0, microsecond=0)
+    close = 100 + rng.uniform(0, 2000)
+    rows = []
+    day = end - timedelta(days=days)
+    while day <= end:
+        if day.weekday() < 5:
+            open_ = close * (1 + rng.normal(0, 0.005))
+            close = max(1.0, open_ * (1 + rng.normal(0, 0.015)))
+            high = max(open_, close) * (1 + abs(rng.normal(0, 0.005)))
+            low = min(open_, close) * (1 - abs(rng.normal(0, 0.005)))
+            rows.append([day.strftime("%Y-%m-%dT%H:%M:%S+05:30"), round(open_, 2), round(high, 2),
+                         round(low, 2), round(close, 2), int(rng.integers(10_000, 5_000_000))])
+        day += timedelta(days=1)
+    return rows
+
+
+@lru_cache(maxsize=20_000)
+def _history(token, day):
+    return synthetic_candles(token)
+
+
+def synthetic_quote(exchange, token, mode):
+    """LTP/OHLC/FULL-shaped quote around the token's last synthetic candle; drifts with wall-clock time."""
+    base = _history(str(token), datetime.now().date())[-1]
+    wiggle = 1 + 0.002 * np.sin(time.time() / 7 + _seed(token) % 100)
+    ltp = round(float(base[4] * wiggle), 2)
+    q = {"exchange": exchange, "tradingSymbol": f"SYM{token}", "symbolToken": str(token), "ltp": ltp}
+    if mode in ("OHLC", "FULL"):
+        q.update({"open": base[1], "high": max(base[2], ltp), "low": min(base[3], ltp), "close": base[4]})
+    if mode == "FULL":
+        q.update({"tradeVolume": base[5], "opnInterest": _seed(token) % 100_000, "netChange": round(ltp - base[4], 2)})
+    return q
+
+
+async def _gate(route):
+    app.state.calls[route] = app.state.calls.get(route, 0) + 1
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    if RATE_LIMIT:
+        sec = int(time.time())
+        window, count = _windows.get(route, (sec, 0))
+        count = count + 1 if window == sec else 1
+        _windows[route] = (sec, count)
+        if count > RATE_LIMIT:
+            return {"status": False, "message": "Access denied because of exceeding access rate", "errorcode": "AB1019", "data": None}
+    return None
+
+
+def _ok(data):
+    return {"status": True, "message": "SUCCESS", "errorcode": "", "data": data}
+
+
+@app.post(ROUTES["login"])
+async def login(request: Request):
+    body = await request.json()
+    if denied := await _gate("login"): return denied
+    if not body.get("clientcode") or not body.get("totp"):
+        return {"status": False, "message": "Invalid totp", "errorcode": "AB1050", "data": None}
+    return _ok({"jwtToken": f"jwt-{body['clientcode']}-{int(time.time())}", "refreshToken": "refresh-token", "feedToken": "feed-token"})
+
+
+@app.post(ROUTES["token"])
+async def generate_tokens(request: Request):
+    if denied := await _gate("token"): return denied
+    return _ok({"jwtToken": f"jwt-refreshed-{int(time.time())}", "refreshToken": "refresh-token", "feedToken": f"feed-{int(time.time())}"})
+
+
+@app.post(ROUTES["candle"])
+async def candle_data(request: Request):
+    body = await request.json()
+    if denied := await _gate("candle"): return denied
+    start = datetime.strptime(body["fromdate"], "%Y-%m-%d %H:%M")
+    rows = [r for r in _history(str(body["symboltoken"]), datetime.now().date()) if r[0][:10] >= start.strftime("%Y-%m-%d")]
+    return _ok(rows)
+
+
+@app.post(ROUTES["ltp"])
+async def ltp_data(request: Request):
+    body = await request.json()
+    if denied := await _gate("ltp"): return denied
+    q = synthetic_quote(body["exchange"], body["symboltoken"], "OHLC")
+    return _ok({"exchange": q["exchange"], "tradingsymbol": body.get("tradingsymbol"), "symboltoken": q["symbolToken"],
+                "open": q["open"], "high": q["high"], "low": q["low"], "close": q["close"], "ltp": q["ltp"]})
+
+
+@app.post(ROUTES["quote"])
+async def market_data(request: Request):
+    body = await request.json()
+    if denied := await _gate("quote"): return denied
+    fetched = [synthetic_quote(exchange, token, body["mode"])
+               for exchange, tokens in body["exchangeTokens"].items() for token in tokens]
+    return _ok({"fetched": fetched, "unfetched": []})
+
+
+@app.get("/fake/stats")
+async def stats():
+    return app.state.calls
@@ -0,0 +1,176 @@
+import math
+import numpy as np
+
+# Black-Scholes on spot, no dividends. Rate is annualised, continuous.
+RISK_FREE_RATE = 0.065
+MIN_VOL, MAX_VOL = 1e-4, 5.0
+SQRT_2PI = math.sqrt(2 * math.pi)
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / SQRT_2PI
+
+
+def norm_cdf(x):
+    """
+    Standard normal CDF via the Abramowitz-Stegun 7.1.26 erf approximation
+    (|error| < 1.5e-7), so the engine needs nothing beyond NumPy.
+    """
+    z = np.abs(x) / math.sqrt(2)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def _d1_d2(spot, strike, t, vol, rate):
+    sqrt_t = np.sqrt(t)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * t) / (vol * sqrt_t)
+    return d1, d1 - vol * sqrt_t
+
+
+def bs_price(spot, strike, t, vol, is_call, rate=RISK_FREE_RATE):
+    """Black-Scholes price for arrays of contracts (is_call: bool array)."""
+    d1, d2 = _d1_d2(spot, strike, t, vol, rate)
+    disc = strike * np.exp(-rate * t)
+    call = spot * norm_cdf(d1) - disc * norm_cdf(d2)
+    put = disc * norm_cdf(-d2) - spot * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def implied_vol(price, spot, strike, t, is_call, rate=RISK_FREE_RATE, tol=1e-6, newton_iter=20, bisect_iter=60):
+    """
+    Solves IV for every contract at once.
+    Newton steps run on all contracts together; contracts that have not converged
+    (tiny vega, deep wings, overshoot) are finished by a vectorized bisection on
+    [MIN_VOL, MAX_VOL]. Prices outside the no-arbitrage bounds give NaN.
+    """
+    price, spot, strike, t = (np.asarray(a, dtype=np.float64) for a in (price, spot, strike, t))
+    is_call = np.asarray(is_call, dtype=bool)
+    price, spot, strike, t, is_call = np.broadcast_arrays(price, spot, strike, t, is_call)
+
+    disc = strike * np.exp(-rate * t)
+    lower = np.where(is_call, np.maximum(spot - disc, 0.0), np.maximum(disc - spot, 0.0))
+    upper = np.where(is_call, spot, disc)
+    valid = (price > lower) & (price < upper) & (t > 0) & (spot > 0) & (strike > 0)
+
+    iv = np.full(price.shape, np.nan)
+    if not valid.any():
+        return iv
+    p, s, k, tt, c = price[valid], spot[valid], strike[valid], t[valid], is_call[valid]
+
+    # Brenner-Subrahmanyam start, clipped into a sane range
+    vol = np.clip(np.sqrt(2 * np.pi / tt) * p / s, 0.05, 2.0)
+    done = np.zeros(p.shape, dtype=bool)
+    active = np.arange(p.size) # Newton only keeps iterating the contracts still moving
+    for _ in range(newton_iter):
+        sa, ka, ta, va = s[active], k[active], tt[active], vol[active]
+        d1, _d2 = _d1_d2(sa, ka, ta, va, rate)
+        diff = bs_price(sa, ka, ta, va, c[active], rate) - p[active]
+        vega = sa * norm_pdf(d1) * np.sqrt(ta)
+        converged = np.abs(diff) < tol
+        done[active[converged]] = True
+        va = va - diff / np.maximum(vega, 1e-8)
+        # Stalled (flat vega) or thrown out of range: leave to the bisection
+        keep = ~converged & (vega >= 1e-8) & (va > MIN_VOL) & (va < MAX_VOL)
+        vol[active[keep]] = va[keep]
+        active = active[keep]
+        if active.size == 0: break
+
+    # Anything Newton could not settle: bisection (price is monotonic in vol)
+    todo = ~done
+    if todo.any():
+        lo = np.full(todo.sum(), MIN_VOL)
+        hi = np.full(todo.sum(), MAX_VOL)
+        s2, k2, t2, c2, p2 = s[todo], k[todo], tt[todo], c[todo], p[todo]
+        for _ in range(bisect_iter):
+            mid = 0.5 * (lo + hi)
+            above = bs_price(s2, k2, t2, mid, c2, rate) > p2
+            hi = np.where(above, mid, hi)
+            lo = np.where(above, lo, mid)
+        vol[todo] = 0.5 * (lo + hi)
+
+    iv[valid] = vol
+    return iv
+
+
+def greeks(spot, strike, t, vol, is_call, rate=RISK_FREE_RATE):
+    """
+    Greeks for arrays of contracts. Theta is per calendar day, vega per 1 vol point.
+    NaN vols give NaN greeks.
+    """
+    spot, strike, t, vol = (np.asarray(a, dtype=np.float64) for a in (spot, strike, t, vol))
+    is_call = np.asarray(is_call, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'): # unsolved contracts just stay NaN
+        sqrt_t = np.sqrt(t)
+        d1, d2 = _d1_d2(spot, strike, t, vol, rate)
+        pdf = norm_pdf(d1)
+        disc = strike * np.exp(-rate * t)
+
+        delta = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+        gamma = pdf / (spot * vol * sqrt_t)
+        vega = spot * pdf * sqrt_t / 100.0
+        decay = -spot * pdf * vol / (2 * sqrt_t)
+        theta = np.where(is_call, decay - rate * disc * norm_cdf(d2), decay + rate * disc * norm_cdf(-d2)) / 365.0
+    return {"delta": delta, "gamma": gamma, "theta": theta, "vega": vega}
+
+
+def max_pain(strikes, ce_oi, pe_oi):
+    """Strike at which option holders' total intrinsic payout is smallest."""
+    strikes = np.asarray(strikes, dtype=np.float64)
+    if strikes.size == 0:
+        return None
+    ce_oi = np.asarray(ce_oi, dtype=np.float64)
+    pe_oi = np.asarray(pe_oi, dtype=np.float64)
+    settle = strikes[:, None] # candidate settlement prices x listed strikes
+    payout = (np.maximum(settle - strikes, 0) * ce_oi).sum(axis=1) + \
+             (np.maximum(strikes - settle, 0) * pe_oi).sum(axis=1)
+    return float(strikes[np.argmin(payout)])
+
+
+def chain_analytics(spot, strikes, t, ce_ltp, pe_ltp, ce_oi=None, pe_oi=None,
+                    ce_volume=None, pe_volume=None, rate=RISK_FREE_RATE):
+    """
+    IV + Greeks for both legs of every strike, and the aggregate chain stats.
+    strikes/ce_*/pe_* are parallel arrays; spot and t (years) may be scalars or per strike,
+    so several expiries (or underlyings) can be solved in one call.
+    Missing quotes (ltp <= 0) come back as NaN.
+    """
+    strikes = np.asarray(strikes, dtype=np.float64)
+    n = strikes.size
+    zeros = np.zeros(n)
+    ce_oi = zeros if ce_oi is None else np.asarray(ce_oi, dtype=np.float64)
+    pe_oi = zeros if pe_oi is None else np.asarray(pe_oi, dtype=np.float64)
+    ce_volume = zeros if ce_volume is None else np.asarray(ce_volume, dtype=np.float64)
+    pe_volume = zeros if pe_volume is None else np.asarray(pe_volume, dtype=np.float64)
+
+    # Both legs in one solve: calls first, then puts
+    k2 = np.concatenate([strikes, strikes])
+    s2 = np.broadcast_to(np.asarray(spot, dtype=np.float64), (n,))
+    s2 = np.concatenate([s2, s2])
+    t2 = np.broadcast_to(np.asarray(t, dtype=np.float64), (n,))
+    t2 = np.concatenate([t2, t2])
+    price = np.concatenate([np.asarray(ce_ltp, dtype=np.float64), np.asarray(pe_ltp, dtype=np.float64)])
+    is_call = np.concatenate([np.ones(n, dtype=bool), np.zeros(n, dtype=bool)])
+
+    iv = implied_vol(price, s2, k2, t2, is_call, rate)
+    g = greeks(s2, k2, t2, iv, is_call, rate)
+
+    ce = {"iv": iv[:n], **{k: v[:n] for k, v in g.items()}}
+    pe = {"iv": iv[n:], **{k: v[n:] for k, v in g.items()}}
+
+    atm = int(np.argmin(np.abs(strikes - spot))) if n else None
+    atm_iv = None
+    if atm is not None:
+        pair = iv[[atm, n + atm]]
+        if np.isfinite(pair).any(): atm_iv = float(np.nanmean(pair))
+
+    ce_oi_total, pe_oi_total = ce_oi.sum(), pe_oi.sum()
+    ce_vol_total, pe_vol_total = ce_volume.sum(), pe_volume.sum()
+    stats = {
+        "pcr_oi": float(pe_oi_total / ce_oi_total) if ce_oi_total > 0 else None,
+        "pcr_volume": float(pe_vol_total / ce_vol_total) if ce_vol_total > 0 else None,
+        "max_pain": max_pain(strikes, ce_oi, pe_oi) if (ce_oi_total + pe_oi_total) > 0 else None,
+        "atm_iv": atm_iv,
+    }
+    return ce, pe, stats
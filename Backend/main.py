@@ -1,13 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 from SmartApi import SmartConnect
 import os
 import pyotp
-import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
 import threading
+import asyncio
+import json
+import time
+import functools
 from SmartApi.smartWebSocketV2 import SmartWebSocketV2
 
 
@@ -15,9 +20,45 @@ from SmartApi.smartWebSocketV2 import SmartWebSocketV2
 try:
     from .tokens import NIFTY_50_TOKENS
     from .scrip_master import ScripMaster
+    from .candle_store import CandleStore
+    from .metrics_engine import calculate_metrics_batch, check_breakout
+    from .breakout_index import BreakoutIndex
+    from .api_scheduler import SmartApiScheduler, LOW
+    from .quotes import fetch_quotes, fetch_quotes_async, QUOTE_MODES
+    from .market_store import MarketStore, encode_json
+    from .tick_ingest import TickIngestor
+    from .subscriptions import SubscriptionManager, NSE_CM, QUOTE
+    from .option_chain import OptionChainService
+    from .shared_snapshot import SharedSnapshotWriter, SharedSnapshotReader, WatchRequests, timeframe_path
+    from .smartapi_async import AsyncSmartApi, ROOT_URL as SMARTAPI_ROOT_URL
+    from .replay import Recorder, RecordingSmartConnect, RecordingAsyncSmartApi, FakeSmartConnect, FakeAsyncSmartApi, FakeWebSocket
+    from . import telemetry
+    from .scan_scheduler import ScanScheduler, staleness_from_state
+    from .session_manager import SessionManager, SessionError, is_auth_error
+    from .bar_builder import BarBuilder, TIMEFRAMES
+    from .screener import Screener, ScreenBook, ScreenError
+    from .response_encoding import ResponseEncoder, negotiate, encode_payload, encoded_response
 except ImportError:
     from tokens import NIFTY_50_TOKENS
     from scrip_master import ScripMaster
+    from candle_store import CandleStore
+    from metrics_engine import calculate_metrics_batch, check_breakout
+    from breakout_index import BreakoutIndex
+    from api_scheduler import SmartApiScheduler, LOW
+    from quotes import fetch_quotes, fetch_quotes_async, QUOTE_MODES
+    from market_store import MarketStore, encode_json
+    from tick_ingest import TickIngestor
+    from subscriptions import SubscriptionManager, NSE_CM, QUOTE
+    from option_chain import OptionChainService
+    from shared_snapshot import SharedSnapshotWriter, SharedSnapshotReader, WatchRequests, timeframe_path
+    from smartapi_async import AsyncSmartApi, ROOT_URL as SMARTAPI_ROOT_URL
+    from replay import Recorder, RecordingSmartConnect, RecordingAsyncSmartApi, FakeSmartConnect, FakeAsyncSmartApi, FakeWebSocket
+    import telemetry
+    from scan_scheduler import ScanScheduler, staleness_from_state
+    from session_manager import SessionManager, SessionError, is_auth_error
+    from bar_builder import BarBuilder, TIMEFRAMES
+    from screener import Screener, ScreenBook, ScreenError
+    from response_encoding import ResponseEncoder, negotiate, encode_payload, encoded_response
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -33,13 +74,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global SmartConnect Instance
-smartApi = SmartConnect(api_key=os.getenv("ANGEL_API_KEY"))
+# Offline record/replay:
+#   SMARTAPI_RECORD=<dir>  record candle/quote responses and websocket ticks while running live
+#   SMARTAPI_REPLAY=<dir>  run without Angel One: fake SmartConnect + websocket replaying <dir>
+#                          (synthetic data for anything not recorded), SMARTAPI_REPLAY_SPEED=x faster
+REPLAY_DIR = os.getenv("SMARTAPI_REPLAY")
+RECORD_DIR = os.getenv("SMARTAPI_RECORD")
+recorder = None
 
-# Cache for session (simple global var)
+# Global SmartConnect Instance
+if REPLAY_DIR:
+    smartApi = FakeSmartConnect(REPLAY_DIR, latency=float(os.getenv("SMARTAPI_REPLAY_LATENCY", 0)))
+    SmartWebSocketV2 = functools.partial(FakeWebSocket, directory=REPLAY_DIR, loop=True,
+                                         speed=float(os.getenv("SMARTAPI_REPLAY_SPEED", 1)))
+    for var in ("ANGEL_API_KEY", "ANGEL_CLIENT_CODE", "ANGEL_PASSWORD", "ANGEL_TOTP_SECRET"):
+        os.environ.setdefault(var, "REPLAY" if var != "ANGEL_TOTP_SECRET" else pyotp.random_base32())
+    print(f"SmartAPI: replaying {REPLAY_DIR}")
+elif RECORD_DIR:
+    recorder = Recorder(RECORD_DIR)
+    smartApi = RecordingSmartConnect(SmartConnect(api_key=os.getenv("ANGEL_API_KEY")), recorder)
+    print(f"SmartAPI: recording to {RECORD_DIR}")
+else:
+    smartApi = SmartConnect(api_key=os.getenv("ANGEL_API_KEY"))
+
+# Shared rate limiter / concurrency governor for every SmartAPI call
+scheduler = SmartApiScheduler.get_instance()
+
+# Pooled keep-alive client for coroutine callers (async endpoints, async scanner)
+if REPLAY_DIR:
+    async_api = FakeAsyncSmartApi(smartApi) # same recording as the sync client, no network
+else:
+    async_api = AsyncSmartApi(os.getenv("ANGEL_API_KEY"), root_url=os.getenv("SMARTAPI_ROOT_URL", SMARTAPI_ROOT_URL))
+if recorder is not None:
+    async_api = RecordingAsyncSmartApi(async_api, recorder) # the default async scanner and the quote endpoints
+
+# Current session payload (kept in sync by the session manager)
 session_data = None
 sws = None # Global WebSocket Instance
 
+# One login per process: concurrent callers share it, the JWT is renewed ahead of expiry
+sessions = SessionManager(smartApi)
+
+@sessions.on_session
+def _on_session(data, feed_token_changed):
+    global session_data
+    session_data = data
+    async_api.use_session(data)
+    # The scanner process owns the websocket; a new feed token needs a new connection
+    if ROLE != "api" and (sws is None or feed_token_changed):
+        restart_websocket()
+
+def _drop_session(session):
+    """on_auth_error hook for quote calls made with `session`: re-login once, not on a newer session."""
+    jwt = session.get('jwtToken') if session else None
+    return lambda: sessions.invalidate(jwt)
+
+def _quotes_with_session(instruments, mode):
+    """Sync quote fetch (option chain seeding) that logs in first if this process has no session yet."""
+    session = sessions.ensure()
+    return fetch_quotes(smartApi, scheduler, instruments, mode=mode, on_auth_error=_drop_session(session))
+
 
 @app.get("/")
 def read_root():
@@ -50,49 +144,23 @@ def login():
     """
     Authenticates with Angel One using API Key, Client Code, Password, and TOTP.
     """
-    global session_data
     try:
-        api_key = os.getenv("ANGEL_API_KEY")
-        client_code = os.getenv("ANGEL_CLIENT_CODE")
-        password = os.getenv("ANGEL_PASSWORD")
-        totp_secret = os.getenv("ANGEL_TOTP_SECRET")
-
-        if not all([api_key, client_code, password, totp_secret]):
+        if not os.getenv("ANGEL_API_KEY"):
              raise HTTPException(status_code=500, detail="Missing credentials in .env")
-
-        # Generate TOTP
-        try:
-            totp = pyotp.TOTP(totp_secret).now()
-        except Exception:
-            raise HTTPException(status_code=500, detail="Invalid TOTP Secret")
-        
-        # Login
-        data = smartApi.generateSession(client_code, password, totp)
-        
-        if data['status'] == False:
-             raise HTTPException(status_code=401, detail=data['message'])
-        
-        session_data = data['data']
-        
-        # Start WebSocket if not already running
-        if not sws:
-            start_websocket()
-            
-        return {"status": "success", "message": "Connected to Angel One", "data": {"client_code": client_code}}
+        sessions.login()
+        return {"status": "success", "message": "Connected to Angel One", "data": {"client_code": sessions.client_code}}
         
     except Exception as e:
         logger.error(f"Login failed: {e}")
         return {"status": "error", "message": str(e)}
 
 @app.get("/market-data/{symbol_token}")
-def get_market_data(symbol_token: str):
+async def get_market_data(symbol_token: str):
     """
     Fetch market data. 
     """
     try:
-        # Check session
-        if not session_data and not smartApi.access_token:
-            login()
+        session = await sessions.ensure_async()
 
         # Mapping logic
         token_map = NIFTY_50_TOKENS # Use imported map
@@ -103,47 +171,148 @@ def get_market_data(symbol_token: str):
         if not token:
             token = symbol_token
         
-        exchange = "NSE"
-        if token == "99926000": # Nifty 50
-             tradingsymbol = "NIFTY"
-        else:
-             tradingsymbol = f"{symbol_token.upper()}-EQ" 
-
-        data = smartApi.ltpData(exchange, tradingsymbol, token)
-        return data
+        _watch_tokens([token])
+        quotes = await fetch_quotes_async(async_api, scheduler, [("NSE", token)], mode="LTP", on_auth_error=_drop_session(session))
+        quote = quotes.get(("NSE", str(token)))
+        if not quote:
+            return {"status": False, "message": "No data", "data": None}
+        return {"status": True, "message": "SUCCESS", "data": quote}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.get("/indices")
-def get_indices():
+async def get_indices():
     """
     Fetches live data for NIFTY and BANKNIFTY Indices.
     """
     try:
-        # Check session
-        if not session_data and not smartApi.access_token:
-            login()
+        session = await sessions.ensure_async()
             
-        tokens = ["99926000", "99926009"] # Nifty, BankNifty
+        tokens = {"99926000": "NIFTY", "99926009": "BANKNIFTY"}
         results = {}
         
-        for token in tokens:
-            name = "NIFTY" if token == "99926000" else "BANKNIFTY"
-            data = smartApi.ltpData("NSE", name, token)
-            if data and data.get('data'):
-                results[name] = data['data']
+        # One round-trip for both indices (OHLC carries the ltp/open/high/low/close the UI needs)
+        quotes = await fetch_quotes_async(async_api, scheduler, [("NSE", t) for t in tokens], mode="OHLC",
+                                          on_auth_error=_drop_session(session))
+        for token, name in tokens.items():
+            if ("NSE", token) in quotes:
+                results[name] = quotes[("NSE", token)]
                 
         return {"status": "success", "data": results}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 # --- Background Scanner ---
-market_cache = {}
+# Process role:
+#   all     - scanner + websocket + API in one process (default, single worker)
+#   scanner - same as all, and also publishes the table to the shared snapshot file
+#   api     - no scanner/websocket; serves the table mapped from the scanner's snapshot file,
+#             so any number of workers (uvicorn --workers N) can run next to one scanner
+ROLE = os.getenv("NGTA_ROLE", "all").lower()
+ScripMaster.owner = ROLE != "api" # API workers map the scanner's scrip cache, they never download it
+
+if ROLE == "api":
+    market_store = SharedSnapshotReader() # read-only, same read interface as MarketStore
+else:
+    market_store = MarketStore() # versioned table, feeds the push stream
+market_cache = market_store.rows # read-only alias; write through market_store (scanner side only)
 token_map_reverse = {} # Token -> Symbol
+indicator_states = {} # Token -> IndicatorState (live RSI/MACD/breakouts per tick)
+breakout_indexes = {} # Token -> BreakoutIndex (O(1) prior high/low for any lookback)
 is_scanner_running = False
 
+def apply_ticks(batch):
+    """Applies one coalesced batch (last tick per token) to the market table in a single write."""
+    updates = {}
+    for (exchange_type, tok), message in batch.items():
+        if exchange_type != NSE_CM: continue # F&O ticks (option chains) share the feed, and token numbers across segments
+        sym = token_map_reverse.get(tok)
+        if sym is None or 'last_traded_price' not in message: continue
+        # SmartWebSocketV2 sends prices in paise
+        ltp = message['last_traded_price'] / 100.0
+        state = indicator_states.get(tok)
+        fields = {}
+        if 'open_price_of_the_day' in message: # Quote / SnapQuote ticks
+            day_open = message['open_price_of_the_day'] / 100.0
+            prev_close = message.get('closed_price', 0) / 100.0
+            fields = {
+                'open': day_open,
+                'high': message.get('high_price_of_the_day', 0) / 100.0,
+                'low': message.get('low_price_of_the_day', 0) / 100.0,
+                'volume': message.get('volume_trade_for_the_day', 0),
+            }
+            # The exchange's own open / previous close keep change and dominance exact intraday
+            if state:
+                if day_open > 0: state.open_today = day_open
+                if prev_close > 0: state.prev_close = prev_close
+        # O(1) refresh of change/RSI/MACD/score/breakouts from the live price
+        fields.update(state.update(ltp) if state else {'ltp': ltp})
+        updates[sym] = fields
+    market_store.update_many_fields(updates)
+    option_chains.apply_ticks(batch)
+    bars.apply_ticks(batch)
+    telemetry.observe_tick_lag(batch)
+
+tick_ingestor = TickIngestor(apply_ticks)
+
+# Intraday bars built from the same ticks, and one scanner table per timeframe
+bars = BarBuilder()
+if ROLE == "api":
+    timeframe_stores = {tf: SharedSnapshotReader(timeframe_path(tf)) for tf in TIMEFRAMES}
+else:
+    timeframe_stores = {tf: MarketStore() for tf in TIMEFRAMES}
+SCANNER_URL = os.getenv("NGTA_SCANNER_URL") # api role: where /bars and /options-chain are forwarded (e.g. http://127.0.0.1:8001)
+INTRADAY_REFRESH = 1.0 # seconds between intraday metric recomputes
+
+def intraday_scanner():
+    """Recomputes RSI/MACD/score/breakouts on every timeframe whose bars moved (vectorized, no REST)."""
+    seen = {}
+    while True:
+        time.sleep(INTRADAY_REFRESH)
+        for tf, store in timeframe_stores.items():
+            try:
+                version = bars.version(tf)
+                if seen.get(tf) == version: continue
+                seen[tf] = version
+                tokens, opens, highs, lows, closes, _, _, lengths = bars.arrays(tf, list(token_map_reverse))
+                items = [(token_map_reverse[t], t, None) for t in tokens]
+                store.update_rows(calculate_metrics_batch(items, arrays=(opens, highs, lows, closes, lengths)))
+            except Exception as e:
+                logger.error(f"Intraday {tf} scan failed: {e}")
+
+# Feed mode for the scanner universe: Quote carries OHLC, prev close and volume
+EQUITY_FEED_MODE = int(os.getenv("WS_EQUITY_MODE", QUOTE))
+subscriptions = SubscriptionManager()
+
+# Live option chains share the same socket (NFO legs in SnapQuote mode)
+option_chains = OptionChainService(
+    ScripMaster.get_instance, subscriptions,
+    quote_fn=_quotes_with_session,
+    spot_token_fn=lambda name: NIFTY_50_TOKENS.get(name) or ScripMaster.get_instance().get_equity_token(name),
+    width=int(os.getenv("OPTION_CHAIN_STRIKES", 5)),
+)
+
+def _run_websocket(ws):
+    """Keeps one websocket alive: reconnects with backoff until it is replaced or closed."""
+    backoff = 1
+    while sws is ws:
+        # The library's own resubscribe replays a stale request log; the manager resubscribes instead
+        ws.RESUBSCRIBE_FLAG = False
+        ws.input_request_dict = {}
+        started = time.time()
+        try:
+            ws.connect()
+        except Exception as e:
+            print("WebSocket Error:", e)
+        if sws is not ws: break # replaced (new feed token): the new socket owns the subscriptions
+        subscriptions.on_disconnected()
+        if time.time() - started > 60: backoff = 1 # it was up for a while, start over
+        print(f"WebSocket: Disconnected, reconnecting in {backoff}s")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
 def start_websocket():
-    global sws, session_data
+    global sws
     try:
         if not session_data: return
         
@@ -152,390 +321,702 @@ def start_websocket():
         client_code = os.getenv("ANGEL_CLIENT_CODE")
         feed_token = session_data['feedToken']
         
-        sws = SmartWebSocketV2(auth_token, api_key, client_code, feed_token)
+        # max_retry_attempt=0: let connect() return on errors, _run_websocket owns reconnects
+        ws = SmartWebSocketV2(auth_token, api_key, client_code, feed_token, max_retry_attempt=0)
         
         def on_data(wsapp, message):
-            # print("Ticks:", message)
-            if 'token' in message and 'last_traded_price' in message:
-                print(f"WS Tick: {message['token']} -> {message['last_traded_price']}")
-                tok = message['token']
-                # Clean token (sometimes comes with quotes or extra chars?) - usually clean string
-                
-                # Find symbol
-                if tok in token_map_reverse:
-                    sym = token_map_reverse[tok]
-                    if sym in market_cache:
-                        market_cache[sym]['ltp'] = message['last_traded_price'] / 100.0 # V2 usually sends in paise? Check docs. standard is usually normal price but let's verify.
-                        # Actually SmartWebSocketV2 usually sends data as is.
-                        # Wait, V2 often sends LTP as float directly.
-                        market_cache[sym]['ltp'] = message['last_traded_price'] / 100.0
-                        
-                        # Calculate change if open/close available or just update LTP
-                        # message usually has 'change_percent' or 'net_change'
-                        # V2 structure: subscription_mode, exchange_type, token, sequence_number, exchange_timestamp, last_traded_price, subscription_mode_val
-                        # It might NOT have change_percent in mode 1 (LTP).
-                        # Let's assume we get decent data.
-                        pass
+            # Runs on the websocket thread: just enqueue, the ingestor applies batches
+            tick_ingestor.push(message)
+            if recorder: recorder.tick(message)
 
         def on_open(wsapp):
             print("WebSocket: Connected")
+            subscriptions.on_connected() # (re)subscribe everything wanted
             
         def on_error(wsapp, error):
             print("WebSocket Error:", error)
+
+        def on_close(wsapp):
+            if sws is ws: subscriptions.on_disconnected()
             
-        sws.on_data = on_data
-        sws.on_open = on_open
-        sws.on_error = on_error
+        ws.on_data = on_data
+        ws.on_open = on_open
+        ws.on_error = on_error
+        ws.on_close = on_close
+        subscriptions.attach(ws)
+        sws = ws
+        tick_ingestor.start()
         
         # Run WS in separate thread to avoid blocking scanner
-        t_ws = threading.Thread(target=sws.connect, daemon=True)
+        t_ws = threading.Thread(target=_run_websocket, args=(ws,), daemon=True)
         t_ws.start()
         
     except Exception as e:
         print("WebSocket Init Failed:", e)
 
-def subscribe_to_tokens(tokens):
-    global sws
-    if sws:
-        try:
-            # Mode 1: LTP Only (Fastest)
-            # ExchangeType 1: NSE
-            token_list = [{"exchangeType": 1, "tokens": tokens}]
-            sws.subscribe("correlation_id", 1, token_list)
-            print(f"WebSocket: Subscribed to {len(tokens)} tokens")
-        except Exception as e:
-            print("Subscribe Failed:", e)
+def restart_websocket():
+    """Connects with the current session's feed token and retires the previous socket."""
+    old = sws
+    start_websocket()
+    if old is not None and old is not sws:
+        try: old.close_connection()
+        except Exception as e: logger.warning(f"Closing old websocket failed: {e}")
+
+
+# threads: candle fetches on a thread pool through SmartConnect
+# async:   candle fetches as coroutines on the app's event loop through the pooled async client
+# (replay runs use the threads path: the fake SmartConnect stands in for the REST API)
+SCANNER_MODE = os.getenv("SCANNER_MODE", "threads" if REPLAY_DIR else "async").lower()
+CANDLE_FMT = "%Y-%m-%d %H:%M"
+
+HOT_MOVE_PCT = float(os.getenv("SCAN_HOT_MOVE_PCT", 2.0)) # |change today| that makes a stock hot
+HOT_NEAR_PCT = float(os.getenv("SCAN_HOT_NEAR_PCT", 1.0)) # distance to a breakout level that makes it hot
+SCAN_BATCH = 200 # most symbols fetched per scanner pass
+UNIVERSE_REFRESH = 300 # seconds between re-reading the F&O list
+
+def _is_hot(token):
+    """Moving hard today, or trading within HOT_NEAR_PCT of its 10/30-day high or low."""
+    row = market_cache.get(token_map_reverse.get(token))
+    if not row: return False
+    if abs(row.get('change_pct') or 0) >= HOT_MOVE_PCT: return True
+    ltp = row.get('ltp') or 0
+    for level in (row.get('high_10d'), row.get('low_10d'), row.get('high_30d'), row.get('low_30d')):
+        if level and ltp and abs(ltp - level) / level * 100 <= HOT_NEAR_PCT:
+            return True
+    return False
+
+# Per-tier refresh deadlines (index / watchlist / hot / cold) instead of fixed full sweeps
+scan_queue = ScanScheduler(is_hot=_is_hot)
+
+def _scan_targets():
+    """F&O stocks; NIFTY 50 members are the index tier."""
+    return ScripMaster.get_instance().get_all_fno_tokens()
+
+def _refresh_universe(last_refresh):
+    """Re-reads the F&O list every UNIVERSE_REFRESH seconds. Returns the new refresh time."""
+    if time.time() - last_refresh < UNIVERSE_REFRESH:
+        return last_refresh
+    targets = _scan_targets()
+    if not targets: return last_refresh
+    scan_queue.set_universe(targets, index_tokens=NIFTY_50_TOKENS.values())
+    return time.time()
+
+watch_requests = WatchRequests() # api role -> scanner process
+
+def _watch_tokens(tokens):
+    """Watchlist tier: symbols users ask for keep fresh candles for a while (API workers forward them to the scanner)."""
+    if ROLE == "api":
+        watch_requests.send(tokens)
+    else:
+        scan_queue.watch(tokens)
+
+def _candle_request(tok, from_date, to_date):
+    """
+    Incremental fetch: only pull from the newest stored day onwards
+    (that day is re-fetched because today's candle keeps changing).
+    """
+    last_ts = CandleStore.get_instance().last_timestamp(tok)
+    fetch_from = datetime.strptime(last_ts[:10], "%Y-%m-%d") if last_ts else from_date
+    return {
+        "exchange": "NSE", "symboltoken": tok, "interval": "ONE_DAY",
+        "fromdate": fetch_from.strftime(CANDLE_FMT), "todate": to_date.strftime(CANDLE_FMT)
+    }
 
+def _store_candles(sym, tok, res, from_date):
+    """Saves a candle response and returns (sym, tok, candles) from the store, or None."""
+    store = CandleStore.get_instance()
+    if res and res.get('data'):
+        store.upsert(tok, res['data'])
+    
+    # Serve from the store even if this cycle's fetch failed
+    candles = store.get_candles(tok, since=from_date.strftime("%Y-%m-%d"))
+    if not candles: return None
+    
+    # Extend the breakout index with any day that closed since the last cycle
+    idx = breakout_indexes.get(tok)
+    if idx is None:
+        breakout_indexes[tok] = BreakoutIndex(candles)
+    else:
+        idx.sync(candles)
+    return (sym, tok, candles)
+
+def _publish_scan(fetched, targets, start_time):
+    """Recomputes and publishes the symbols refreshed in this pass, then re-queues them by tier."""
+    got = {x[1] for x in fetched}
+    
+    # One vectorized pass over the batch
+    with telemetry.METRICS_SECONDS.time():
+        rows, states = calculate_metrics_batch(fetched, with_state=True, indexes=breakout_indexes)
+    for res in rows:
+        token_map_reverse[res['token']] = res['symbol']
+    market_store.update_rows(rows)
+    market_store.publish() # pre-sort and pre-encode once per pass
+    indicator_states.update(states)
+    for item in targets:
+        scan_queue.done(item['token'], item['token'] in got)
+    
+    # Only tokens that entered/left the universe go over the socket
+    subscriptions.set_group("scanner", [x['token'] for x in market_cache.values()], NSE_CM, EQUITY_FEED_MODE)
+    
+    elapsed = time.time() - start_time
+    telemetry.SCAN_CYCLE_SECONDS.labels(SCANNER_MODE).observe(elapsed)
+    telemetry.SCAN_UNIVERSE.set(scan_queue.stats()["universe"])
+    telemetry.SCAN_DROPPED.set(scan_queue.failing)
+    telemetry.CACHE_ROWS.set(len(market_cache))
+    logger.debug(f"Scanner: Refreshed {len(fetched)}/{len(targets)} stocks in {elapsed:.2f}s ({SCANNER_MODE})")
 
 def background_scanner():
-    global is_scanner_running, market_cache
+    global is_scanner_running
     print("Scanner: Started")
+    universe_at = 0
     
-    # Define Processing Logic Internal to Scanner (or move global)
-    def calculate_metrics(symbol, token, hist_data):
+    while True:
         try:
-            if len(hist_data) < 5: return None
-            
-            c0 = hist_data[-1][4]
-            c1 = hist_data[-2][4]
-            c2 = hist_data[-3][4]
-            c3 = hist_data[-4][4]
-            
-            change_current = ((c0 - c1) / c1) * 100
-            change_1d = ((c1 - c2) / c2) * 100
-            change_2d = ((c2 - c3) / c3) * 100
-            change_3d = ((c3 - hist_data[-5][4]) / hist_data[-5][4]) * 100
-            
-            avg_3d = (change_current + change_1d + change_2d + change_3d) / 4.0
-            
-            # Dom
-            def get_dom(candle): return "Buyers" if candle[4] > candle[1] else "Sellers"
-            dom_current = get_dom(hist_data[-1])
-            dom_1d = get_dom(hist_data[-2])
-            dom_2d = get_dom(hist_data[-3])
-            dom_3d = get_dom(hist_data[-4])
-            
-            bulls = [dom_current, dom_1d, dom_2d, dom_3d].count("Buyers")
-            avg_dom_3d = "Buyers" if bulls >= 3 else "Sellers" if bulls <= 1 else "Balance"
+            try: sessions.ensure()
+            except SessionError as e:
+                logger.warning(f"Scanner: no session ({e})")
+                time.sleep(10); continue
             
-            # Indicators
-            prices = [x[4] for x in hist_data]
-            s = pd.Series(prices)
-            
-            # RSI
-            delta = s.diff()
-            gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            cur_rsi = rsi.iloc[-1] if not pd.isna(rsi.iloc[-1]) else 50
-            
-            # MACD
-            e12 = s.ewm(span=12, adjust=False).mean()
-            e26 = s.ewm(span=26, adjust=False).mean()
-            macd = e12 - e26
-            sig = macd.ewm(span=9, adjust=False).mean()
-            hist = macd - sig
-            
-            h_val = hist.iloc[-1]
-            h_prev = hist.iloc[-2]
-            
-            macd_sig = "Neutral"
-            if h_val > 0: macd_sig = "Bullish Growing" if h_val > h_prev else "Bullish Waning"
-            elif h_val < 0: macd_sig = "Bearish Growing" if h_val < h_prev else "Bearish Waning"
+            universe_at = _refresh_universe(universe_at)
+            targets = scan_queue.take_due(SCAN_BATCH)
+            if not targets:
+                wait = scan_queue.next_due_in()
+                time.sleep(min(wait if wait is not None else 10, 1.0)); continue
+
+            to_date = datetime.now()
+            from_date = to_date - timedelta(days=400) # Fetch >1 year for 52W/100D
+            jwt = session_data.get('jwtToken') if session_data else None
             
-            # Score
-            score = 50
-            if cur_rsi > 50: score += 10
-            if cur_rsi > 70: score -= 5
-            if macd.iloc[-1] > sig.iloc[-1]: score += 15
-            if change_current > 0: score += 10
-            if dom_current == "Buyers": score += 5
-            sentiment = "Neutral"
-            if score > 75: sentiment = "STRONG BUY"
-            elif score > 60: sentiment = "Bullish"
-            elif score < 30: sentiment = "STRONG SELL"
-            elif score < 40: sentiment = "Bearish"
-
-            # Breakout Calculations (10, 30, 50 Days)
-            def get_high_low(period):
-                # Need period+1 candles (hist_data[-1] is c0/today, we need previous)
-                if len(hist_data) < period + 2: return None, None
-                past_data = hist_data[-(period+1):-1]
-                if not past_data: return None, None
-                
-                max_h = max([x[2] for x in past_data])
-                min_l = min([x[3] for x in past_data])
-                return max_h, min_l
+            def process_item(item):
+                sym, tok = item['symbol'], item['token']
+                res = None
+                try:
+                    res = scheduler.call("historical", smartApi.getCandleData,
+                                         _candle_request(tok, from_date, to_date), priority=LOW)
+                    if is_auth_error(res): sessions.invalidate(jwt) # one re-login for the whole batch
+                except Exception as e:
+                    logger.warning(f"Candle fetch failed for {sym}: {e}")
+                return _store_candles(sym, tok, res, from_date)
 
-            h10, l10 = get_high_low(10)
-            h30, l30 = get_high_low(30)
-            h50, l50 = get_high_low(50)
+            import concurrent.futures
+            start_time = time.time()
+            # Workers only block on the scheduler, which decides the real concurrency
+            with concurrent.futures.ThreadPoolExecutor(max_workers=scheduler.max_concurrency) as ex:
+                fetched = [x for x in ex.map(process_item, targets) if x]
+            _publish_scan(fetched, targets, start_time)
             
-            # 1-Day Breakout (Yesterday's High/Low)
-            h1, l1 = get_high_low(1) 
-            h100, l100 = get_high_low(100)
-            h52w, l52w = get_high_low(250) # Approx 52 Weeks (Trading Days)
-
-            def check_breakout(max_h, min_l):
-                if max_h and c0 > max_h: return "Bullish Breakout"
-                if min_l and c0 < min_l: return "Bearish Breakout"
-                return "Consolidating" # or None
-
-            bo_1 = check_breakout(h1, l1)
-            bo_10 = check_breakout(h10, l10)
-            bo_30 = check_breakout(h30, l30)
-            bo_50 = check_breakout(h50, l50)
-            bo_100 = check_breakout(h100, l100)
-            bo_52w = check_breakout(h52w, l52w)
-
-            return {
-                "symbol": symbol, "token": token, "ltp": c0,
-                "change_pct": round(change_current, 2),
-                "rsi": round(cur_rsi, 2), "strength_score": round(score, 1),
-                "sentiment": sentiment,
-                "change_current": round(change_current, 2),
-                "change_1d": round(change_1d, 2),
-                "change_2d": round(change_2d, 2),
-                "change_3d": round(change_3d, 2),
-                "avg_3d": round(avg_3d, 2),
-                "avg_dom_3d": avg_dom_3d,
-                "dom_current": dom_current, "dom_1d": dom_1d,
-                "dom_2d": dom_2d, "dom_3d": dom_3d,
-                "macd_signal": macd_sig,
-                "breakout_1d": bo_1,
-                "breakout_10d": bo_10,
-                "breakout_30d": bo_30,
-                "breakout_50d": bo_50,
-                "breakout_100d": bo_100,
-                "breakout_52w": bo_52w,
-                "high_1d": h1, "low_1d": l1,
-                "high_10d": h10, "low_10d": l10,
-                "high_30d": h30, "low_30d": l30,
-                "high_50d": h50, "low_50d": l50,
-                "high_100d": h100, "low_100d": l100,
-                "high_52w": h52w, "low_52w": l52w
-            }
         except Exception as e:
-            return None
+            print("Scanner Crash:", e)
+            time.sleep(30)
 
+async def background_scanner_async():
+    """Same loop as background_scanner, with every candle fetch a coroutine on the event loop."""
+    print("Scanner: Started (async)")
+    universe_at = 0
+    
     while True:
         try:
-            if not session_data and not smartApi.access_token:
-                try: login()
-                except: pass
-            
-            sm = ScripMaster.get_instance()
-            fno = sm.get_all_fno_tokens()
-            
-            nifty = set(NIFTY_50_TOKENS.keys())
-            targets = [x for x in fno if x['symbol'] in nifty] + \
-                      [x for x in fno if x['symbol'] not in nifty]
+            try: await sessions.ensure_async()
+            except SessionError as e:
+                logger.warning(f"Scanner: no session ({e})")
+                await asyncio.sleep(10); continue
             
+            universe_at = await asyncio.to_thread(_refresh_universe, universe_at)
+            targets = scan_queue.take_due(SCAN_BATCH)
             if not targets:
-                import time; time.sleep(10); continue
+                wait = scan_queue.next_due_in()
+                await asyncio.sleep(min(wait if wait is not None else 10, 1.0)); continue
 
             to_date = datetime.now()
             from_date = to_date - timedelta(days=400) # Fetch >1 year for 52W/100D
-            fmt = "%Y-%m-%d %H:%M"
+            jwt = session_data.get('jwtToken') if session_data else None
             
-            def process_item(item):
+            async def process_item(item):
                 sym, tok = item['symbol'], item['token']
-                # Retry Logic
-                for i in range(3):
-                    try:
-                        res = smartApi.getCandleData({
-                            "exchange": "NSE", "symboltoken": tok, "interval": "ONE_DAY",
-                            "fromdate": from_date.strftime(fmt), "todate": to_date.strftime(fmt)
-                        })
-                        if res and res.get('data'):
-                            return calculate_metrics(sym, tok, res['data'])
-                        if i == 2: return None
-                        import time; time.sleep(0.5)
-                    except Exception as e:
-                        if "rate" in str(e).lower():
-                            import time; time.sleep(1.0 * (i+1)); continue
-                        return None
-                return None
+                res = None
+                try:
+                    res = await scheduler.acall("historical", async_api.get_candle_data,
+                                                _candle_request(tok, from_date, to_date), priority=LOW)
+                    if is_auth_error(res): sessions.invalidate(jwt) # one re-login for the whole batch
+                except Exception as e:
+                    logger.warning(f"Candle fetch failed for {sym}: {e}")
+                # SQLite + breakout index work stays off the event loop
+                return await asyncio.to_thread(_store_candles, sym, tok, res, from_date)
 
-            import concurrent.futures
-            import time
             start_time = time.time()
-            # 52 workers for ULTRA FAST loading (Aggressive)
-            with concurrent.futures.ThreadPoolExecutor(max_workers=52) as ex:
-                futures = {ex.submit(process_item, item): item for item in targets}
-                for f in concurrent.futures.as_completed(futures):
-                    res = f.result()
-                    if res: 
-                        market_cache[res['symbol']] = res
-                        token_map_reverse[res['token']] = res['symbol']
-            
-            # Subscribe WS to new tokens
-            if sws:
-                tokens = [x['token'] for x in market_cache.values()]
-                subscribe_to_tokens(tokens)
-            
-            elapsed = time.time() - start_time
-            print(f"Scanner: Updated {len(market_cache)} stocks in {elapsed:.2f} seconds. CacheID: {id(market_cache)}")
-            import time; time.sleep(15) # 15s Hybrid Interval (WS handles real-time)
+            # Every fetch of the batch is in flight at once; the scheduler decides the real concurrency
+            fetched = [x for x in await asyncio.gather(*(process_item(t) for t in targets)) if x]
+            await asyncio.to_thread(_publish_scan, fetched, targets, start_time)
             
         except Exception as e:
             print("Scanner Crash:", e)
-            import time; time.sleep(30)
+            await asyncio.sleep(30)
 
 
+response_encoder = ResponseEncoder()
+
+GOD_MODE_FILTERS = {
+    # query param -> (row field, test)
+    "min_price": ("ltp", lambda v, x: v >= x),
+    "max_price": ("ltp", lambda v, x: v <= x),
+    "min_rsi": ("rsi", lambda v, x: v >= x),
+    "max_rsi": ("rsi", lambda v, x: v <= x),
+    "min_score": ("strength_score", lambda v, x: v >= x),
+}
+
 @app.get("/god-mode")
-def god_mode():
+@telemetry.HANDLER_SECONDS.labels("god_mode").time()
+def god_mode(request: Request, timeframe: str = "1d", since: int = None, symbol: str = None,
+             min_price: float = None, max_price: float = None, min_rsi: float = None, max_rsi: float = None,
+             min_score: float = None, sentiment: str = None, sort: str = None, order: str = "desc",
+             fields: str = None, offset: int = Query(0, ge=0), limit: int = Query(None, ge=1)):
     """
     Returns data from the Background Scanner INSTANTLY.
+    Served from the published snapshot (sorted and pre-encoded once per version):
+    - ETag / If-None-Match -> 304 when nothing changed
+    - since=<version> returns only rows changed after that version
+    - symbol/min_price/max_price/min_rsi/max_rsi/min_score/sentiment filters,
+      sort=<field>&order=asc|desc, fields=a,b,c projection, offset/limit paging
+    - timeframe=1d (daily scan) or 1m/5m/15m/60m: the same metrics on intraday bars
+      built from ticks (breakout periods then count bars)
     """
-    data = list(market_cache.values())
-    print(f"API Request: Cache Size = {len(market_cache)}")
-    # Sort
-    sorted_data = sorted(data, key=lambda x: x['strength_score'], reverse=True)
+    snap = _timeframe_store(timeframe).publish()
+    variant = negotiate(request)
+    etag = f'"{snap.version}{variant.tag}"' if timeframe == "1d" else f'"{timeframe}-{snap.version}{variant.tag}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept, Accept-Encoding"})
+    status = _scanner_status()
     
-    return {
-        "status": "success", 
-        "data": sorted_data, 
-        "count": len(sorted_data),
-        "scanner_status": "Running" if is_scanner_running else "Stopped",
-        "debug_cache_id": id(market_cache),
-        "debug_cache_len": len(market_cache)
-    }
+    def build():
+        rows = snap.rows
+        idx = range(len(rows))
+        if since is not None:
+            idx = [i for i in idx if snap.row_versions[rows[i]['symbol']] > since]
+        if symbol:
+            needle = symbol.lower()
+            idx = [i for i in idx if needle in rows[i]['symbol'].lower()]
+        if sentiment and sentiment != "All":
+            idx = [i for i in idx if rows[i]['sentiment'] == sentiment]
+        params = {"min_price": min_price, "max_price": max_price, "min_rsi": min_rsi, "max_rsi": max_rsi, "min_score": min_score}
+        for name, x in params.items():
+            if x is None: continue
+            field, test = GOD_MODE_FILTERS[name]
+            idx = [i for i in idx if rows[i].get(field) is not None and test(rows[i][field], x)]
+        
+        # Snapshot rows are already sorted by strength_score desc
+        resort = bool(sort) and not (sort == "strength_score" and order != "asc")
+        if resort:
+            if rows and sort not in rows[0]:
+                raise HTTPException(status_code=400, detail=f"Unknown sort field: {sort}")
+            present = [i for i in idx if rows[i].get(sort) is not None]
+            present.sort(key=lambda i: rows[i][sort], reverse=(order != "asc"))
+            idx = present + [i for i in idx if rows[i].get(sort) is None]
+        
+        idx = list(idx)
+        total = len(idx)
+        if offset or limit:
+            idx = idx[offset:offset + limit if limit else None]
+        keep = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        
+        head = {
+            "status": "success",
+            "version": snap.version,
+            "count": len(idx),
+            "total": total,
+            "scanner_status": status,
+        }
+        if variant.layout != "rows" or variant.fmt != "json":
+            data = [{f: rows[i].get(f) for f in keep} for i in idx] if keep else [rows[i] for i in idx]
+            return encode_payload({**head, "data": data}, variant)
+        if keep:
+            data = encode_json([{f: rows[i].get(f) for f in keep} for i in idx])
+        elif len(idx) == len(rows) and not resort:
+            data = snap.data_json # untouched snapshot, already encoded
+        else:
+            data = b"[" + b",".join(snap.encoded[i] for i in idx) + b"]"
+        return encode_json(head)[:-1] + b',"data":' + data + b"}"
+    
+    if variant.plain:
+        return Response(content=build(), media_type="application/json", headers={"ETag": etag})
+    # Other representations are encoded/compressed once per snapshot version and query
+    key = ("god-mode", str(request.query_params), status)
+    body, coding = response_encoder.render(key, snap.version, variant, build)
+    return encoded_response(variant, body, coding, headers={"ETag": etag})
+
+def _timeframe_store(timeframe):
+    if timeframe == "1d":
+        return market_store
+    if timeframe not in timeframe_stores:
+        raise HTTPException(status_code=400, detail=f"timeframe must be one of 1d, {', '.join(TIMEFRAMES)}")
+    return timeframe_stores[timeframe] # api role: the scanner's per-timeframe snapshot file
+
+@app.get("/bars/{symbol}")
+def get_bars(symbol: str, timeframe: str = "5m", limit: int = Query(100, ge=1, le=1000)):
+    """Intraday OHLCV bars built from websocket ticks: [[time, open, high, low, close, volume], ...], oldest first."""
+    if timeframe not in TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"timeframe must be one of {', '.join(TIMEFRAMES)}")
+    if ROLE == "api":
+        return _scanner_bars(symbol, timeframe, limit)
+    symbol = symbol.upper()
+    row = market_cache.get(symbol)
+    token = row['token'] if row else NIFTY_50_TOKENS.get(symbol) or ScripMaster.get_instance().get_equity_token(symbol)
+    if not token:
+        raise HTTPException(status_code=404, detail=f"Unknown symbol: {symbol}")
+    data = bars.candles(str(token), timeframe, limit)
+    return {"status": "success", "symbol": symbol, "timeframe": timeframe, "data": data, "count": len(data)}
+
+def _scanner_get(path, params, what):
+    """API workers: forwards a GET to the scanner process (NGTA_SCANNER_URL), which owns `what`."""
+    if not SCANNER_URL:
+        raise HTTPException(status_code=503, detail=f"{what} are served by the scanner process; set NGTA_SCANNER_URL to forward them")
+    import httpx
+    try:
+        return httpx.get(f"{SCANNER_URL.rstrip('/')}{path}", params=params, timeout=5)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Scanner process unreachable: {e}")
+
+def _scanner_bars(symbol, timeframe, limit):
+    """API workers hold no bars: forward /bars to the scanner process."""
+    res = _scanner_get(f"/bars/{symbol}", {"timeframe": timeframe, "limit": limit}, "Intraday bars")
+    return Response(content=res.content, status_code=res.status_code, media_type="application/json")
+
+def _scanner_status():
+    if ROLE == "api":
+        return "Running" if market_store.alive and market_store.status.get("scanner") == "Running" else "Stopped"
+    return "Running" if is_scanner_running else "Stopped"
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.get("/god-mode/stream")
+async def god_mode_stream(request: Request, interval: float = Query(1.0, ge=0.2, le=30)):
+    """
+    Server-Sent Events feed of the scanner table: one "snapshot" event, then
+    "delta" events with only the rows that changed. Updates are coalesced to at
+    most one event per `interval` seconds, so a burst of ticks costs one message.
+    """
+    async def events():
+        version, rows = market_store.snapshot()
+        rows.sort(key=lambda x: x['strength_score'], reverse=True)
+        yield _sse("snapshot", {"version": version, "data": rows})
+        
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            await asyncio.sleep(interval)
+            if market_store.version != version:
+                version, changed = market_store.changed_since(version)
+                yield _sse("delta", {"version": version, "data": changed})
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > 15:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+_breakout_synced = {} # Token -> last sync time (api role)
+
+def _breakout_index(token):
+    """
+    The scanner's BreakoutIndex for a token. API workers have no scanner, so they
+    build their own from the shared candle store and re-sync at most once a minute.
+    """
+    idx = breakout_indexes.get(token)
+    if ROLE != "api":
+        return idx
+    if idx is not None and time.time() - _breakout_synced.get(token, 0) < 60:
+        return idx
+    store = CandleStore.get_instance()
+    store.invalidate(token) # the scanner process writes the candles, our cached copy is stale
+    candles = store.get_candles(token, since=(datetime.now() - timedelta(days=400)).strftime("%Y-%m-%d"))
+    if not candles:
+        return idx
+    if idx is None:
+        idx = breakout_indexes[token] = BreakoutIndex(candles)
+    else:
+        idx.sync(candles)
+    _breakout_synced[token] = time.time()
+    return idx
+
+@app.get("/breakouts")
+def get_breakouts(lookback: int = Query(20, ge=1, le=1000), symbol: str = None):
+    """
+    Prior high/low and breakout status for any lookback (in trading days),
+    answered in O(1) per stock from the scanner's breakout index.
+    """
+    rows = []
+    for row in market_store.publish().rows:
+        sym = row['symbol']
+        if symbol and sym != symbol.upper(): continue
+        idx = _breakout_index(row['token'])
+        if idx is None: continue
+        high, low = idx.prior_high_low(lookback)
+        rows.append({
+            "symbol": sym, "token": row['token'], "ltp": row['ltp'],
+            "high": high, "low": low,
+            "breakout": check_breakout(row['ltp'], high, low)
+        })
+    
+    return {"status": "success", "lookback": lookback, "data": rows, "count": len(rows)}
+
+screener = Screener()
+
+class ScreenIn(BaseModel):
+    user: str
+    name: str
+    query: str
+    rank: str = "strength_score"
+    order: str = "desc"
+    timeframe: str = "1d"
+
+def _check_order(order):
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+
+def _run_screen(snap, query, rank, order, timeframe, fields=None, offset=0, limit=None):
+    """Response body for a screen on `snap`: matching rows in rank order."""
+    _check_order(order)
+    try:
+        rows, encoded, values = screener.run(snap, query, rank, order, timeframe)
+    except ScreenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    total = len(rows)
+    end = offset + limit if limit else None
+    rows, encoded, values = rows[offset:end], encoded[offset:end], values[offset:end]
+    if fields:
+        keep = [f.strip() for f in fields.split(",") if f.strip()]
+        data = encode_json([{f: row.get(f) for f in keep} for row in rows])
+    else:
+        data = b"[" + b",".join(encoded) + b"]"
+    head = encode_json({
+        "status": "success",
+        "version": snap.version,
+        "count": len(rows),
+        "total": total,
+        "rank_values": [None if v != v else round(float(v), 4) for v in values],
+        "scanner_status": _scanner_status(),
+    })
+    return head[:-1] + b',"data":' + data + b"}"
+
+@app.get("/screener")
+@telemetry.HANDLER_SECONDS.labels("screener").time()
+def run_screener(request: Request, q: str, rank: str = "strength_score", order: str = "desc", timeframe: str = "1d",
+                 fields: str = None, offset: int = Query(0, ge=0), limit: int = Query(None, ge=1)):
+    """
+    Server-side screener over the scanner table.
+    q: expression over the /god-mode row fields, e.g.
+       rsi > 60 and breakout_50d == "Bullish Breakout" and avg_dom_3d == "Buyers"
+    rank: numeric expression the matches are ordered by (default strength_score), order=asc|desc
+    Expressions are compiled once and re-runs only re-evaluate rows that changed.
+    """
+    snap = _timeframe_store(timeframe).publish()
+    etag = f'"screen-{timeframe}-{snap.version}"'
+    if request.headers.get("if-none-match") == etag: # nothing changed: skip evaluation entirely
+        return Response(status_code=304, headers={"ETag": etag})
+    body = _run_screen(snap, q, rank, order, timeframe, fields, offset, limit)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/screens")
+def list_screens(user: str):
+    """A user's saved screens."""
+    data = ScreenBook.get_instance().list(user)
+    return {"status": "success", "data": data, "count": len(data)}
+
+@app.post("/screens")
+def save_screen(screen: ScreenIn):
+    """Saves (or replaces, by user + name) a screen."""
+    _timeframe_store(screen.timeframe)
+    _check_order(screen.order)
+    try:
+        saved = ScreenBook.get_instance().save(screen.user, screen.name, screen.query, screen.rank, screen.order, screen.timeframe)
+    except ScreenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "data": saved}
+
+@app.delete("/screens/{screen_id}")
+def delete_screen(screen_id: int):
+    if not ScreenBook.get_instance().delete(screen_id):
+        raise HTTPException(status_code=404, detail="Screen not found")
+    return {"status": "success"}
+
+@app.get("/screens/run")
+@telemetry.HANDLER_SECONDS.labels("screens_run").time()
+def run_screens(user: str, limit: int = Query(20, ge=1, le=500)):
+    """Runs every saved screen of a user: match count and the top `limit` symbols per screen."""
+    out = []
+    for screen in ScreenBook.get_instance().list(user):
+        try:
+            snap = _timeframe_store(screen['timeframe']).publish()
+            rows, _, _ = screener.run(snap, screen['query'], screen['rank'], screen['sort_order'], screen['timeframe'])
+            out.append({"id": screen['id'], "name": screen['name'], "version": snap.version, "total": len(rows),
+                        "symbols": [row['symbol'] for row in rows[:limit]]})
+        except (ScreenError, HTTPException) as e:
+            out.append({"id": screen['id'], "name": screen['name'], "error": getattr(e, "detail", str(e))})
+    return {"status": "success", "data": out, "count": len(out)}
+
+@app.get("/screens/{screen_id}/results")
+def screen_results(screen_id: int, fields: str = None, offset: int = Query(0, ge=0), limit: int = Query(None, ge=1)):
+    """Matching rows of a saved screen, in its rank order."""
+    screen = ScreenBook.get_instance().get(screen_id)
+    if screen is None:
+        raise HTTPException(status_code=404, detail="Screen not found")
+    snap = _timeframe_store(screen['timeframe']).publish()
+    body = _run_screen(snap, screen['query'], screen['rank'], screen['sort_order'], screen['timeframe'], fields, offset, limit)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/quotes")
+async def get_quotes(symbols: str, mode: str = "LTP"):
+    """
+    Watchlist quotes in one or two round-trips.
+    symbols: comma separated NSE symbols, e.g. "SBIN,INFY,NIFTY"
+    """
+    try:
+        mode = mode.upper()
+        if mode not in QUOTE_MODES:
+            return {"status": "error", "message": f"mode must be one of {', '.join(QUOTE_MODES)}"}
+        
+        sm = ScripMaster.get_instance()
+        wanted = {}
+        for sym in [x.strip().upper() for x in symbols.split(",") if x.strip()]:
+            token = NIFTY_50_TOKENS.get(sym) or sm.get_equity_token(sym)
+            if token: wanted[str(token)] = sym
+        
+        _watch_tokens(wanted)
+        session = await sessions.ensure_async()
+        quotes = await fetch_quotes_async(async_api, scheduler, [("NSE", t) for t in wanted], mode=mode,
+                                          on_auth_error=_drop_session(session))
+        data = {sym: quotes.get(("NSE", t)) for t, sym in wanted.items()}
+        return {"status": "success", "data": data, "count": len(data)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api-stats")
+def api_stats():
+    """SmartAPI scheduler state (adaptive concurrency, queue depth per lane, per-endpoint counters) and tick ingestion counters."""
+    return {"status": "success", "data": scheduler.stats(), "ticks": tick_ingestor.stats(),
+            "subscriptions": subscriptions.stats(), "option_chains": option_chains.stats(), "session": sessions.stats(), "bars": bars.stats(), "screener": screener.stats(), "encoding": response_encoder.stats(), "role": ROLE}
+
+def _scan_staleness():
+    if ROLE == "api":
+        return staleness_from_state(market_store.status.get("staleness"))
+    return scan_queue.staleness()
+
+@app.get("/scanner/staleness")
+def scanner_staleness():
+    """Per-tier candle freshness: symbols, refresh age (p50/max seconds), overdue/failing counts and target interval."""
+    return {"status": "success", "scanner_status": _scanner_status(), "data": _scan_staleness()}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: SmartAPI call latency/retries/rate limits, scan cycle and metrics time, tick lag, handler time, table and feed sizes."""
+    telemetry.CACHE_ROWS.set(len(market_store.rows))
+    telemetry.SUBSCRIBED_TOKENS.set(subscriptions.stats()["active"])
+    for tier, stale in _scan_staleness().items():
+        telemetry.SCAN_STALENESS.labels(tier).set(stale["age_max"] or 0)
+    ticks = tick_ingestor.stats()
+    telemetry.TICK_QUEUE_DEPTH.set(ticks["queue_depth"])
+    telemetry.TICKS_DROPPED.set(ticks["dropped"])
+    body, content_type = telemetry.render()
+    return Response(content=body, media_type=content_type)
+
+def _warm_session():
+    try: sessions.ensure()
+    except SessionError as e: logger.warning(f"Initial login failed: {e}")
 
 @app.on_event("startup")
-def startup_event():
-    # Start Background Scanner
+async def startup_event():
+    # Log in before the first request needs it; the refresher then renews the JWT ahead of expiry.
+    # API workers only log in lazily, when an upstream endpoint needs a session (sessions.ensure)
+    if ROLE != "api":
+        sessions.start()
+        threading.Thread(target=_warm_session, daemon=True, name="SessionWarmup").start()
+    
+    # Start Background Scanner (one process only; API workers read its snapshot)
     global is_scanner_running
-    if not is_scanner_running:
+    if ROLE != "api" and not is_scanner_running:
         is_scanner_running = True
-        t = threading.Thread(target=background_scanner, daemon=True)
-        t.start()
+        if SCANNER_MODE == "async":
+            app.state.scanner_task = asyncio.create_task(background_scanner_async())
+        else:
+            t = threading.Thread(target=background_scanner, daemon=True)
+            t.start()
+    if ROLE != "api":
+        threading.Thread(target=intraday_scanner, daemon=True, name="IntradayScanner").start()
+    if ROLE == "scanner":
+        threading.Thread(target=share_snapshot, daemon=True, name="SharedSnapshot").start()
     
-    # Load Scrip Master
+    # Load Scrip Master (load-only in API workers, see ScripMaster.owner)
     try:
-        from scrip_master import ScripMaster
         ScripMaster.get_instance() # Preload
     except Exception as e:
         logger.error(f"Failed to init ScripMaster: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await async_api.aclose()
+    if recorder: recorder.close() # flushes buffered ticks
+
+STATUS_REFRESH = 5.0 # seconds a published staleness state is reused
+
+def share_snapshot():
+    """Scanner role: mirrors every new table version (daily and per intraday timeframe) into the shared snapshot files."""
+    writer = SharedSnapshotWriter()
+    tf_writers = {tf: SharedSnapshotWriter(timeframe_path(tf, writer.path)) for tf in TIMEFRAMES}
+    print(f"Shared snapshot: publishing to {writer.path} (+ .{', .'.join(TIMEFRAMES)})")
+    # Built only when a new version is written, and the version moves with every tick batch, so the
+    # staleness walk is reused for a few seconds; readers turn it into ages against their own clock
+    status = lambda: {"scanner": "Running" if is_scanner_running else "Stopped",
+                      "staleness": scan_queue.staleness_state(max_age=STATUS_REFRESH)}
+    while True:
+        try:
+            writer.write(market_store.publish(), status)
+            for tf, tf_writer in tf_writers.items():
+                tf_writer.write(timeframe_stores[tf].publish())
+        except Exception as e:
+            logger.error(f"Shared snapshot write failed: {e}")
+        try:
+            tokens = watch_requests.receive() # watchlist requests forwarded by API workers
+            if tokens: scan_queue.watch(tokens)
+        except Exception as e:
+            logger.error(f"Watch requests failed: {e}")
+        time.sleep(0.1)
+
 @app.get("/options-chain/{symbol}")
-def get_options_chain(symbol: str):
+@telemetry.HANDLER_SECONDS.labels("options_chain").time()
+def get_options_chain(request: Request, symbol: str, expiry: str = "nearest"):
     """
-    Returns a REAL Options Chain using Scrip Master lookup.
+    Live Options Chain served from memory.
+    expiry: nearest | weekly | next | monthly, or a date like 26DEC24 / 26DEC2024
+    Same encodings as /god-mode (layout=columns, msgpack, gzip/br), cached per chain version.
     """
+    if ROLE == "api":
+        res = _scanner_chain(symbol, expiry)
+    else:
+        try:
+            res = option_chains.get_chain(symbol, expiry)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    if res.get("status") != "success":
+        return res
+    variant = negotiate(request)
+    if variant.plain:
+        return Response(content=encode_json(res), media_type="application/json")
+    key = ("options-chain", res["symbol"], res["expiry"])
+    body, coding = response_encoder.render(key, res["version"], variant, lambda: encode_payload(res, variant))
+    return encoded_response(variant, body, coding)
+
+def _scanner_chain(symbol, expiry):
+    """
+    API workers have no websocket, so a chain of their own would be REST-polled in every worker.
+    The scanner's live chain is fetched as plain JSON and re-encoded here per the request's variant.
+    """
+    res = _scanner_get(f"/options-chain/{symbol}", {"expiry": expiry}, "Option chains")
+    if res.status_code != 200:
+        raise HTTPException(status_code=res.status_code, detail=res.text)
     try:
-        # 1. Get Spot Price
-        # Try finding in static map first (fast), else use EQ scanner
-        token = NIFTY_50_TOKENS.get(symbol.upper(), "99926000" if symbol.upper() == "NIFTY" else None)
-        if not token:
-             # Use Scrip Master for Equity Token
-             from scrip_master import ScripMaster
-             sm = ScripMaster.get_instance()
-             token = sm.get_equity_token(symbol.upper())
-             if not token:
-                 return {"status": "error", "message": "Symbol not found"}
-
-        data = get_market_data(symbol) 
-        if not data or not data.get('data'):
-             return {"status": "error", "message": "Could not fetch spot price"}
-             
-        ltp = data['data']['ltp']
-        
-        # 2. Calculate ATM & Strikes
-        step = 50 if symbol.upper() in ["NIFTY", "NIFTY 50", "NIFTY50"] else (100 if "BANK" in symbol.upper() else (ltp * 0.01))
-        step = int(step) if step > 10 else 1.0
-        # Round to nearest step
-        atm = round(ltp / step) * step
-        
-        target_strikes = []
-        for i in range(-5, 6):
-            target_strikes.append(atm + (i * step))
-            
-        # 3. Lookup Real Tokens
-        from scrip_master import ScripMaster
-        sm = ScripMaster.get_instance()
-        
-        # Auto-detect expiry (Hardcoded for Demo - Current Monthly 26 DEC 24)
-        # In a real app, this logic calculates the next Thursday
-        expiry_str = "26DEC24" 
-        
-        is_index = symbol.upper() in ["NIFTY", "BANKNIFTY", "NIFTY 50"]
-        
-        tokens_map = sm.get_fno_tokens_for_chain(symbol.upper(), expiry_str, target_strikes, is_index)
-        
-        # 4. Fetch Live Feeds (Parallelized)
-        import concurrent.futures
-        
-        def fetch_option_row(strike):
-            ce_token = tokens_map.get(f"{int(strike)}_CE")
-            pe_token = tokens_map.get(f"{int(strike)}_PE")
-            
-            ce_ltp, pe_ltp = 0, 0
-            
-            # CE
-            if ce_token:
-                try:
-                    res = smartApi.ltpData("NFO", f"{symbol}{expiry_str}{int(strike)}CE", ce_token)
-                    if res and res.get('data'): ce_ltp = res['data']['ltp']
-                except: pass
-                
-            # PE
-            if pe_token:
-                try:
-                    res = smartApi.ltpData("NFO", f"{symbol}{expiry_str}{int(strike)}PE", pe_token)
-                    if res and res.get('data'): pe_ltp = res['data']['ltp']
-                except: pass
-                
-            return {
-                "strike": strike,
-                "type": "ATM" if strike == atm else ("ITM" if strike < atm else "OTM"),
-                "ce_ltp": ce_ltp,
-                "pe_ltp": pe_ltp,
-                "ce_token": ce_token,
-                "pe_token": pe_token
-            }
-
-        chain_data = []
-        # 2. Parallel Processing
-        results = []
-        # Increased workers for ~200 stocks. Be careful of rate limits (3/sec is standard, but Angel often allows more)
-        # 20 workers ~ 20 concurrent requests.
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            chain_data = list(executor.map(fetch_option_row, target_strikes))
-            
-        # Ensure sorted
-        chain_data.sort(key=lambda x: x['strike'])
-
-        return {
-            "status": "success",
-            "symbol": symbol,
-            "spot_price": ltp,
-            "expiry": expiry_str,
-            "chain": chain_data
-        }
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return res.json()
+    except ValueError:
+        raise HTTPException(status_code=502, detail="Scanner process sent an invalid option chain")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,125 @@
+import os
+import json
+import threading
+
+try:
+    import orjson
+except ImportError: # optional fast encoder
+    orjson = None
+
+
+def encode_json(obj):
+    """JSON bytes, via orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class Snapshot:
+    """
+    Immutable view of the table at one version: rows sorted by strength score,
+    each row already encoded to JSON, plus the pre-built `data` array.
+    `origin` identifies the table that published it: versions only compare within one origin.
+    """
+    __slots__ = ("version", "rows", "encoded", "row_versions", "data_json", "origin")
+
+    def __init__(self, version, rows, encoded, row_versions, origin=None):
+        self.version = version
+        self.rows = rows # tuple, sorted by strength_score desc
+        self.encoded = encoded # tuple of JSON bytes, parallel to rows
+        self.row_versions = row_versions # symbol -> version of its last change
+        self.data_json = b"[" + b",".join(encoded) + b"]"
+        self.origin = origin
+
+
+class MarketStore:
+    """
+    The scanner's symbol -> metrics table with change tracking.
+    Every write bumps a global version and stamps the touched symbols with it,
+    so push/delta consumers can ask for "rows changed since version v".
+    Rows are replaced, never mutated, so a reader holding a row never sees a half-applied update.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self.rows = {} # symbol -> row
+        self.version = 0
+        self.origin = os.urandom(8).hex() # a restarted scanner counts versions from 0 again under a new origin
+        self._row_versions = {} # symbol -> version of its last change
+        self._snapshot = Snapshot(0, (), (), {}, self.origin)
+        self._encoded = {} # symbol -> (row version, JSON bytes), reused across snapshots
+
+    def update_rows(self, rows):
+        """Replaces full rows (scanner results)."""
+        if not rows:
+            return self.version
+        with self._lock:
+            self.version += 1
+            for row in rows:
+                self.rows[row['symbol']] = row
+                self._row_versions[row['symbol']] = self.version
+            return self.version
+
+    def update_fields(self, symbol, fields):
+        """Merges a partial update (live tick) into one row. Returns False for unknown symbols."""
+        with self._lock:
+            row = self.rows.get(symbol)
+            if row is None:
+                return False
+            self.version += 1
+            self.rows[symbol] = {**row, **fields}
+            self._row_versions[symbol] = self.version
+            return True
+
+    def update_many_fields(self, updates):
+        """Merges a batch of partial updates {symbol: fields} under one lock and one version bump."""
+        if not updates:
+            return self.version
+        with self._lock:
+            self.version += 1
+            for symbol, fields in updates.items():
+                row = self.rows.get(symbol)
+                if row is None: continue
+                self.rows[symbol] = {**row, **fields}
+                self._row_versions[symbol] = self.version
+            return self.version
+
+    def snapshot(self):
+        """(version, list of rows) taken atomically."""
+        with self._lock:
+            return self.version, list(self.rows.values())
+
+    def changed_since(self, version):
+        """(current version, rows changed after `version`)."""
+        with self._lock:
+            changed = [self.rows[sym] for sym, v in self._row_versions.items() if v > version]
+            return self.version, changed
+
+    def publish(self):
+        """
+        Returns the Snapshot for the current version, building it at most once per version.
+        Only rows that changed since they were last encoded are re-encoded.
+        """
+        snap = self._snapshot
+        if snap.version == self.version:
+            return snap
+        with self._publish_lock:
+            if self._snapshot.version == self.version:
+                return self._snapshot
+            with self._lock:
+                version = self.version
+                rows = sorted(self.rows.values(), key=lambda x: x['strength_score'], reverse=True)
+                row_versions = dict(self._row_versions)
+
+            encoded = []
+            for row in rows:
+                sym = row['symbol']
+                cached = self._encoded.get(sym)
+                if cached is None or cached[0] != row_versions[sym]:
+                    cached = (row_versions[sym], encode_json(row))
+                    self._encoded[sym] = cached
+                encoded.append(cached[1])
+
+            self._snapshot = Snapshot(version, tuple(rows), tuple(encoded), row_versions, self.origin)
+            return self._snapshot
@@ -0,0 +1,343 @@
+import numpy as np
+
+# (label, lookback in trading days) for the breakout columns in the scanner output
+BREAKOUT_PERIODS = [
+    ("1d", 1),
+    ("10d", 10),
+    ("30d", 30),
+    ("50d", 50),
+    ("100d", 100),
+    ("52w", 250), # Approx 52 Weeks (Trading Days)
+]
+
+RSI_PERIOD = 14
+A12, A26, A9 = 2.0 / 13, 2.0 / 27, 2.0 / 10 # EWM alphas for MACD(12, 26, 9)
+
+# Strength score = base + points per rule, and the sentiment bands over it
+# (backtest.py replays these over history and sweeps alternatives)
+SCORE_RULES = {
+    "base": 50,
+    "rsi_bull": 50, "rsi_bull_pts": 10, # RSI above rsi_bull
+    "rsi_hot": 70, "rsi_hot_pts": -5, # overbought: RSI above rsi_hot
+    "macd_pts": 15, # MACD above its signal line
+    "up_day_pts": 10, # close above the previous close
+    "buyers_pts": 5, # close above today's open
+    "strong_buy": 75, "bullish": 60, "bearish": 40, "strong_sell": 30, # sentiment bands
+}
+
+
+def stack_candles(candle_lists):
+    """
+    Right-aligns per-symbol candle lists ([ts, o, h, l, c, v]) into (N, T) arrays.
+    Shorter histories are padded with NaN on the left so column -1 is always "today".
+    Returns: opens, highs, lows, closes, lengths
+    """
+    n = len(candle_lists)
+    width = max((len(c) for c in candle_lists), default=0)
+    opens = np.full((n, width), np.nan)
+    highs = np.full((n, width), np.nan)
+    lows = np.full((n, width), np.nan)
+    closes = np.full((n, width), np.nan)
+    lengths = np.zeros(n, dtype=np.int64)
+
+    for i, candles in enumerate(candle_lists):
+        if not candles: continue
+        ohlc = np.array([c[1:5] for c in candles], dtype=np.float64)
+        k = len(candles)
+        opens[i, width - k:] = ohlc[:, 0]
+        highs[i, width - k:] = ohlc[:, 1]
+        lows[i, width - k:] = ohlc[:, 2]
+        closes[i, width - k:] = ohlc[:, 3]
+        lengths[i] = k
+
+    return opens, highs, lows, closes, lengths
+
+
+def rolling_rsi(closes, lengths, period=RSI_PERIOD):
+    """
+    Last-bar RSI using a simple rolling mean of gains/losses (same as the
+    pandas `rolling(14).mean()` version). NaN where there is not enough history.
+    """
+    delta = np.diff(closes, axis=1, prepend=np.nan)
+    # pandas `where` turns the leading NaN diff into 0, so do the same here
+    gain = np.where(delta > 0, delta, 0.0)[:, -period:]
+    loss = np.where(delta < 0, -delta, 0.0)[:, -period:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain.mean(axis=1) / loss.mean(axis=1)
+        rsi = 100 - (100 / (1 + rs))
+    return np.where(lengths >= period, rsi, np.nan)
+
+
+def macd_lines(closes):
+    """
+    MACD(12, 26, 9) over every row at once (adjust=False EWMs, leading NaN padding skipped).
+    Returns (macd, signal) arrays for the last two bars plus the (ema12, ema26)
+    values as of the previous bar, which seed the streaming state.
+    """
+    n, width = closes.shape
+    e12 = np.full(n, np.nan)
+    e26 = np.full(n, np.nan)
+    sig = np.full(n, np.nan)
+    macd_hist = np.full((n, 2), np.nan)
+    sig_hist = np.full((n, 2), np.nan)
+    ema_prev = (e12, e26)
+    for t in range(width):
+        col = closes[:, t]
+        if t == width - 1:
+            ema_prev = (e12, e26)
+        e12 = np.where(np.isnan(e12), col, (1 - A12) * e12 + A12 * col)
+        e26 = np.where(np.isnan(e26), col, (1 - A26) * e26 + A26 * col)
+        macd = e12 - e26
+        sig = np.where(np.isnan(sig), macd, (1 - A9) * sig + A9 * macd)
+        if t >= width - 2:
+            macd_hist[:, t - (width - 2)] = macd
+            sig_hist[:, t - (width - 2)] = sig
+    return macd_hist, sig_hist, ema_prev
+
+
+def prior_high_low(highs, lows, lengths, period):
+    """
+    High/low of the `period` candles before today, for every row.
+    NaN where the row has fewer than period+2 candles (same rule as the scalar version).
+    """
+    n, width = highs.shape
+    valid = lengths >= period + 2
+    if width < period + 1:
+        return np.full(n, np.nan), np.full(n, np.nan)
+    h = highs[:, width - 1 - period:width - 1].max(axis=1)
+    l = lows[:, width - 1 - period:width - 1].min(axis=1)
+    return np.where(valid, h, np.nan), np.where(valid, l, np.nan)
+
+
+def _opt(x):
+    return None if np.isnan(x) else float(x)
+
+
+def index_high_low(indexes, tokens, period):
+    """Prior high/low arrays for `period` answered from per-token BreakoutIndex objects (O(1) each)."""
+    h = np.full(len(tokens), np.nan)
+    l = np.full(len(tokens), np.nan)
+    for i, token in enumerate(tokens):
+        idx = indexes.get(token)
+        if idx is None: continue
+        max_h, min_l = idx.prior_high_low(period)
+        if max_h is not None:
+            h[i], l[i] = max_h, min_l
+    return h, l
+
+
+def calculate_metrics_batch(items, with_state=False, indexes=None, arrays=None):
+    """
+    Computes scanner metrics for the whole universe in one vectorized pass.
+    items: list of (symbol, token, candles)
+    indexes: optional token -> BreakoutIndex; when given, breakout levels come from it
+    instead of slicing the history arrays.
+    arrays: optional pre-stacked (opens, highs, lows, closes, lengths) in stack_candles layout,
+    parallel to items (whose candles are then ignored), e.g. intraday bars; the breakout
+    periods then count bars of that timeframe instead of days.
+    Returns a list of metric dicts (symbols with unusable history are dropped).
+    With with_state=True returns (rows, states) where states maps token -> IndicatorState.
+    """
+    if not items:
+        return ([], {}) if with_state else []
+
+    opens, highs, lows, closes, lengths = arrays if arrays is not None else stack_candles([x[2] for x in items])
+    width = closes.shape[1]
+    if width < 5:
+        return ([], {}) if with_state else []
+
+    c = [closes[:, -k] for k in range(1, 6)] # c0 .. c4
+    valid = (lengths >= 5) & (c[1] != 0) & (c[2] != 0) & (c[3] != 0) & (c[4] != 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_current = (c[0] - c[1]) / c[1] * 100
+        change_1d = (c[1] - c[2]) / c[2] * 100
+        change_2d = (c[2] - c[3]) / c[3] * 100
+        change_3d = (c[3] - c[4]) / c[4] * 100
+    avg_3d = (change_current + change_1d + change_2d + change_3d) / 4.0
+
+    # Dom (close above open)
+    buyers = [closes[:, -k] > opens[:, -k] for k in range(1, 5)]
+    bulls = sum(b.astype(np.int64) for b in buyers)
+
+    # Indicators
+    rsi = rolling_rsi(closes, lengths)
+    cur_rsi = np.where(np.isnan(rsi), 50.0, rsi)
+
+    macd, sig, (e12_prev, e26_prev) = macd_lines(closes)
+    h_val = macd[:, 1] - sig[:, 1]
+    h_prev = macd[:, 0] - sig[:, 0]
+
+    # Score
+    score = strength_score(cur_rsi, macd[:, 1] > sig[:, 1], change_current > 0, buyers[0])
+
+    # Breakouts
+    if indexes is not None:
+        tokens = [x[1] for x in items]
+        levels = {label: index_high_low(indexes, tokens, period) for label, period in BREAKOUT_PERIODS}
+    else:
+        levels = {label: prior_high_low(highs, lows, lengths, period) for label, period in BREAKOUT_PERIODS}
+
+    if with_state:
+        # Gain/loss sums of the 13 deltas before today; today's delta comes from the tick
+        delta = np.diff(closes, axis=1, prepend=np.nan)[:, -RSI_PERIOD:-1]
+        gain_base = np.where(delta > 0, delta, 0.0).sum(axis=1)
+        loss_base = np.where(delta < 0, -delta, 0.0).sum(axis=1)
+
+    results = []
+    states = {}
+    for i, (symbol, token, _) in enumerate(items):
+        if not valid[i]:
+            continue
+        c0 = float(c[0][i])
+
+        doms = ["Buyers" if b[i] else "Sellers" for b in buyers]
+        avg_dom_3d = avg_dominance(int(bulls[i]))
+        macd_sig = macd_signal(h_val[i], h_prev[i])
+        s = float(score[i])
+        sentiment = sentiment_for(s)
+
+        row = {
+            "symbol": symbol, "token": token, "ltp": c0,
+            "change_pct": round(float(change_current[i]), 2),
+            "rsi": round(float(cur_rsi[i]), 2), "strength_score": round(s, 1),
+            "sentiment": sentiment,
+            "change_current": round(float(change_current[i]), 2),
+            "change_1d": round(float(change_1d[i]), 2),
+            "change_2d": round(float(change_2d[i]), 2),
+            "change_3d": round(float(change_3d[i]), 2),
+            "avg_3d": round(float(avg_3d[i]), 2),
+            "avg_dom_3d": avg_dom_3d,
+            "dom_current": doms[0], "dom_1d": doms[1],
+            "dom_2d": doms[2], "dom_3d": doms[3],
+            "macd_signal": macd_sig,
+        }
+        for label, _ in BREAKOUT_PERIODS:
+            row[f"breakout_{label}"] = check_breakout(c0, *(_opt(x[i]) for x in levels[label]))
+        for label, _ in BREAKOUT_PERIODS:
+            row[f"high_{label}"] = _opt(levels[label][0][i])
+            row[f"low_{label}"] = _opt(levels[label][1][i])
+        results.append(row)
+
+        if with_state:
+            states[token] = IndicatorState(
+                prev_close=float(c[1][i]), open_today=float(opens[i, -1]),
+                changes=(float(change_1d[i]), float(change_2d[i]), float(change_3d[i])),
+                doms=doms[1:],
+                rsi_base=(float(gain_base[i]), float(loss_base[i])) if lengths[i] >= RSI_PERIOD else None,
+                ema_prev=(float(e12_prev[i]), float(e26_prev[i])),
+                sig_prev=float(sig[i, 0]), hist_prev=float(h_prev[i]),
+                levels={label: (row[f"high_{label}"], row[f"low_{label}"]) for label, _ in BREAKOUT_PERIODS},
+            )
+
+    return (results, states) if with_state else results
+
+
+def avg_dominance(n_bulls):
+    return "Buyers" if n_bulls >= 3 else "Sellers" if n_bulls <= 1 else "Balance"
+
+
+def macd_signal(h_val, h_prev):
+    if h_val > 0: return "Bullish Growing" if h_val > h_prev else "Bullish Waning"
+    if h_val < 0: return "Bearish Growing" if h_val < h_prev else "Bearish Waning"
+    return "Neutral"
+
+
+def strength_score(rsi, macd_above, up_day, buyers, rules=SCORE_RULES):
+    """Vectorized strength score from its inputs (arrays of any shape)."""
+    score = np.full(np.shape(rsi), float(rules["base"]))
+    score += np.where(rsi > rules["rsi_bull"], rules["rsi_bull_pts"], 0)
+    score += np.where(rsi > rules["rsi_hot"], rules["rsi_hot_pts"], 0)
+    score += np.where(macd_above, rules["macd_pts"], 0)
+    score += np.where(up_day, rules["up_day_pts"], 0)
+    score += np.where(buyers, rules["buyers_pts"], 0)
+    return score
+
+
+def sentiment_for(score, rules=SCORE_RULES):
+    if score > rules["strong_buy"]: return "STRONG BUY"
+    if score > rules["bullish"]: return "Bullish"
+    if score < rules["strong_sell"]: return "STRONG SELL"
+    if score < rules["bearish"]: return "Bearish"
+    return "Neutral"
+
+
+def check_breakout(c0, max_h, min_l):
+    if max_h and c0 > max_h: return "Bullish Breakout"
+    if min_l and c0 < min_l: return "Bearish Breakout"
+    return "Consolidating" # or None
+
+
+class IndicatorState:
+    """
+    Incremental indicator state for one symbol, seeded from the last daily scan.
+    Everything that depends only on previous days is frozen at seed time, so a
+    live tick for today's price updates RSI, MACD, change, score and breakouts in O(1).
+    """
+    __slots__ = ("prev_close", "open_today", "changes", "doms", "rsi_base",
+                 "ema_prev", "sig_prev", "hist_prev", "levels")
+
+    def __init__(self, prev_close, open_today, changes, doms, rsi_base, ema_prev, sig_prev, hist_prev, levels):
+        self.prev_close = prev_close # yesterday's close (c1)
+        self.open_today = open_today
+        self.changes = changes # (change_1d, change_2d, change_3d), frozen
+        self.doms = doms # [dom_1d, dom_2d, dom_3d], frozen
+        self.rsi_base = rsi_base # (gain sum, loss sum) of the 13 deltas before today, None if too short
+        self.ema_prev = ema_prev # (ema12, ema26) as of yesterday
+        self.sig_prev = sig_prev # MACD signal as of yesterday
+        self.hist_prev = hist_prev # MACD histogram as of yesterday
+        self.levels = levels # label -> (prior high, prior low)
+
+    def update(self, ltp):
+        """Applies a live price for today. Returns the derived fields to merge into the cache row."""
+        c1 = self.prev_close
+        change_current = (ltp - c1) / c1 * 100
+        avg_3d = (change_current + sum(self.changes)) / 4.0
+
+        dom_current = "Buyers" if ltp > self.open_today else "Sellers"
+        n_bulls = (dom_current == "Buyers") + self.doms.count("Buyers")
+
+        # RSI: simple mean over the last 14 deltas, today's delta is the only moving part
+        cur_rsi = 50.0
+        if self.rsi_base is not None:
+            d = ltp - c1
+            gain = self.rsi_base[0] + (d if d > 0 else 0.0)
+            loss = self.rsi_base[1] + (-d if d < 0 else 0.0)
+            if loss > 0: cur_rsi = 100 - (100 / (1 + gain / loss))
+            elif gain > 0: cur_rsi = 100.0
+
+        # MACD: one EWM step from yesterday's values
+        e12 = (1 - A12) * self.ema_prev[0] + A12 * ltp
+        e26 = (1 - A26) * self.ema_prev[1] + A26 * ltp
+        macd = e12 - e26
+        sig = (1 - A9) * self.sig_prev + A9 * macd
+
+        r = SCORE_RULES
+        score = r["base"]
+        if cur_rsi > r["rsi_bull"]: score += r["rsi_bull_pts"]
+        if cur_rsi > r["rsi_hot"]: score += r["rsi_hot_pts"]
+        if macd > sig: score += r["macd_pts"]
+        if change_current > 0: score += r["up_day_pts"]
+        if dom_current == "Buyers": score += r["buyers_pts"]
+
+        fields = {
+            "ltp": ltp,
+            "change_pct": round(change_current, 2),
+            "change_current": round(change_current, 2),
+            "avg_3d": round(avg_3d, 2),
+            "rsi": round(cur_rsi, 2),
+            "strength_score": round(float(score), 1),
+            "sentiment": sentiment_for(score),
+            "dom_current": dom_current,
+            "avg_dom_3d": avg_dominance(n_bulls),
+            "macd_signal": macd_signal(macd - sig, self.hist_prev),
+        }
+        for label, (h, l) in self.levels.items():
+            fields[f"breakout_{label}"] = check_breakout(ltp, h, l)
+        return fields
+
+
+def calculate_metrics(symbol, token, hist_data):
+    """Single-symbol convenience wrapper around calculate_metrics_batch."""
+    res = calculate_metrics_batch([(symbol, token, hist_data)])
+    return res[0] if res else None
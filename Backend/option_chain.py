@@ -0,0 +1,330 @@
+import bisect
+import itertools
+import threading
+import time
+import logging
+import math
+from datetime import date, datetime, time as dt_time
+
+try:
+    from .subscriptions import NSE_CM, NSE_FO, LTP, SNAP_QUOTE
+    from .scrip_master import parse_expiry
+    from .greeks import chain_analytics
+except ImportError:
+    from subscriptions import NSE_CM, NSE_FO, LTP, SNAP_QUOTE
+    from scrip_master import parse_expiry
+    from greeks import chain_analytics
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("OptionChain")
+
+INDEX_NAMES = {"NIFTY", "BANKNIFTY"}
+SYMBOL_ALIASES = {"NIFTY 50": "NIFTY", "NIFTY50": "NIFTY", "NIFTY BANK": "BANKNIFTY"}
+EXPIRY_CHOICES = ("nearest", "weekly", "next", "monthly")
+
+
+def resolve_expiry(expiries, which="nearest", today=None):
+    """
+    Picks an expiry from the sorted listed expiries of an underlying.
+    nearest/weekly: first expiry on or after today; next: the one after that;
+    monthly: the last listed expiry in the month of the nearest one.
+    Returns None when nothing is listed.
+    """
+    today = today or date.today()
+    upcoming = [e for e in expiries if e >= today]
+    if not upcoming:
+        return None
+    if which == "next":
+        return upcoming[1] if len(upcoming) > 1 else upcoming[0]
+    if which == "monthly":
+        first = upcoming[0]
+        return [e for e in upcoming if (e.year, e.month) == (first.year, first.month)][-1]
+    return upcoming[0]
+
+
+def years_to_expiry(expiry, now=None):
+    """Time to the 15:30 close on expiry day, in years (floored at one minute)."""
+    now = now or datetime.now()
+    seconds = (datetime.combine(expiry, dt_time(15, 30)) - now).total_seconds()
+    return max(seconds, 60.0) / (365 * 86400)
+
+
+def _num(x, digits):
+    """Rounded float, or None for NaN (JSON has no NaN)."""
+    x = float(x)
+    return round(x, digits) if math.isfinite(x) else None
+
+
+def expiry_label(expiry):
+    """date -> trading-symbol style label, e.g. 26DEC24."""
+    return expiry.strftime("%d%b%y").upper()
+
+
+class OptionChain:
+    """One underlying + expiry: spot, the subscribed strike window and the latest leg quotes."""
+
+    def __init__(self, name, expiry, is_index, spot_token, strikes):
+        self.name = name
+        self.expiry = expiry
+        self.is_index = is_index
+        self.spot_token = spot_token
+        self.strikes = strikes # every listed strike for this expiry, sorted
+        self.spot = 0.0
+        self.centre = None # index into strikes the window is built around
+        self.window = [] # strikes currently subscribed
+        self.legs = {} # (strike, "CE"/"PE") -> {"token", "ltp", "oi", "volume", "close"}
+        self.version = 0
+        self.updated = 0.0
+        self.last_access = time.time()
+        self.rest_refreshed = 0.0
+        self._response = None # (version, cached response dict)
+
+    @property
+    def group(self):
+        return f"options:{self.name}:{self.expiry.isoformat()}"
+
+    def atm_index(self):
+        i = bisect.bisect_left(self.strikes, self.spot)
+        if i == len(self.strikes): return i - 1
+        if i > 0 and self.spot - self.strikes[i - 1] <= self.strikes[i] - self.spot: return i - 1
+        return i
+
+
+class OptionChainService:
+    """
+    Live option chains kept in memory and fed by the shared websocket.
+    The first request for an underlying/expiry resolves the option tokens from the scrip master,
+    seeds the chain with one batched quote call and subscribes the NFO legs (SnapQuote) and the
+    spot (LTP). From then on ticks keep the chain current, the strike window follows spot and
+    every request is answered from memory. Chains nobody asked for in `idle_ttl` seconds are dropped.
+    """
+
+    def __init__(self, get_scrip_master, subscriptions, quote_fn, spot_token_fn,
+                 width=5, recenter_strikes=2, idle_ttl=600, rest_interval=2.0):
+        self.get_scrip_master = get_scrip_master # resolved lazily, the master loads at startup
+        self.subscriptions = subscriptions
+        self.quote_fn = quote_fn # (instruments, mode) -> {(exchange, token): quote}
+        self.spot_token_fn = spot_token_fn # underlying name -> NSE token
+        self.width = width # strikes on each side of ATM
+        self.recenter_strikes = recenter_strikes # how far ATM may drift before the window moves
+        self.idle_ttl = idle_ttl
+        self.rest_interval = rest_interval # REST refresh cadence while the feed is down
+
+        self._lock = threading.RLock()
+        self.chains = {} # (name, expiry) -> OptionChain
+        self._legs_by_token = {} # (NSE_FO, token) -> (chain, strike, "CE"/"PE")
+        self._chains_by_spot = {} # (NSE_CM, token) -> [chain, ...]
+        self._builds = itertools.count(1) # response versions, unique across chains in this process
+
+    # --- Requests ---
+
+    def get_chain(self, symbol, expiry="nearest"):
+        """Response dict for /options-chain, built from memory (cached per chain version)."""
+        name = SYMBOL_ALIASES.get(symbol.upper(), symbol.upper())
+        expiries = self.get_scrip_master().get_expiries(name)
+        if not expiries:
+            return {"status": "error", "message": "No options listed for symbol"}
+        if expiry in EXPIRY_CHOICES:
+            exp = resolve_expiry(expiries, expiry)
+        else:
+            exp = parse_expiry(expiry)
+            if exp not in expiries: exp = None
+        if exp is None:
+            return {"status": "error", "message": "Expiry not found"}
+
+        self._evict_idle()
+        with self._lock:
+            chain = self.chains.get((name, exp))
+        if chain is None:
+            chain = self._open(name, exp)
+            if chain is None:
+                return {"status": "error", "message": "Symbol not found"}
+        chain.last_access = time.time()
+
+        if not self.subscriptions.connected and time.time() - chain.rest_refreshed > self.rest_interval:
+            self._seed(chain) # no live feed: fall back to (rate-limited) REST
+
+        with self._lock:
+            if chain.spot <= 0:
+                return {"status": "error", "message": "Could not fetch spot price"}
+            cached = chain._response
+            if cached is None or cached[0] != chain.version:
+                cached = (chain.version, self._build_response(chain, expiries))
+                chain._response = cached
+            return cached[1]
+
+    def _open(self, name, exp):
+        spot_token = self.spot_token_fn(name)
+        if not spot_token:
+            return None
+        strikes = self.get_scrip_master().get_strikes(name, exp)
+        if not strikes:
+            return None
+        with self._lock:
+            chain = self.chains.get((name, exp))
+            if chain is not None:
+                return chain
+            chain = OptionChain(name, exp, name in INDEX_NAMES, str(spot_token), strikes)
+            self.chains[(name, exp)] = chain
+            self._chains_by_spot.setdefault((NSE_CM, chain.spot_token), []).append(chain)
+            self.subscriptions.set_group(f"{chain.group}:spot", [chain.spot_token], NSE_CM, LTP)
+        self._seed(chain)
+        logger.info(f"Opened {name} {expiry_label(exp)} chain ({len(chain.window)} strikes)")
+        return chain
+
+    def _seed(self, chain):
+        """One REST round-trip for spot, one batched call for every leg in the window."""
+        chain.rest_refreshed = time.time()
+        spot = self.quote_fn([("NSE", chain.spot_token)], "LTP").get(("NSE", chain.spot_token))
+        if spot and spot.get('ltp'):
+            with self._lock:
+                self._set_spot(chain, float(spot['ltp']))
+        with self._lock:
+            tokens = [leg['token'] for leg in chain.legs.values()]
+        if not tokens:
+            return
+        quotes = self.quote_fn([("NFO", t) for t in tokens], "FULL")
+        with self._lock:
+            for leg in chain.legs.values():
+                q = quotes.get(("NFO", leg['token']))
+                if not q: continue
+                leg['ltp'] = q.get('ltp', leg['ltp'])
+                leg['oi'] = q.get('opnInterest', leg['oi'])
+                leg['volume'] = q.get('tradeVolume', leg['volume'])
+                leg['close'] = q.get('close', leg['close'])
+            chain.version += 1
+            chain.updated = time.time()
+
+    def _build_response(self, chain, expiries):
+        atm = chain.strikes[chain.atm_index()]
+        ce_legs = [chain.legs.get((strike, "CE"), {}) for strike in chain.window]
+        pe_legs = [chain.legs.get((strike, "PE"), {}) for strike in chain.window]
+
+        # IV / Greeks for every leg in one vectorized solve
+        ce, pe, stats = chain_analytics(
+            chain.spot, chain.window, years_to_expiry(chain.expiry),
+            [leg.get('ltp', 0) for leg in ce_legs], [leg.get('ltp', 0) for leg in pe_legs],
+            [leg.get('oi', 0) for leg in ce_legs], [leg.get('oi', 0) for leg in pe_legs],
+            [leg.get('volume', 0) for leg in ce_legs], [leg.get('volume', 0) for leg in pe_legs])
+
+        rows = []
+        for i, strike in enumerate(chain.window):
+            ce_leg, pe_leg = ce_legs[i], pe_legs[i]
+            row = {
+                "strike": strike,
+                "type": "ATM" if strike == atm else ("ITM" if strike < atm else "OTM"),
+                "ce_ltp": ce_leg.get('ltp', 0),
+                "pe_ltp": pe_leg.get('ltp', 0),
+                "ce_token": ce_leg.get('token'),
+                "pe_token": pe_leg.get('token'),
+                "ce_oi": ce_leg.get('oi', 0),
+                "pe_oi": pe_leg.get('oi', 0),
+                "ce_volume": ce_leg.get('volume', 0),
+                "pe_volume": pe_leg.get('volume', 0),
+            }
+            for prefix, leg in (("ce", ce), ("pe", pe)):
+                row[f"{prefix}_iv"] = _num(leg['iv'][i] * 100, 2) # percent
+                row[f"{prefix}_delta"] = _num(leg['delta'][i], 4)
+                row[f"{prefix}_gamma"] = _num(leg['gamma'][i], 6)
+                row[f"{prefix}_theta"] = _num(leg['theta'][i], 4)
+                row[f"{prefix}_vega"] = _num(leg['vega'][i], 4)
+            rows.append(row)
+
+        today = date.today()
+        return {
+            "status": "success",
+            "version": next(self._builds),
+            "symbol": chain.name,
+            "spot_price": chain.spot,
+            "expiry": expiry_label(chain.expiry),
+            "expiries": [expiry_label(e) for e in expiries if e >= today],
+            "updated": chain.updated,
+            "live": self.subscriptions.connected,
+            "analytics": {
+                "pcr_oi": _num(stats['pcr_oi'], 3) if stats['pcr_oi'] is not None else None,
+                "pcr_volume": _num(stats['pcr_volume'], 3) if stats['pcr_volume'] is not None else None,
+                "max_pain": stats['max_pain'],
+                "atm_iv": _num(stats['atm_iv'] * 100, 2) if stats['atm_iv'] is not None else None,
+            },
+            "chain": rows,
+        }
+
+    # --- Window management (callers hold self._lock) ---
+
+    def _set_spot(self, chain, spot):
+        chain.spot = spot
+        chain.version += 1
+        chain.updated = time.time()
+        atm = chain.atm_index()
+        if chain.centre is None or abs(atm - chain.centre) >= self.recenter_strikes:
+            self._recentre(chain, atm)
+
+    def _recentre(self, chain, atm):
+        lo, hi = max(0, atm - self.width), min(len(chain.strikes), atm + self.width + 1)
+        window = chain.strikes[lo:hi]
+        tokens = self.get_scrip_master().get_fno_tokens_for_chain(
+            chain.name, chain.expiry, window, chain.is_index)
+
+        legs = {}
+        for strike in window:
+            for otype in ("CE", "PE"):
+                token = tokens.get(f"{int(strike)}_{otype}")
+                if not token: continue
+                # Keep what we already know about legs that stay in the window
+                legs[(strike, otype)] = chain.legs.get((strike, otype)) or \
+                    {"token": token, "ltp": 0, "oi": 0, "volume": 0, "close": 0}
+
+        for key, leg in chain.legs.items():
+            if key not in legs: self._legs_by_token.pop((NSE_FO, leg['token']), None)
+        for (strike, otype), leg in legs.items():
+            self._legs_by_token[(NSE_FO, leg['token'])] = (chain, strike, otype)
+        chain.legs, chain.window, chain.centre = legs, window, atm
+        chain.version += 1
+
+        self.subscriptions.set_group(chain.group, [leg['token'] for leg in legs.values()], NSE_FO, SNAP_QUOTE)
+
+    def _evict_idle(self):
+        now = time.time()
+        with self._lock:
+            for key, chain in list(self.chains.items()):
+                if now - chain.last_access < self.idle_ttl: continue
+                del self.chains[key]
+                for leg in chain.legs.values():
+                    self._legs_by_token.pop((NSE_FO, leg['token']), None)
+                spot_chains = self._chains_by_spot.get((NSE_CM, chain.spot_token), [])
+                if chain in spot_chains: spot_chains.remove(chain)
+                self.subscriptions.drop_group(chain.group)
+                self.subscriptions.drop_group(f"{chain.group}:spot")
+                logger.info(f"Closed idle {chain.name} {expiry_label(chain.expiry)} chain")
+
+    # --- Ticks ---
+
+    def apply_ticks(self, batch):
+        """Routes a coalesced tick batch {(exchange_type, token): tick} into the chains."""
+        if not self.chains:
+            return
+        with self._lock:
+            for key, tick in batch.items():
+                if 'last_traded_price' not in tick: continue
+                # SmartWebSocketV2 sends prices in paise
+                ltp = tick['last_traded_price'] / 100.0
+                hit = self._legs_by_token.get(key)
+                if hit is not None:
+                    chain, strike, otype = hit
+                    leg = chain.legs[(strike, otype)]
+                    leg['ltp'] = ltp
+                    if 'open_interest' in tick: leg['oi'] = tick['open_interest']
+                    if 'volume_trade_for_the_day' in tick: leg['volume'] = tick['volume_trade_for_the_day']
+                    if 'closed_price' in tick: leg['close'] = tick['closed_price'] / 100.0
+                    chain.version += 1
+                    chain.updated = time.time()
+                for chain in self._chains_by_spot.get(key, ()):
+                    self._set_spot(chain, ltp)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chains": [f"{c.name} {expiry_label(c.expiry)}" for c in self.chains.values()],
+                "legs": len(self._legs_by_token),
+            }
@@ -0,0 +1,81 @@
+import asyncio
+
+try:
+    from .api_scheduler import HIGH
+    from .session_manager import is_auth_error
+except ImportError:
+    from api_scheduler import HIGH
+    from session_manager import is_auth_error
+
+# SmartAPI market-data call accepts at most 50 tokens per request (all exchanges combined)
+MAX_TOKENS_PER_REQUEST = 50
+QUOTE_MODES = ("LTP", "OHLC", "FULL")
+
+
+def chunk_instruments(instruments, size=MAX_TOKENS_PER_REQUEST):
+    """
+    Groups (exchange, token) pairs into request payloads of the form
+    {"NSE": [...], "NFO": [...]} with at most `size` tokens each. Duplicates are dropped.
+    """
+    chunks, current, count = [], {}, 0
+    seen = set()
+    for exchange, token in instruments:
+        key = (exchange, str(token))
+        if key in seen: continue
+        seen.add(key)
+        current.setdefault(exchange, []).append(str(token))
+        count += 1
+        if count == size:
+            chunks.append(current)
+            current, count = {}, 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _collect(results, on_auth_error=None):
+    quotes = {}
+    rejected = False
+    for res in results:
+        if is_auth_error(res):
+            rejected = True
+        if not res or not res.get('data'):
+            continue
+        for q in res['data'].get('fetched') or []:
+            q.setdefault('tradingsymbol', q.get('tradingSymbol'))
+            q.setdefault('symboltoken', q.get('symbolToken'))
+            quotes[(q.get('exchange'), str(q.get('symbolToken')))] = q
+    if rejected and on_auth_error is not None:
+        on_auth_error() # once per call, however many chunks were rejected
+    return quotes
+
+
+def fetch_quotes(api, scheduler, instruments, mode="LTP", priority=HIGH, on_auth_error=None):
+    """
+    Fetches quotes for many instruments with the multi-token market-data call.
+    instruments: iterable of (exchange, token)
+    on_auth_error: called when SmartAPI rejects the session token (e.g. to invalidate it)
+    Returns: {(exchange, token): quote}. Quotes also carry the ltpData-style
+    'tradingsymbol' / 'symboltoken' keys so callers can treat both shapes alike.
+    """
+    if mode not in QUOTE_MODES:
+        raise ValueError(f"mode must be one of {QUOTE_MODES}")
+
+    results = [scheduler.call("quote", api.getMarketData, mode, chunk, priority=priority)
+               for chunk in chunk_instruments(instruments)]
+    return _collect(results, on_auth_error)
+
+
+async def fetch_quotes_async(api, scheduler, instruments, mode="LTP", priority=HIGH, on_auth_error=None):
+    """
+    fetch_quotes for coroutine callers: `api` is an AsyncSmartApi and every
+    50-token chunk is in flight at once (the scheduler still paces them).
+    """
+    if mode not in QUOTE_MODES:
+        raise ValueError(f"mode must be one of {QUOTE_MODES}")
+
+    results = await asyncio.gather(*(
+        scheduler.acall("quote", api.get_market_data, mode, chunk, priority=priority)
+        for chunk in chunk_instruments(instruments)
+    ))
+    return _collect(results, on_auth_error)
@@ -0,0 +1,413 @@
+"""
+Offline record/replay for SmartAPI.
+- Recorder + RecordingSmartConnect / RecordingAsyncSmartApi capture REST responses
+  (getCandleData, ltpData, getMarketData) and websocket ticks to JSON-lines files in one directory.
+- FakeSmartConnect, FakeAsyncSmartApi and FakeWebSocket are drop-in stand-ins for SmartConnect,
+  AsyncSmartApi and SmartWebSocketV2 that replay a recording (or synthesize data when there is none),
+  with configurable latency, speed and rate-limit errors.
+"""
+import os
+import json
+import time
+import asyncio
+import random
+import threading
+import logging
+
+import numpy as np
+
+try:
+    from .fake_smartapi import synthetic_candles, synthetic_quote
+except ImportError:
+    from fake_smartapi import synthetic_candles, synthetic_quote
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Replay")
+
+REST_FILE = "rest.jsonl"
+TICKS_FILE = "ticks.jsonl"
+RATE_LIMIT_RESPONSE = {"status": False, "message": "Access denied because of exceeding access rate", "errorcode": "AB1019", "data": None}
+
+
+class Recorder:
+    """Appends REST responses and ticks to <directory>/rest.jsonl and <directory>/ticks.jsonl."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._rest = open(os.path.join(directory, REST_FILE), "a", encoding="utf-8")
+        self._ticks = open(os.path.join(directory, TICKS_FILE), "a", encoding="utf-8")
+        self._start = time.monotonic()
+
+    def rest(self, method, args, response):
+        line = json.dumps({"t": round(time.monotonic() - self._start, 4), "method": method, "args": args, "response": response})
+        with self._lock:
+            self._rest.write(line + "\n")
+            self._rest.flush()
+
+    def tick(self, tick):
+        line = json.dumps({"t": round(time.monotonic() - self._start, 4), "tick": tick})
+        with self._lock:
+            self._ticks.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._rest.close()
+            self._ticks.close()
+
+
+class RecordingSmartConnect:
+    """Wraps a SmartConnect; the market-data calls are recorded, everything else passes through."""
+
+    def __init__(self, api, recorder):
+        self._api = api
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def getCandleData(self, params):
+        res = self._api.getCandleData(params)
+        self._recorder.rest("getCandleData", [dict(params)], res)
+        return res
+
+    def ltpData(self, exchange, tradingsymbol, symboltoken):
+        res = self._api.ltpData(exchange, tradingsymbol, symboltoken)
+        self._recorder.rest("ltpData", [exchange, tradingsymbol, symboltoken], res)
+        return res
+
+    def getMarketData(self, mode, exchangeTokens):
+        res = self._api.getMarketData(mode, exchangeTokens)
+        self._recorder.rest("getMarketData", [mode, exchangeTokens], res)
+        return res
+
+
+class RecordingAsyncSmartApi:
+    """
+    Wraps an AsyncSmartApi like RecordingSmartConnect wraps SmartConnect: the market-data
+    calls are recorded under the SmartConnect method names, so one recording replays for both clients.
+    """
+
+    def __init__(self, api, recorder):
+        self._api = api
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    async def get_candle_data(self, params):
+        res = await self._api.get_candle_data(params)
+        self._recorder.rest("getCandleData", [dict(params)], res)
+        return res
+
+    async def ltp_data(self, exchange, tradingsymbol, symboltoken):
+        res = await self._api.ltp_data(exchange, tradingsymbol, symboltoken)
+        self._recorder.rest("ltpData", [exchange, tradingsymbol, symboltoken], res)
+        return res
+
+    async def get_market_data(self, mode, exchange_tokens):
+        res = await self._api.get_market_data(mode, exchange_tokens)
+        self._recorder.rest("getMarketData", [mode, exchange_tokens], res)
+        return res
+
+
+def load_rest(directory):
+    """Recorded responses indexed for replay: candles and quotes per token (latest recording wins)."""
+    candles, ltp, quotes = {}, {}, {}
+    path = os.path.join(directory, REST_FILE)
+    if not os.path.exists(path):
+        return candles, ltp, quotes
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            res = rec.get("response") or {}
+            if not res.get("status") or not res.get("data"):
+                continue
+            if rec["method"] == "getCandleData":
+                p = rec["args"][0]
+                key = (str(p["symboltoken"]), p.get("interval", "ONE_DAY"))
+                merged = {c[0]: c for c in candles.get(key, [])}
+                merged.update({c[0]: c for c in res["data"]})
+                candles[key] = [merged[ts] for ts in sorted(merged)]
+            elif rec["method"] == "ltpData":
+                ltp[str(rec["args"][2])] = res["data"]
+            elif rec["method"] == "getMarketData":
+                for q in res["data"].get("fetched") or []:
+                    quotes[(q.get("exchange"), str(q.get("symbolToken")))] = q
+    return candles, ltp, quotes
+
+
+def load_ticks(directory):
+    """[(t, tick), ...] in recording order."""
+    path = os.path.join(directory, TICKS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [(rec["t"], rec["tick"]) for rec in map(json.loads, f)]
+
+
+class _RateLimiter:
+    """Fixed one-second windows per method; over the limit -> SmartAPI's rate-limit payload."""
+
+    def __init__(self, limits):
+        self.limits = limits or {}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, method):
+        limit = self.limits.get(method)
+        if not limit:
+            return False
+        sec = int(time.time())
+        with self._lock:
+            window, count = self._windows.get(method, (sec, 0))
+            count = count + 1 if window == sec else 1
+            self._windows[method] = (sec, count)
+        return count > limit
+
+
+class FakeSmartConnect:
+    """
+    Drop-in SmartConnect for offline runs and benchmarks.
+    directory: recording to replay (None -> synthetic data for every token)
+    candles: optional {token: candles} served ahead of the recording (e.g. synthetic_universe output)
+    latency: seconds added to every call; rate_limits: {"getCandleData": 3, ...} per second
+    fail_rate: fraction of calls that raise like a dropped connection
+    """
+
+    def __init__(self, directory=None, latency=0.0, rate_limits=None, fail_rate=0.0, candles=None, api_key=None, **kwargs):
+        self.api_key = api_key
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.access_token = None
+        self.refresh_token = None
+        self.feed_token = None
+        self._limiter = _RateLimiter(rate_limits)
+        self._candles, self._ltp, self._quotes = load_rest(directory) if directory else ({}, {}, {})
+        for token, rows in (candles or {}).items():
+            self._candles[(str(token), "ONE_DAY")] = rows
+        self.calls = {}
+
+    def _enter(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise ConnectionError(f"{method}: connection reset (simulated)")
+        return RATE_LIMIT_RESPONSE if self._limiter.hit(method) else None
+
+    def generateSession(self, clientCode, password, totp):
+        if denied := self._enter("generateSession"): return denied
+        self.access_token, self.refresh_token, self.feed_token = f"jwt-{int(time.time())}", "refresh-token", "feed-token"
+        return {"status": True, "message": "SUCCESS", "data": {
+            "clientcode": clientCode, "jwtToken": f"Bearer {self.access_token}",
+            "refreshToken": self.refresh_token, "feedToken": self.feed_token}}
+
+    def generateToken(self, refresh_token):
+        if denied := self._enter("generateToken"): return denied
+        self.access_token, self.feed_token = f"jwt-{int(time.time())}", f"feed-{int(time.time())}"
+        return {"status": True, "message": "SUCCESS", "data": {
+            "jwtToken": self.access_token, "refreshToken": refresh_token, "feedToken": self.feed_token}}
+
+    def getCandleData(self, params):
+        if denied := self._enter("getCandleData"): return denied
+        token = str(params["symboltoken"])
+        rows = self._candles.get((token, params.get("interval", "ONE_DAY")))
+        if rows is None:
+            rows = synthetic_candles(token)
+        lo, hi = params["fromdate"][:10], params["todate"][:10]
+        return {"status": True, "message": "SUCCESS", "data": [c for c in rows if lo <= c[0][:10] <= hi]}
+
+    def ltpData(self, exchange, tradingsymbol, symboltoken):
+        if denied := self._enter("ltpData"): return denied
+        data = self._ltp.get(str(symboltoken))
+        if data is None:
+            q = synthetic_quote(exchange, symboltoken, "OHLC")
+            data = {"exchange": exchange, "tradingsymbol": tradingsymbol, "symboltoken": str(symboltoken),
+                    "open": q["open"], "high": q["high"], "low": q["low"], "close": q["close"], "ltp": q["ltp"]}
+        return {"status": True, "message": "SUCCESS", "data": data}
+
+    def getMarketData(self, mode, exchangeTokens):
+        if denied := self._enter("getMarketData"): return denied
+        fetched = [self._quotes.get((exchange, str(token))) or synthetic_quote(exchange, token, mode)
+                   for exchange, tokens in exchangeTokens.items() for token in tokens]
+        return {"status": True, "message": "SUCCESS", "data": {"fetched": fetched, "unfetched": []}}
+
+
+class FakeAsyncSmartApi:
+    """
+    AsyncSmartApi interface over a FakeSmartConnect, so in replay mode the async scanner and the
+    quote endpoints are served from the same recording (and synthetic data) as the sync paths.
+    """
+
+    def __init__(self, fake):
+        self._fake = fake
+        self.jwt_token = self.refresh_token = self.feed_token = self.client_code = None
+
+    async def _call(self, fn, *args):
+        if self._fake.latency: # the fake sleeps to simulate it: keep that off the event loop
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def use_session(self, session_data):
+        self.jwt_token = session_data.get('jwtToken')
+        self.refresh_token = session_data.get('refreshToken')
+        self.feed_token = session_data.get('feedToken')
+        self.client_code = session_data.get('clientcode', self.client_code)
+
+    async def login(self, client_code, password, totp):
+        res = await self._call(self._fake.generateSession, client_code, password, totp)
+        if res.get('status') and res.get('data'):
+            self.client_code = client_code
+            self.use_session({**res['data'], "clientcode": client_code})
+        return res
+
+    async def generate_token(self, refresh_token=None):
+        return await self._call(self._fake.generateToken, refresh_token or self.refresh_token)
+
+    async def get_candle_data(self, params):
+        return await self._call(self._fake.getCandleData, params)
+
+    async def ltp_data(self, exchange, tradingsymbol, symboltoken):
+        return await self._call(self._fake.ltpData, exchange, tradingsymbol, symboltoken)
+
+    async def get_market_data(self, mode, exchange_tokens):
+        return await self._call(self._fake.getMarketData, mode, exchange_tokens)
+
+    async def aclose(self):
+        pass
+
+
+class FakeWebSocket:
+    """
+    Drop-in SmartWebSocketV2. connect() blocks like the real one: it calls on_open and then
+    delivers ticks to on_data until close_connection().
+    - with a recording: replays ticks.jsonl for subscribed tokens, `speed`x faster
+      than recorded (speed=0 -> no pauses), optionally looping
+    - without one: a random walk for every subscribed token every `interval` seconds
+    """
+
+    def __init__(self, auth_token=None, api_key=None, client_code=None, feed_token=None,
+                 max_retry_attempt=1, directory=None, speed=1.0, loop=False, interval=1.0, **kwargs):
+        self.auth_token, self.api_key, self.client_code, self.feed_token = auth_token, api_key, client_code, feed_token
+        self.MAX_RETRY_ATTEMPT = max_retry_attempt
+        self.RESUBSCRIBE_FLAG = False
+        self.input_request_dict = {}
+        self.speed = speed
+        self.loop = loop
+        self.interval = interval
+        self.ticks = load_ticks(directory) if directory else []
+        self.subscribed = {} # (exchange_type, token) -> mode
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prices = {}
+
+    # Callbacks the app assigns
+    def on_open(self, wsapp): pass
+    def on_data(self, wsapp, message): pass
+    def on_error(self, wsapp, error): pass
+    def on_close(self, wsapp): pass
+
+    def subscribe(self, correlation_id, mode, token_list):
+        with self._lock:
+            for group in token_list:
+                for token in group["tokens"]:
+                    self.subscribed[(group["exchangeType"], str(token))] = mode
+
+    def unsubscribe(self, correlation_id, mode, token_list):
+        with self._lock:
+            for group in token_list:
+                for token in group["tokens"]:
+                    self.subscribed.pop((group["exchangeType"], str(token)), None)
+
+    def close_connection(self):
+        self._stop.set()
+
+    def connect(self):
+        self._stop.clear()
+        self.on_open(self)
+        try:
+            if self.ticks:
+                self._replay()
+            else:
+                self._synthesize()
+        finally:
+            self.on_close(self)
+
+    def _replay(self):
+        while not self._stop.is_set():
+            start, first = time.monotonic(), self.ticks[0][0]
+            for t, tick in self.ticks:
+                if self._stop.is_set(): return
+                if self.speed:
+                    wait = (t - first) / self.speed - (time.monotonic() - start)
+                    if wait > 0: time.sleep(wait)
+                if (tick.get("exchange_type"), str(tick.get("token"))) in self.subscribed:
+                    self.on_data(self, dict(tick))
+                    self.sent += 1
+            if not self.loop: return
+
+    def _synthesize(self):
+        rng = np.random.default_rng(7)
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                items = list(self.subscribed.items())
+            for (exchange_type, token), mode in items:
+                self.on_data(self, self.synthetic_tick(exchange_type, token, mode, rng))
+                self.sent += 1
+
+    def synthetic_tick(self, exchange_type, token, mode, rng):
+        """One SmartWebSocketV2-shaped tick (prices in paise) continuing the token's random walk."""
+        key = (exchange_type, token)
+        state = self._prices.get(key)
+        if state is None:
+            base = synthetic_quote("NSE", token, "OHLC")
+            state = self._prices[key] = {"close": base["close"], "open": base["open"], "ltp": base["ltp"],
+                                         "high": base["ltp"], "low": base["ltp"], "volume": 0}
+        state["ltp"] = max(0.05, state["ltp"] * (1 + rng.normal(0, 0.0005)))
+        state["high"] = max(state["high"], state["ltp"])
+        state["low"] = min(state["low"], state["ltp"])
+        state["volume"] += int(rng.integers(1, 500))
+        tick = {"subscription_mode": mode, "exchange_type": exchange_type, "token": token,
+                "sequence_number": self.sent, "exchange_timestamp": int(time.time() * 1000),
+                "last_traded_price": int(round(state["ltp"] * 100))}
+        if mode >= 2:
+            tick.update({"volume_trade_for_the_day": state["volume"],
+                         "open_price_of_the_day": int(round(state["open"] * 100)),
+                         "high_price_of_the_day": int(round(state["high"] * 100)),
+                         "low_price_of_the_day": int(round(state["low"] * 100)),
+                         "closed_price": int(round(state["close"] * 100))})
+        if mode >= 3:
+            tick["open_interest"] = synthetic_quote("NFO", token, "FULL")["opnInterest"]
+        return tick
+
+
+def synthetic_universe(n, days=400, seed=11):
+    """
+    n tokens of daily candles generated in one vectorized pass (fast enough for 10,000 symbols).
+    Returns [(symbol, token, candles), ...] in SmartAPI candle format.
+    """
+    rng = np.random.default_rng(seed)
+    end = np.datetime64("today")
+    dates = np.arange(end - np.timedelta64(days, "D"), end + np.timedelta64(1, "D"))
+    dates = dates[np.is_busday(dates)]
+    T = len(dates)
+    start = rng.uniform(50, 3000, (n, 1))
+    rets = rng.normal(0.0003, 0.018, (n, T))
+    close = start * np.exp(np.cumsum(rets, axis=1))
+    open_ = close * np.exp(rng.normal(0, 0.006, (n, T)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, (n, T))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, (n, T))))
+    volume = rng.integers(10_000, 5_000_000, (n, T))
+    stamps = [f"{d}T00:00:00+05:30" for d in dates.astype(str)]
+
+    o, h, l, c = (np.round(a, 2).tolist() for a in (open_, high, low, close))
+    v = volume.tolist()
+    universe = []
+    for i in range(n):
+        candles = [list(row) for row in zip(stamps, o[i], h[i], l[i], c[i], v[i])]
+        universe.append((f"SYM{i}", str(100000 + i), candles))
+    return universe
@@ -0,0 +1,171 @@
+import gzip
+import threading
+import collections
+
+from fastapi.responses import Response
+
+try:
+    from .market_store import encode_json
+except ImportError:
+    from market_store import encode_json
+
+try:
+    import msgpack
+except ImportError: # optional binary format
+    msgpack = None
+
+try:
+    import brotli
+except ImportError: # optional; gzip is always available
+    brotli = None
+
+LAYOUTS = ("rows", "columns")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+COMPRESS_MIN = 1024 # smaller bodies go out uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # past ~5 brotli gets much slower for little gain on JSON this size
+CACHE_BYTES = 64 * 1024 * 1024
+
+
+class Variant(collections.namedtuple("Variant", "layout fmt coding")):
+    """One negotiated representation: rows|columns layout, json|msgpack, identity|gzip|br."""
+
+    @property
+    def plain(self):
+        return self == PLAIN
+
+    @property
+    def tag(self):
+        """Suffix that keeps ETags distinct per representation."""
+        return "" if self.plain else f"-{self.layout}-{self.fmt}-{self.coding}"
+
+    @property
+    def media_type(self):
+        return "application/msgpack" if self.fmt == "msgpack" else "application/json"
+
+
+PLAIN = Variant("rows", "json", "identity")
+
+
+def _accepted_codings(header):
+    codings = set()
+    for part in header.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        codings.add(name.strip())
+    return codings
+
+
+def negotiate(request, layout=None):
+    """
+    Variant for a request:
+    - layout: ?layout=columns (keys once, one value array per field), default rows
+    - format: Accept: application/msgpack when msgpack is installed, otherwise JSON
+    - coding: Accept-Encoding br (when brotli is installed) or gzip
+    """
+    layout = layout or request.query_params.get("layout") or "rows"
+    if layout not in LAYOUTS:
+        layout = "rows"
+    accept = request.headers.get("accept", "").lower()
+    fmt = "msgpack" if msgpack is not None and any(t in accept for t in MSGPACK_TYPES) else "json"
+    codings = _accepted_codings(request.headers.get("accept-encoding", ""))
+    if brotli is not None and "br" in codings:
+        coding = "br"
+    elif "gzip" in codings:
+        coding = "gzip"
+    else:
+        coding = "identity"
+    return Variant(layout, fmt, coding)
+
+
+def columnar(payload):
+    """Turns every top-level list of row dicts into {field: [values...]} (field order of the first row)."""
+    out = {}
+    for name, value in payload.items():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            fields = list(value[0])
+            seen = set(fields)
+            for row in value:
+                if len(row) != len(fields) or row.keys() - seen:
+                    for k in row:
+                        if k not in seen:
+                            seen.add(k)
+                            fields.append(k)
+            value = {f: [row.get(f) for row in value] for f in fields}
+        out[name] = value
+    return out
+
+
+def encode_payload(payload, variant):
+    """Uncompressed body of `payload` in the variant's layout and format."""
+    if variant.layout == "columns":
+        payload = columnar(payload)
+    if variant.fmt == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True)
+    return encode_json(payload)
+
+
+def compress(body, coding):
+    """(body, coding actually applied)."""
+    if coding == "identity" or len(body) < COMPRESS_MIN:
+        return body, "identity"
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+
+
+def encoded_response(variant, body, coding, headers=None):
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept, Accept-Encoding"
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type=variant.media_type, headers=headers)
+
+
+class ResponseEncoder:
+    """
+    Cache of encoded (and compressed) bodies keyed by request and representation.
+    An entry is only valid for the version it was built at, so each body is serialized and
+    compressed at most once per snapshot/chain version, however many clients poll it.
+    LRU, bounded by total bytes.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict() # (key, variant) -> (version, body, coding)
+        self._bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "raw_bytes": 0, "sent_bytes": 0}
+
+    def render(self, key, version, variant, build):
+        """(body, coding) for `variant`; build() returns the uncompressed body and runs only on a miss."""
+        ck = (key, variant)
+        with self._lock:
+            entry = self._entries.get(ck)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(ck)
+                self.counters["hits"] += 1
+                self.counters["sent_bytes"] += len(entry[1])
+                return entry[1], entry[2]
+        raw = build()
+        body, coding = compress(raw, variant.coding)
+        with self._lock:
+            self.counters["misses"] += 1
+            self.counters["raw_bytes"] += len(raw)
+            self.counters["sent_bytes"] += len(body)
+            old = self._entries.pop(ck, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            if len(body) <= self.max_bytes // 4:
+                self._entries[ck] = (version, body, coding)
+                self._bytes += len(body)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted[1])
+        return body, coding
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries), "cached_bytes": self._bytes,
+                    "msgpack": msgpack is not None, "brotli": brotli is not None}
@@ -0,0 +1,214 @@
+import os
+import time
+import heapq
+import threading
+import logging
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ScanScheduler")
+
+# Refresh tiers, most important first
+INDEX = "index" # index constituents (NIFTY 50)
+WATCHLIST = "watchlist" # symbols users asked for recently
+HOT = "hot" # moving hard or trading near a breakout level
+COLD = "cold" # everything else
+TIERS = (INDEX, WATCHLIST, HOT, COLD)
+
+# Seconds between candle refreshes per tier (live prices come from the websocket meanwhile)
+TIER_INTERVALS = {
+    INDEX: float(os.getenv("SCAN_INTERVAL_INDEX", 15)),
+    WATCHLIST: float(os.getenv("SCAN_INTERVAL_WATCHLIST", 20)),
+    HOT: float(os.getenv("SCAN_INTERVAL_HOT", 45)),
+    COLD: float(os.getenv("SCAN_INTERVAL_COLD", 300)),
+}
+RETRY_AFTER = 30 # failed fetches come back sooner than a cold refresh, but not in a hot loop
+
+
+class ScanScheduler:
+    """
+    Continuous, deadline-ordered refresh queue for the scanner universe.
+    Every token has a next-due time (a min-heap); the scanner pops what is due, fetches it
+    and reports back, and the token is re-queued by its tier's interval. The tier is decided
+    when the token is re-queued: index constituents, then watchlisted tokens, then `is_hot(token)`.
+    Heap entries are invalidated lazily: an entry only counts if it matches the token's current due time.
+    """
+
+    def __init__(self, intervals=TIER_INTERVALS, is_hot=None, watch_ttl=900):
+        self.intervals = dict(intervals)
+        self.is_hot = is_hot or (lambda token: False)
+        self.watch_ttl = watch_ttl
+        self._lock = threading.Lock()
+        self._heap = [] # (due, token)
+        self._due = {} # token -> due time of its live heap entry
+        self._items = {} # token -> target dict ({'symbol', 'token', ...})
+        self._index = set()
+        self._watch = {} # token -> watch expiry
+        self._last = {} # token -> last refresh attempt
+        self._failing = set() # tokens whose last fetch returned no candles
+        self._state = None # last staleness_state(), reused within its max_age
+        self.refreshed = 0
+
+    def tier(self, token, now=None):
+        now = now or time.time()
+        if token in self._index:
+            return INDEX
+        if self._watch.get(token, 0) > now:
+            return WATCHLIST
+        try:
+            if self.is_hot(token):
+                return HOT
+        except Exception as e:
+            logger.warning(f"Hot check failed for {token}: {e}")
+        return COLD
+
+    def _push(self, token, due):
+        self._due[token] = due
+        heapq.heappush(self._heap, (due, token))
+
+    def set_universe(self, targets, index_tokens=()):
+        """Replaces the universe; new tokens are due immediately, removed ones drop out of the queue."""
+        now = time.time()
+        with self._lock:
+            self._index = {str(t) for t in index_tokens}
+            self._watch = {t: until for t, until in self._watch.items() if until > now}
+            wanted = {str(x['token']): x for x in targets}
+            for token in list(self._items):
+                if token not in wanted:
+                    del self._items[token]
+                    self._due.pop(token, None)
+                    self._failing.discard(token)
+            for token, item in wanted.items():
+                if token not in self._items:
+                    self._push(token, now)
+                self._items[token] = item
+
+    def watch(self, tokens, ttl=None):
+        """Marks tokens as watchlisted; a watched token older than its tier interval is pulled forward."""
+        now = time.time()
+        until = now + (ttl or self.watch_ttl)
+        with self._lock:
+            for token in map(str, tokens):
+                self._watch[token] = until
+                due = self._due.get(token)
+                if due is None: continue
+                pull_to = self._last.get(token, 0) + self.intervals[WATCHLIST]
+                if pull_to < due:
+                    self._push(token, max(now, pull_to))
+
+    def take_due(self, limit=200, now=None):
+        """Pops up to `limit` due targets, most overdue first."""
+        now = now or time.time()
+        out = []
+        with self._lock:
+            while self._heap and len(out) < limit and self._heap[0][0] <= now:
+                due, token = heapq.heappop(self._heap)
+                if self._due.get(token) != due:
+                    continue # stale entry: rescheduled or removed
+                del self._due[token]
+                out.append(self._items[token])
+        return out
+
+    def done(self, token, ok, now=None):
+        """Records a refresh attempt and queues the token's next one."""
+        now = now or time.time()
+        token = str(token)
+        tier = self.tier(token, now) # may call back into the market table, keep it outside the lock
+        with self._lock:
+            if token not in self._items:
+                return
+            self._last[token] = now
+            self.refreshed += 1
+            if ok:
+                self._failing.discard(token)
+                interval = self.intervals[tier]
+            else:
+                self._failing.add(token)
+                interval = min(self.intervals[tier], RETRY_AFTER)
+            if token not in self._due:
+                self._push(token, now + interval)
+
+    def next_due_in(self, now=None):
+        """Seconds until the next token is due (0 when something is overdue, None when idle)."""
+        now = now or time.time()
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - now)
+
+    @property
+    def failing(self):
+        return len(self._failing)
+
+    def staleness_state(self, now=None, max_age=0):
+        """
+        Raw staleness inputs per tier, cheap to ship to other processes: counts, the median and
+        oldest last-refresh timestamps, and a histogram of due times (see staleness_from_state).
+        Ages are computed by the reader against its own clock, so they keep growing when refreshes stall.
+        A state built less than `max_age` seconds ago is returned as is instead of walking the universe again.
+        """
+        now = now or time.time()
+        cached = self._state
+        if cached is not None and 0 <= now - cached["at"] < max_age:
+            return cached
+        with self._lock:
+            tokens = list(self._items)
+            last = dict(self._last)
+            due = dict(self._due)
+            failing = set(self._failing)
+        stamps = {tier: [] for tier in TIERS}
+        out = {tier: {"interval": self.intervals[tier], "symbols": 0, "never_refreshed": 0, "failing": 0,
+                      "due_hist": [0] * (int(self.intervals[tier]) + 2)} for tier in TIERS}
+        for token in tokens:
+            tier = self.tier(token, now)
+            s = out[tier]
+            s["symbols"] += 1
+            if token in last:
+                stamps[tier].append(last[token])
+            else:
+                s["never_refreshed"] += 1
+            if token in failing:
+                s["failing"] += 1
+            # bucket 0: already overdue (due more than 1s ago); bucket k: due within [now-1+k-1, now-1+k)
+            d = due.get(token, now)
+            k = 0 if d < now - 1 else int(d - (now - 1)) + 1
+            s["due_hist"][min(k, len(s["due_hist"]) - 1)] += 1
+        for tier, values in stamps.items():
+            values.sort()
+            out[tier]["last_p50"] = values[len(values) // 2] if values else None
+            out[tier]["last_min"] = values[0] if values else None
+        self._state = {"at": now, "tiers": out}
+        return self._state
+
+    def staleness(self, now=None):
+        """Per tier: symbols, age of the newest refresh (p50/max), overdue and failing counts, target interval."""
+        now = now or time.time()
+        return staleness_from_state(self.staleness_state(now), now)
+
+    def stats(self):
+        with self._lock:
+            return {"universe": len(self._items), "queued": len(self._due), "failing": len(self._failing),
+                    "watching": sum(1 for t in self._watch.values() if t > time.time()), "refreshed": self.refreshed}
+
+
+def staleness_from_state(state, now=None):
+    """Per-tier staleness report from a ScanScheduler.staleness_state() taken at state["at"], as of `now`."""
+    now = now or time.time()
+    if not state:
+        return {}
+    elapsed = max(0.0, now - state["at"])
+    out = {}
+    for tier, s in state["tiers"].items():
+        hist = s["due_hist"]
+        out[tier] = {
+            "interval": s["interval"],
+            "symbols": s["symbols"],
+            "never_refreshed": s["never_refreshed"],
+            "overdue": sum(hist[:int(elapsed) + 1]), # buckets whose whole range is now past due
+            "failing": s["failing"],
+            "age_p50": round(now - s["last_p50"], 1) if s["last_p50"] is not None else None,
+            "age_max": round(now - s["last_min"], 1) if s["last_min"] is not None else None,
+        }
+    return out
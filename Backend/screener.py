@@ -0,0 +1,505 @@
+import os
+import io
+import ast
+import operator
+import time
+import sqlite3
+import tokenize
+import threading
+import functools
+import collections
+import logging
+
+import numpy as np
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Screener")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCREENS_DB_PATH = os.getenv("SCREENS_DB_PATH", os.path.join(BASE_DIR, "screens.db"))
+MAX_EXPRESSION = 2000 # characters
+MAX_DEPTH = 100 # nesting of the parsed expression; compiling and evaluating it recurse once per level
+MAX_STATES = 1024 # (timeframe, query, rank) evaluations kept for incremental re-runs
+
+
+class ScreenError(ValueError):
+    """Bad screen expression (syntax, unknown field or type mismatch)."""
+
+
+# --- Expression language ---
+# Python-style expressions over the scanner row fields, e.g.
+#   rsi > 60 and breakout_50d == "Bullish Breakout" and avg_dom_3d == "Buyers"
+#   1 < change_pct < 4 and sentiment in ("STRONG BUY", "Bullish")
+#   abs(change_pct) > 2 or not (ltp < 100)
+# AND/OR/NOT/IN/TRUE/FALSE in any case and a single `=` are accepted too.
+# Missing values (None) are NaN, so any comparison against them is False.
+
+FUNCTIONS = {
+    "abs": (1, lambda x: np.abs(x)),
+    "min": (2, lambda a, b: np.fmin(a, b)),
+    "max": (2, lambda a, b: np.fmax(a, b)),
+}
+KEYWORDS = {"and", "or", "not", "in", "true", "false", "none"}
+COMPARE = {
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+ARITHMETIC = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide, ast.Mod: np.mod,
+}
+
+
+def _normalize(text):
+    """Rewrites the friendly spellings (AND, =, TRUE, ...) into Python syntax."""
+    out = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(text).readline):
+            string = tok.string
+            if tok.type == tokenize.NAME and string.lower() in KEYWORDS:
+                string = string.lower()
+                string = string.capitalize() if string in ("true", "false", "none") else string
+            elif tok.type == tokenize.OP and string == "=":
+                string = "=="
+            out.append((tok.type, string))
+    except (tokenize.TokenError, IndentationError, SyntaxError) as e:
+        raise ScreenError(f"Invalid expression: {e}")
+    return tokenize.untokenize(out).strip()
+
+
+def _truth(x):
+    """Element-wise truthiness: non-zero numbers, non-empty strings, never NaN/None."""
+    x = np.asarray(x)
+    if x.dtype == bool:
+        return x
+    if x.dtype.kind in "iuf":
+        return (x != 0) & ~np.isnan(x)
+    return np.array([bool(v) for v in x.ravel()], dtype=bool).reshape(x.shape)
+
+
+def _is_text(x):
+    return isinstance(x, str) or (isinstance(x, np.ndarray) and x.dtype == object)
+
+
+def _compare(op, a, b):
+    if _is_text(a) != _is_text(b) and not (a is None or b is None):
+        raise ScreenError("Cannot compare a text field with a number")
+    if a is None or b is None: # `field == None` / `field != None`
+        x = b if a is None else a
+        missing = np.isnan(x) if not _is_text(x) else np.array([v is None for v in x], dtype=bool)
+        if op is ast.Eq: return missing
+        if op is ast.NotEq: return ~missing
+        raise ScreenError("None can only be compared with == or !=")
+    if _is_text(a) and op not in (ast.Eq, ast.NotEq):
+        raise ScreenError("Text fields only support ==, !=, in and not in")
+    with np.errstate(invalid="ignore"):
+        return COMPARE[op](a, b)
+
+
+def _compile(node, fields):
+    """AST node -> fn(get) where get(field) returns that column (for the rows being evaluated)."""
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, fields)
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if value is not None and not isinstance(value, (bool, int, float, str)):
+            raise ScreenError(f"Unsupported literal: {value!r}")
+        value = float(value) if isinstance(value, (bool, int)) and not isinstance(value, bool) else value
+        return lambda get: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        fields.add(name)
+        return lambda get: get(name)
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v, fields) for v in node.values]
+        reduce = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda get: functools.reduce(reduce, (_truth(p(get)) for p in parts))
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile(node.operand, fields)
+        if isinstance(node.op, ast.Not):
+            return lambda get: ~_truth(operand(get))
+        if isinstance(node.op, ast.USub):
+            return lambda get: -operand(get)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+    if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+        left, right, fn = _compile(node.left, fields), _compile(node.right, fields), ARITHMETIC[type(node.op)]
+        def arithmetic(get):
+            a, b = left(get), right(get)
+            if _is_text(a) or _is_text(b):
+                raise ScreenError("Arithmetic needs numeric fields")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return fn(a, b)
+        return arithmetic
+    if isinstance(node, ast.Compare):
+        return _compile_compare(node, fields)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        if node.func.id not in FUNCTIONS:
+            raise ScreenError(f"Unknown function: {node.func.id} (available: {', '.join(FUNCTIONS)})")
+        arity, fn = FUNCTIONS[node.func.id]
+        if len(node.args) != arity:
+            raise ScreenError(f"{node.func.id}() takes {arity} argument(s)")
+        args = [_compile(a, fields) for a in node.args]
+        def call(get):
+            values = [a(get) for a in args]
+            if any(_is_text(v) for v in values):
+                raise ScreenError(f"{node.func.id}() needs numeric fields")
+            return fn(*values)
+        return call
+    raise ScreenError(f"Unsupported syntax: {ast.dump(node)[:80]}")
+
+
+def _compile_compare(node, fields):
+    terms = [_compile(node.left, fields)]
+    tests = []
+    for op, right in zip(node.ops, node.comparators):
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(right, (ast.Tuple, ast.List, ast.Set)) or not all(isinstance(e, ast.Constant) for e in right.elts):
+                raise ScreenError("`in` needs a list of literals, e.g. sentiment in (\"Bullish\", \"STRONG BUY\")")
+            options = [e.value for e in right.elts]
+            terms.append(None)
+            tests.append((type(op), options))
+        elif type(op) in COMPARE:
+            terms.append(_compile(right, fields))
+            tests.append((type(op), None))
+        else:
+            raise ScreenError("Unsupported comparison")
+
+    def compare(get):
+        result = None
+        left = terms[0](get)
+        for (op, options), term in zip(tests, terms[1:]):
+            if options is not None:
+                part = np.isin(left, options) if _is_text(left) else np.isin(left, [float(o) for o in options if not isinstance(o, str)])
+                part = ~part if op is ast.NotIn else part
+                right = left
+            else:
+                right = term(get)
+                part = _compare(op, left, right)
+            result = part if result is None else result & part
+            left = right
+        return result
+    return compare
+
+
+def _depth(tree):
+    """Deepest nesting in the AST, walked with an explicit stack so the check itself cannot overflow."""
+    deepest, stack = 0, [(tree, 1)]
+    while stack and deepest <= MAX_DEPTH:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        stack.extend((child, depth + 1) for child in ast.iter_child_nodes(node))
+    return deepest
+
+
+@functools.lru_cache(maxsize=512)
+def compile_expression(text):
+    """
+    Compiles a screen expression once (cached by its text).
+    Returns (fn, fields): fn(get) evaluates it element-wise over the columns `get` returns.
+    """
+    if not text or not text.strip():
+        raise ScreenError("Empty expression")
+    if len(text) > MAX_EXPRESSION:
+        raise ScreenError(f"Expression longer than {MAX_EXPRESSION} characters")
+    try:
+        tree = ast.parse(_normalize(text), mode="eval")
+    except SyntaxError as e:
+        raise ScreenError(f"Invalid expression: {e.msg}")
+    except (RecursionError, MemoryError):
+        raise ScreenError("Expression is nested too deeply")
+    if _depth(tree) > MAX_DEPTH:
+        raise ScreenError(f"Expression is nested more than {MAX_DEPTH} levels deep")
+    fields = set()
+    fn = _compile(tree, fields)
+    return fn, frozenset(fields)
+
+
+# --- Columnar table ---
+
+class ColumnTable:
+    """
+    Columnar copy of one MarketStore snapshot, kept in step with it incrementally.
+    Rows keep a fixed position (new symbols are appended), columns are built on first use
+    (float64 with NaN for missing values, or object for text) and only the rows that changed
+    since the last sync are patched into them. `epoch` changes when positions are reset.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = -1
+        self.origin = None # Snapshot.origin the table was built from
+        self.epoch = 0
+        self.rows = [] # position -> row
+        self.encoded = [] # position -> JSON bytes of the row
+        self.positions = {} # symbol -> position
+        self.row_versions = np.zeros(0, dtype=np.int64)
+        self.fields = set()
+        self._columns = {} # field -> array
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def sync(self, snap):
+        """Brings the table to `snap` (a market_store Snapshot); returns the changed positions."""
+        with self._lock:
+            if snap.origin != self.origin:
+                self._reset() # another table (a restarted scanner): its versions say nothing about ours
+                self.origin = snap.origin
+            elif snap.version == self.version:
+                return np.zeros(0, dtype=np.int64)
+            elif snap.version < self.version or len(snap.rows) < len(self.rows):
+                self._reset() # went back a version or symbols were removed
+            changed = []
+            for row, encoded in zip(snap.rows, snap.encoded):
+                sym = row['symbol']
+                v = snap.row_versions.get(sym, snap.version)
+                pos = self.positions.get(sym)
+                if pos is None:
+                    pos = self.positions[sym] = len(self.rows)
+                    self.rows.append(row)
+                    self.encoded.append(encoded)
+                elif v > self.version:
+                    self.rows[pos] = row
+                    self.encoded[pos] = encoded
+                else:
+                    continue
+                changed.append((pos, v))
+                self.fields.update(row)
+            self.version = snap.version
+
+            grow = len(self.rows) - len(self.row_versions)
+            if grow:
+                self.row_versions = np.concatenate([self.row_versions, np.zeros(grow, dtype=np.int64)])
+            idx = np.fromiter((p for p, _ in changed), dtype=np.int64, count=len(changed))
+            self.row_versions[idx] = np.fromiter((v for _, v in changed), dtype=np.int64, count=len(changed))
+            for name in list(self._columns):
+                self._patch(name, idx)
+            return idx
+
+    def _reset(self):
+        self.epoch += 1
+        self.version = -1
+        self.rows, self.encoded, self.positions = [], [], {}
+        self.row_versions = np.zeros(0, dtype=np.int64)
+        self.fields = set()
+        self._columns = {}
+
+    @staticmethod
+    def _build(values):
+        sample = next((v for v in values if v is not None), None)
+        if isinstance(sample, str):
+            col = np.empty(len(values), dtype=object)
+            col[:] = values
+            return col
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    def _patch(self, name, idx):
+        col = self._columns[name]
+        if len(col) < len(self.rows):
+            self._columns.pop(name) # grew: rebuilt on next use
+            return
+        if not len(idx): return
+        values = [self.rows[i].get(name) for i in idx]
+        try:
+            if col.dtype == object:
+                col[idx] = values
+            else:
+                col[idx] = [np.nan if v is None else v for v in values]
+        except (TypeError, ValueError): # the field changed type: rebuild
+            self._columns.pop(name)
+
+    def column(self, name):
+        with self._lock:
+            col = self._columns.get(name)
+            if col is None:
+                if name not in self.fields:
+                    raise ScreenError(f"Unknown field: {name}")
+                try:
+                    col = self._build([row.get(name) for row in self.rows])
+                except (TypeError, ValueError):
+                    raise ScreenError(f"Field {name} mixes text and numbers")
+                self._columns[name] = col
+            return col
+
+    def getter(self, idx=None):
+        """get(field) for the whole table, or for the positions `idx` only."""
+        if idx is None:
+            return self.column
+        return lambda name: self.column(name)[idx]
+
+
+# --- Evaluation ---
+
+class _State:
+    """One (timeframe, query, rank) evaluation: the match mask and the table version it is valid for."""
+    __slots__ = ("epoch", "version", "mask", "runs", "incremental")
+
+    def __init__(self):
+        self.epoch = -1
+        self.version = -1
+        self.mask = np.zeros(0, dtype=bool)
+        self.runs = 0
+        self.incremental = 0
+
+
+class Screener:
+    """
+    Evaluates screen expressions server-side over a ColumnTable per timeframe.
+    Each (timeframe, query) keeps its match mask; a re-run only re-evaluates the rows whose
+    version moved since the last run, so polling dozens of saved screens costs a version
+    compare plus the changed rows. Ranking is computed over the matches only.
+    """
+
+    def __init__(self, max_states=MAX_STATES):
+        self._lock = threading.Lock()
+        self.tables = collections.defaultdict(ColumnTable) # timeframe -> table
+        self._states = collections.OrderedDict() # (timeframe, query) -> _State
+        self.max_states = max_states
+        self.counters = {"runs": 0, "full": 0, "incremental": 0, "rows_evaluated": 0}
+
+    def _state(self, key):
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _State()
+                while len(self._states) > self.max_states:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(key)
+            return state
+
+    def run(self, snap, query, rank="strength_score", order="desc", timeframe="1d"):
+        """
+        Matches of `query` on `snap`, ranked by the `rank` expression.
+        Returns (rows, encoded rows, rank values), all in rank order. The rows are taken while
+        the table lock is held, so a concurrent sync (or reset) cannot shift them under the caller.
+        """
+        predicate, _ = compile_expression(query)
+        ranker, _ = compile_expression(rank or "strength_score")
+        table = self.tables[timeframe]
+        state = self._state((timeframe, query))
+        with table.lock:
+            table.sync(snap)
+            n = len(table)
+            if state.epoch != table.epoch or len(state.mask) > n:
+                idx = None
+                state.mask = np.zeros(n, dtype=bool)
+                self.counters["full"] += 1
+            else:
+                idx = np.flatnonzero(table.row_versions > state.version)
+                if len(state.mask) < n:
+                    state.mask = np.concatenate([state.mask, np.zeros(n - len(state.mask), dtype=bool)])
+                state.incremental += 1
+                self.counters["incremental"] += 1
+            if idx is None or len(idx):
+                hits = predicate(table.getter(idx))
+                count = n if idx is None else len(idx)
+                hits = np.broadcast_to(_truth(hits), (count,))
+                if idx is None:
+                    state.mask[:] = hits
+                else:
+                    state.mask[idx] = hits
+                self.counters["rows_evaluated"] += count
+            state.epoch, state.version = table.epoch, table.version
+            state.runs += 1
+            self.counters["runs"] += 1
+
+            matched = np.flatnonzero(state.mask)
+            values = ranker(table.getter(matched))
+            if _is_text(values):
+                raise ScreenError("rank must be a numeric expression")
+            values = np.broadcast_to(np.asarray(values, dtype=np.float64), (len(matched),))
+            key = np.where(np.isnan(values), np.inf, -values if order != "asc" else values)
+            ordering = np.argsort(key, kind="stable")
+            positions = matched[ordering]
+            rows = [table.rows[i] for i in positions]
+            encoded = [table.encoded[i] for i in positions]
+            return rows, encoded, values[ordering]
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "cached_queries": len(self._states),
+                    "compiled": compile_expression.cache_info().currsize,
+                    "tables": {tf: len(t) for tf, t in self.tables.items()}}
+
+
+# --- Saved screens ---
+
+class ScreenBook:
+    """
+    Saved screens per user, in SQLite (shared by every API worker).
+    A screen is a name, a query, a rank expression/order and a timeframe.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ScreenBook()
+        return cls._instance
+
+    def __init__(self, path=SCREENS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS screens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user TEXT NOT NULL,
+                name TEXT NOT NULL,
+                query TEXT NOT NULL,
+                rank TEXT NOT NULL DEFAULT 'strength_score',
+                sort_order TEXT NOT NULL DEFAULT 'desc',
+                timeframe TEXT NOT NULL DEFAULT '1d',
+                created REAL NOT NULL,
+                UNIQUE (user, name)
+            )
+        """)
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def save(self, user, name, query, rank="strength_score", order="desc", timeframe="1d"):
+        """Creates or replaces the user's screen called `name`; returns it."""
+        compile_expression(query) # reject bad expressions before storing them
+        compile_expression(rank)
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO screens (user, name, query, rank, sort_order, timeframe, created) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user, name) DO UPDATE SET query = excluded.query, rank = excluded.rank, "
+            "sort_order = excluded.sort_order, timeframe = excluded.timeframe",
+            (user, name, query, rank, order, timeframe, time.time())
+        )
+        conn.commit()
+        return self.find(user, name)
+
+    def find(self, user, name):
+        row = self._conn().execute("SELECT * FROM screens WHERE user = ? AND name = ?", (user, name)).fetchone()
+        return dict(row) if row else None
+
+    def get(self, screen_id):
+        row = self._conn().execute("SELECT * FROM screens WHERE id = ?", (screen_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, user):
+        rows = self._conn().execute("SELECT * FROM screens WHERE user = ? ORDER BY name", (user,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def delete(self, screen_id):
+        conn = self._conn()
+        deleted = conn.execute("DELETE FROM screens WHERE id = ?", (screen_id,)).rowcount
+        conn.commit()
+        return deleted > 0
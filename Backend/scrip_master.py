@@ -1,186 +1,393 @@
 import requests
 import json
 import os
-import pandas as pd
-from datetime import datetime, timedelta
+import tempfile
+import threading
+import time
+import numpy as np
+from datetime import datetime, date
 import logging
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ScripMaster")
 
-SCRIP_MASTER_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
+SCRIP_MASTER_URL = os.getenv("SCRIP_MASTER_URL", "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json")
+REFRESH_INTERVAL_SECONDS = float(os.getenv("SCRIP_MASTER_REFRESH_SECONDS", 6 * 3600))
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SCRIP_FILE_PATH = os.path.join(BASE_DIR, "OpenAPIScripMaster.json")
+SCRIP_CACHE_DIR = os.path.join(BASE_DIR, "scrip_cache")
+RELOAD_CHECK_SECONDS = 60 # how often a load-only instance looks for a newer cache
+
+def parse_expiry(expiry):
+    """Parses Angel expiry strings ("26DEC2024" in the master, "26DEC24" in trading symbols) to a date."""
+    if isinstance(expiry, date):
+        return expiry
+    for fmt in ("%d%b%Y", "%d%b%y"):
+        try:
+            return datetime.strptime(expiry.upper(), fmt).date()
+        except (ValueError, AttributeError):
+            continue
+    return None
+
+
+def atomic_write(path, write, mode='wb'):
+    """
+    Writes `path` through a unique temp file in the same directory plus rename, so concurrent
+    writers (several processes refreshing at once) never share or truncate each other's temp file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def iter_scrip_records(path, chunk_size=1 << 20):
+    """
+    Streams records out of the scrip master JSON array one object at a time,
+    so the whole file never has to be materialised as Python objects.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = f.read(chunk_size)
+        pos = buf.find('[') + 1
+        if pos == 0:
+            raise ValueError("Scrip master is not a JSON array")
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("need more data", buf, pos)
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+
+
+class ScripTable:
+    """
+    Typed columnar copy of the scrip master (only the columns we use).
+    Strings are fixed-width bytes, segment/instrument type are categorical codes,
+    token/lotsize are integers, strike is float and expiry is datetime64[D].
+    Saved as one .npy per column so every process can memory-map the same read-only pages.
+    """
+    STRING_COLUMNS = ('symbol', 'name')
+    CATEGORY_COLUMNS = ('exch_seg', 'instrumenttype')
+    COLUMNS = ('token', 'symbol', 'name', 'expiry', 'strike', 'lotsize', 'exch_seg', 'instrumenttype')
+
+    def __init__(self, columns, categories):
+        self.columns = columns # name -> np.ndarray
+        self.categories = categories # categorical column -> list of labels
+
+    def __len__(self):
+        return len(self.columns['token'])
+
+    @classmethod
+    def from_json(cls, path):
+        raw = {c: [] for c in cls.COLUMNS}
+        categories = {c: {} for c in cls.CATEGORY_COLUMNS}
+        for rec in iter_scrip_records(path):
+            try:
+                token = int(rec.get('token'))
+            except (TypeError, ValueError):
+                continue
+            raw['token'].append(token)
+            for c in cls.STRING_COLUMNS:
+                raw[c].append((rec.get(c) or "").encode('utf-8'))
+            for c in cls.CATEGORY_COLUMNS:
+                labels = categories[c]
+                raw[c].append(labels.setdefault(rec.get(c) or "", len(labels)))
+            exp = parse_expiry(rec.get('expiry') or "")
+            raw['expiry'].append(np.datetime64(exp, 'D') if exp else np.datetime64('NaT', 'D'))
+            try: raw['strike'].append(float(rec.get('strike')))
+            except (TypeError, ValueError): raw['strike'].append(-1.0)
+            try: raw['lotsize'].append(int(float(rec.get('lotsize'))))
+            except (TypeError, ValueError): raw['lotsize'].append(0)
+
+        columns = {
+            'token': np.array(raw['token'], dtype=np.int64),
+            'symbol': np.array(raw['symbol'], dtype=np.bytes_),
+            'name': np.array(raw['name'], dtype=np.bytes_),
+            'expiry': np.array(raw['expiry'], dtype='datetime64[D]'),
+            'strike': np.array(raw['strike'], dtype=np.float64),
+            'lotsize': np.array(raw['lotsize'], dtype=np.int32),
+        }
+        for c in cls.CATEGORY_COLUMNS:
+            columns[c] = np.array(raw[c], dtype=np.int16)
+        labels = {c: sorted(categories[c], key=categories[c].get) for c in cls.CATEGORY_COLUMNS}
+        return cls(columns, labels)
+
+    def save(self, cache_dir, source_mtime):
+        """Writes every column, then the metadata last, each via its own temp file + rename, so readers never see a partial file."""
+        os.makedirs(cache_dir, exist_ok=True)
+        for name, arr in self.columns.items():
+            atomic_write(os.path.join(cache_dir, f"{name}.npy"), lambda f: np.save(f, arr))
+        meta = {"source_mtime": source_mtime, "rows": len(self), "categories": self.categories}
+        atomic_write(os.path.join(cache_dir, "meta.json"), lambda f: json.dump(meta, f), mode='w')
+
+    @classmethod
+    def load(cls, cache_dir, source_mtime):
+        """Memory-maps a cache written for this source file, or returns None if it is missing/stale."""
+        try:
+            with open(os.path.join(cache_dir, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("source_mtime") != source_mtime:
+                return None
+            columns = {c: np.load(os.path.join(cache_dir, f"{c}.npy"), mmap_mode='r') for c in cls.COLUMNS}
+            if any(len(arr) != meta["rows"] for arr in columns.values()):
+                return None
+            return cls(columns, meta["categories"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def strings(self, name):
+        return [x.decode('utf-8') for x in self.columns[name].tolist()]
+
+    def labels(self, name):
+        cats = self.categories[name]
+        return [cats[code] for code in self.columns[name].tolist()]
+
+
+class ScripIndex:
+    """
+    Hash indexes over the scrip master, built once per load so every lookup is a dict hit.
+    """
+    def __init__(self, table):
+        self.tokens_by_symbol = {} # (exch_seg, symbol) -> token
+        self.tokens_by_name = {} # (exch_seg, name) -> first token listed for that name
+        self.option_tokens = {} # (name, instrumenttype, expiry date, strike, "CE"/"PE") -> token
+        self.option_expiries = {} # name -> sorted expiry dates
+        self.option_strikes = {} # (name, expiry date) -> sorted strikes
+        self.fno_equities = [] # [{'symbol': 'RELIANCE', 'token': '2885'}, ...]
+
+        fut_names = set()
+        equities = [] # (name, token) of NSE "-EQ" rows
+        expiries, strikes = {}, {}
+        cols = [
+            table.labels('exch_seg'), table.strings('symbol'), table.strings('name'),
+            [str(t) for t in table.columns['token'].tolist()], table.labels('instrumenttype'),
+            table.columns['expiry'].tolist(), table.columns['strike'].tolist(),
+        ]
+        for exch, sym, name, token, inst, exp, strike in zip(*cols):
+            self.tokens_by_symbol[(exch, sym)] = token
+            self.tokens_by_name.setdefault((exch, name), token)
+
+            if exch == 'NSE' and sym.endswith("-EQ"):
+                equities.append((name, token))
+            if exch != 'NFO':
+                continue
+            if inst == 'FUTSTK':
+                fut_names.add(name)
+            elif inst in ('OPTIDX', 'OPTSTK'):
+                otype = sym[-2:]
+                if otype not in ('CE', 'PE') or exp is None:
+                    continue
+                # Angel 'strike' is scaled, e.g. 2400000 -> 24000.0
+                stk = round(strike / 100.0, 2)
+                self.option_tokens[(name, inst, exp, stk, otype)] = token
+                expiries.setdefault(name, set()).add(exp)
+                strikes.setdefault((name, exp), set()).add(stk)
+
+        self.option_expiries = {k: sorted(v) for k, v in expiries.items()}
+        self.option_strikes = {k: sorted(v) for k, v in strikes.items()}
+
+        # NSE equity tokens of every stock that has futures (F&O stocks)
+        self.fno_equities = [{"symbol": name, "token": token} for name, token in equities if name in fut_names]
+
 
 class ScripMaster:
     _instance = None
-    df = None
+    table = None
+    index = None
+    # False in processes that only read the master (API workers): they never download or
+    # rebuild it, they map the columnar cache the owning process (the scanner) keeps fresh
+    owner = True
 
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = ScripMaster()
+            cls._instance = ScripMaster(owner=cls.owner)
+        elif not cls._instance.owner:
+            cls._instance.poll()
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, url=SCRIP_MASTER_URL, file_path=SCRIP_FILE_PATH, cache_dir=SCRIP_CACHE_DIR,
+                 refresh_interval=REFRESH_INTERVAL_SECONDS, background=True, owner=True):
+        self.url = url
+        self.file_path = file_path
+        self.cache_dir = cache_dir
+        self.refresh_interval = refresh_interval
+        self.meta_path = file_path + ".meta.json" # ETag / Last-Modified of the file on disk
+        self.owner = owner
+        self.ready = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loaded_mtime = None
+        self._checked = time.time()
+
+        # Serve whatever is already on disk right away; the network never blocks startup
         self.load_data()
+        if not owner:
+            return # load-only: no downloads, no refresher thread
+        if background:
+            threading.Thread(target=self._refresh_loop, daemon=True, name="ScripMasterRefresh").start()
+        elif self.index is None:
+            self.refresh()
 
-    def download_scrip_master(self):
-        """Downloads the scrip master JSON if it doesn't exist or is stale (>24h)."""
+    def poll(self):
+        """Load-only instances: picks up a cache the owner rebuilt (checked at most every RELOAD_CHECK_SECONDS)."""
+        now = time.time()
+        if now - self._checked < RELOAD_CHECK_SECONDS:
+            return
+        self._checked = now
         try:
-            should_download = True
-            if os.path.exists(SCRIP_FILE_PATH):
-                file_time = datetime.fromtimestamp(os.path.getmtime(SCRIP_FILE_PATH))
-                if datetime.now() - file_time < timedelta(hours=24):
-                    should_download = False
-                    logger.info("Scrip master is up to date.")
-
-            if should_download:
-                logger.info("Downloading latest Scrip Master...")
-                response = requests.get(SCRIP_MASTER_URL)
-                response.raise_for_status()
-                with open(SCRIP_FILE_PATH, 'wb') as f:
-                    f.write(response.content)
-                logger.info("Download complete.")
-        except Exception as e:
-            logger.error(f"Failed to download Scrip Master: {e}")
+            if os.path.getmtime(self.file_path) != self._loaded_mtime:
+                self.load_data()
+        except OSError:
+            pass
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def download_scrip_master(self):
+        """
+        Conditionally downloads the scrip master (If-None-Match / If-Modified-Since),
+        streaming to a temp file that is renamed into place, so a crash never leaves
+        a truncated file. Returns True if a new file was written.
+        """
+        headers = {}
+        if os.path.exists(self.file_path):
+            meta = self._read_meta()
+            if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+
+        logger.info("Checking for a newer Scrip Master...")
+        with requests.get(self.url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 304:
+                logger.info("Scrip master is up to date.")
+                return False
+            response.raise_for_status()
+
+            def write(f):
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+            atomic_write(self.file_path, write)
+
+            meta = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        atomic_write(self.meta_path, lambda f: json.dump(meta, f), mode='w')
+        logger.info("Download complete.")
+        return True
+
+    def refresh(self):
+        """Downloads a newer master if there is one and swaps the new index in without a restart."""
+        with self._refresh_lock:
+            try:
+                if self.download_scrip_master() or self.index is None:
+                    self.load_data()
+            except Exception as e:
+                logger.error(f"Failed to refresh Scrip Master: {e}")
 
     def load_data(self):
-        """Loads the Scrip Master into a Pandas DataFrame."""
-        self.download_scrip_master()
-        if not os.path.exists(SCRIP_FILE_PATH):
-            logger.error("Scrip file not found!")
+        """Loads the Scrip Master as a typed columnar table and builds the lookup indexes."""
+        if not os.path.exists(self.file_path):
+            logger.info("Scrip file not found yet, waiting for download.")
             return
 
         try:
-            # Check for PICKLE cache (fast load)
-            pkl_path = SCRIP_FILE_PATH.replace(".json", ".pkl")
-            if os.path.exists(pkl_path):
-                 file_time = datetime.fromtimestamp(os.path.getmtime(SCRIP_FILE_PATH))
-                 pkl_time = datetime.fromtimestamp(os.path.getmtime(pkl_path))
-                 if pkl_time >= file_time:
-                      logger.info("Loading from Cached Pickle (Fast!)...")
-                      self.df = pd.read_pickle(pkl_path)
-                      logger.info(f"Loaded {len(self.df)} scrips from cache.")
-                      return
-
-            logger.info("Parsing JSON Scrip Master (Slow)...")
-            # Load with specific types to save memory
-            with open(SCRIP_FILE_PATH, 'r') as f:
-                data = json.load(f)
-                
-            self.df = pd.DataFrame(data)
-            
-            # Save to Pickle for next time
-            logger.info("Saving cache...")
-            self.df.to_pickle(pkl_path)
-            
-            logger.info(f"Loaded {len(self.df)} scrips.")
+            source_mtime = os.path.getmtime(self.file_path)
+            # Memory-mapped columnar cache (fast, shared between processes)
+            table = ScripTable.load(self.cache_dir, source_mtime)
+            if table is not None:
+                logger.info("Loading from columnar cache (Fast!)...")
+            elif not self.owner:
+                logger.info("Columnar cache not built yet; waiting for the scanner process to build it.")
+                return
+            else:
+                logger.info("Parsing JSON Scrip Master (Slow)...")
+                table = ScripTable.from_json(self.file_path)
+                logger.info("Saving cache...")
+                table.save(self.cache_dir, source_mtime)
+
+            index = ScripIndex(table)
+            # Readers grab self.index once per call, so a single assignment swaps atomically
+            self.table, self.index = table, index
+            self._loaded_mtime = source_mtime
+            self.ready.set()
+            logger.info(f"Loaded {len(table)} scrips.")
             
         except Exception as e:
             logger.error(f"Error loading scrip data: {e}")
 
     def get_fno_tokens_for_chain(self, symbol, expiry_str, strikes, is_index=True):
         """
-        Efficiently finds tokens for a list of strikes for a given expiry.
-        expiry_str: e.g. "26DEC24" (Angel format)
+        Finds CE/PE tokens for a list of strikes for a given expiry.
+        expiry_str: e.g. "26DEC24" (trading symbol format) or "26DEC2024" (master format)
         strikes: list of float e.g. [24000.0, 24100.0]
+        Returns: { "24000_CE": "token", "24000_PE": "token" ... }
         """
-        if self.df is None:
+        idx = self.index
+        if idx is None:
             return {}
 
-        found_tokens = {} # { "24000_CE": "token", "24000_PE": "token" ... }
-        
-        # Determine Instrument
+        expiry = parse_expiry(expiry_str)
         inst_type = "OPTIDX" if is_index else "OPTSTK"
-        
-        # Filter DF once for this Symbol, Expiry and Type
-        # Symbol in NFO is typically "NIFTY", "SBIN"
-        mask = (self.df['exch_seg'] == 'NFO') & \
-               (self.df['name'] == symbol) & \
-               (self.df['instrumenttype'] == inst_type)
-               
-        # We can also filter by expiry if the DF has it parsed, specifically matching the symbol suffix is safer
-        # Angel Symbol format: [Name][ExpiryDay][ExpiryMonth][ExpiryYear][Strike][Type]
-        # BUT formatting that exactly is tricky.
-        # Easier Strategy: Filter master for the subset, then iterate.
-        
-        subset = self.df[mask]
-        if subset.empty:
-            return {}
 
-        # Convert to dictionary for O(1) lookup: key=symbol, value=token
-        # Problem: 'symbol' column is like "NIFTY26DEC2424000CE"
-        # We need to fuzzy match or parse.
-        
-        # Let's iterate the subset once creating a map of { strike_price_float : { 'CE': token, 'PE': token } }
-        # Note: 'strike' in JSON is usually string "24000.000000" and divided by 100 or something? 
-        # Actually checking raw JSON is best. usually it's -1 for integers.
-        # Let's trust 'strike' column provided by Angel (usually requires /100 conversion).
-        
-        for _, row in subset.iterrows():
-            try:
-                # Check Expiry Match (simplistic string match in symbol for MVP)
-                if expiry_str not in row['symbol']:
-                     continue
-
-                # Parse Type
-                otype = "CE" if row['symbol'].endswith("CE") else "PE" if row['symbol'].endswith("PE") else None
-                if not otype: continue
-                
-                # Parse Strike (Angel 'strike' is typically scaled, e.g. 2400000 -> 24000.0)
-                # Safe fallback: parse from symbol if column unreliable
-                stk_price = float(row['strike']) / 100.0 
-                
-                if stk_price in strikes:
-                     key = f"{int(stk_price)}_{otype}"
-                     found_tokens[key] = row['token']
-                     
-            except Exception:
-                continue
-                
+        found_tokens = {}
+        for strike in strikes:
+            stk = round(float(strike), 2)
+            for otype in ("CE", "PE"):
+                token = idx.option_tokens.get((symbol, inst_type, expiry, stk, otype))
+                if token:
+                    found_tokens[f"{int(stk)}_{otype}"] = token
         return found_tokens
 
+    def get_expiries(self, symbol):
+        """Sorted option expiry dates listed for an underlying."""
+        if self.index is None: return []
+        return self.index.option_expiries.get(symbol, [])
+
+    def get_strikes(self, symbol, expiry):
+        """Sorted strikes listed for an underlying and expiry."""
+        if self.index is None: return []
+        return self.index.option_strikes.get((symbol, parse_expiry(expiry)), [])
+
     def get_equity_token(self, symbol):
         """Get NSE Equity token"""
-        if self.df is None: return None
-        mask = (self.df['exch_seg'] == 'NSE') & ((self.df['symbol'] == f"{symbol}-EQ") | (self.df['name'] == symbol) )
-        res = self.df[mask]
-        if not res.empty:
-            return res.iloc[0]['token']
-        return None
+        idx = self.index
+        if idx is None: return None
+        return idx.tokens_by_symbol.get(('NSE', f"{symbol}-EQ")) or idx.tokens_by_name.get(('NSE', symbol))
 
     def get_all_fno_tokens(self):
         """
         Returns a list of dictionaries for ALL stocks that have Futures (F&O Stocks).
         Returns: [{'symbol': 'RELIANCE', 'token': '2885'}, ...]
         """
-        if self.df is None: return []
-        
-        # 1. Provide unique names from NFO Futures (FUTSTK)
-        # This confirms the stock is in F&O segment
-        fno_names = self.df[
-            (self.df['exch_seg'] == 'NFO') & 
-            (self.df['instrumenttype'] == 'FUTSTK')
-        ]['name'].unique()
-        
-        # 2. Get their NSE Equity tokens
-        # It's faster to filter the DF once for all NSE Equities matching these names
-        mask = (self.df['exch_seg'] == 'NSE') & \
-               (self.df['name'].isin(fno_names)) & \
-               (self.df['symbol'].str.endswith("-EQ"))
-               
-        equity_subset = self.df[mask]
-        
-        results = []
-        for _, row in equity_subset.iterrows():
-            results.append({
-                "symbol": row['name'],
-                "token": row['token']
-            })
-            
-        return results
+        if self.index is None: return []
+        return list(self.index.fno_equities)
 
 # Singleton usage
 # scrip_master = ScripMaster.get_instance()
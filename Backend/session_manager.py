@@ -0,0 +1,195 @@
+import os
+import time
+import json
+import base64
+import asyncio
+import threading
+import logging
+
+import pyotp
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("SessionManager")
+
+REFRESH_AHEAD = 15 * 60 # renew this long before the JWT expires
+DEFAULT_TTL = 8 * 3600 # assumed lifetime when the JWT carries no readable exp
+LOGIN_BACKOFF = (5, 15, 30, 60, 120) # seconds between failed login attempts
+AUTH_ERROR_CODES = {"AG8001", "AG8002", "AG8003"} # invalid / expired / missing token
+
+
+class SessionError(Exception):
+    """No usable Angel One session (login failed or is backing off)."""
+
+
+def jwt_expiry(token):
+    """`exp` claim of a JWT (with or without the 'Bearer ' prefix), or None."""
+    try:
+        token = token[7:] if token.startswith("Bearer ") else token
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except Exception:
+        return None
+
+
+def is_auth_error(res):
+    """True for a SmartAPI payload rejected because the session token is invalid or expired."""
+    if not isinstance(res, dict) or res.get("status") is not False:
+        return False
+    return res.get("errorcode") in AUTH_ERROR_CODES or "invalid token" in str(res.get("message", "")).lower()
+
+
+class SessionManager:
+    """
+    Owns the Angel One session for the whole process.
+    - ensure() returns the current session; only when there is none does it log in, and
+      concurrent callers share that one login (single flight) instead of each running TOTP + generateSession
+    - a background thread renews the JWT REFRESH_AHEAD seconds before it expires through the
+      refresh-token flow (generateToken), falling back to a full login if that fails
+    - failed logins back off, so an outage does not turn into a login storm
+    - listeners are called with (session_data, feed_token_changed) after every login/refresh
+    """
+    def __init__(self, api, client_code=None, password=None, totp_secret=None, refresh_ahead=REFRESH_AHEAD):
+        self.api = api
+        self.client_code = client_code or os.getenv("ANGEL_CLIENT_CODE")
+        self.password = password or os.getenv("ANGEL_PASSWORD")
+        self.totp_secret = totp_secret or os.getenv("ANGEL_TOTP_SECRET")
+        self.refresh_ahead = refresh_ahead
+        self.session = None
+        self.expires_at = 0.0
+        self.last_error = None
+        self._lock = threading.Lock() # held for the duration of a login/refresh
+        self._failures = 0
+        self._retry_at = 0.0
+        self._listeners = []
+        self._wake = threading.Event()
+        self._thread = None
+        self.counters = {"logins": 0, "refreshes": 0, "failures": 0, "shared": 0}
+
+    def on_session(self, fn):
+        self._listeners.append(fn)
+        return fn
+
+    @property
+    def valid(self):
+        return self.session is not None and time.time() < self.expires_at
+
+    def ensure(self):
+        """The current session, logging in first if there is none. Raises SessionError."""
+        if self.valid:
+            return self.session
+        with self._lock:
+            if self.valid: # someone else logged in while we waited
+                self.counters["shared"] += 1
+                return self.session
+            self._login_locked()
+            return self.session
+
+    async def ensure_async(self):
+        if self.valid:
+            return self.session
+        return await asyncio.to_thread(self.ensure)
+
+    def invalidate(self, token=None):
+        """Drops the session after an auth error; `token` guards against dropping a newer one."""
+        if token is None or (self.session and self.session.get("jwtToken") == token):
+            self.expires_at = 0.0
+
+    def login(self):
+        """Forces a full TOTP login (the /login endpoint)."""
+        with self._lock:
+            self._retry_at = 0.0
+            self._login_locked()
+            return self.session
+
+    def _login_locked(self):
+        now = time.time()
+        if now < self._retry_at:
+            raise SessionError(f"Login backing off for {self._retry_at - now:.0f}s: {self.last_error}")
+        if not all([self.client_code, self.password, self.totp_secret]):
+            raise SessionError("Missing credentials in .env")
+        try:
+            totp = pyotp.TOTP(self.totp_secret).now()
+        except Exception:
+            raise SessionError("Invalid TOTP Secret")
+        try:
+            data = self.api.generateSession(self.client_code, self.password, totp)
+        except Exception as e:
+            data = {"status": False, "message": str(e)}
+        if not data or data.get('status') is False or not data.get('data'):
+            self._failed((data or {}).get('message') or "Login failed")
+        self.counters["logins"] += 1
+        self._adopt(dict(data['data']))
+
+    def refresh(self):
+        """Renews the JWT/feed token with the refresh token; falls back to a full login."""
+        with self._lock:
+            if self.session and self.session.get('refreshToken'):
+                try:
+                    res = self.api.generateToken(self.session['refreshToken'])
+                    if res and res.get('status') and res.get('data'):
+                        data = res['data']
+                        jwt = data.get('jwtToken') or ""
+                        self.counters["refreshes"] += 1
+                        self._adopt({**self.session, **data,
+                                     'jwtToken': jwt if jwt.startswith("Bearer ") else f"Bearer {jwt}"})
+                        return self.session
+                    logger.warning(f"Token refresh rejected: {(res or {}).get('message')}")
+                except Exception as e:
+                    logger.warning(f"Token refresh failed: {e}")
+            self._login_locked()
+            return self.session
+
+    def _failed(self, message):
+        self.counters["failures"] += 1
+        self.last_error = message
+        self._retry_at = time.time() + LOGIN_BACKOFF[min(self._failures, len(LOGIN_BACKOFF) - 1)]
+        self._failures += 1
+        logger.error(f"Login failed: {message}")
+        raise SessionError(message)
+
+    def _adopt(self, data):
+        old_feed = self.session.get('feedToken') if self.session else None
+        self.session = data
+        self.expires_at = jwt_expiry(data.get('jwtToken') or "") or time.time() + DEFAULT_TTL
+        self._failures = 0
+        self._retry_at = 0.0
+        self.last_error = None
+        self._wake.set() # reschedule the refresher
+        changed = data.get('feedToken') != old_feed
+        for fn in self._listeners:
+            try:
+                fn(data, changed)
+            except Exception as e:
+                logger.error(f"Session listener failed: {e}")
+
+    def start(self):
+        """Starts the background refresher (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name="SessionRefresh")
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            if self.session is None:
+                self._wake.wait()
+            else:
+                wait = self.expires_at - self.refresh_ahead - time.time()
+                if wait > 0:
+                    self._wake.wait(wait)
+                else:
+                    try:
+                        self.refresh()
+                    except SessionError:
+                        time.sleep(max(1.0, self._retry_at - time.time()))
+                    continue
+            self._wake.clear()
+
+    def stats(self):
+        return {
+            "logged_in": self.session is not None,
+            "expires_in": round(self.expires_at - time.time()) if self.session else None,
+            "last_error": self.last_error,
+            **self.counters,
+        }
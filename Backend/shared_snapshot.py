@@ -0,0 +1,290 @@
+import os
+import mmap
+import struct
+import time
+import json
+import logging
+
+try:
+    from .market_store import Snapshot, encode_json
+except ImportError:
+    from market_store import Snapshot, encode_json
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError: # optional fast decoder
+    _loads = json.loads
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("SharedSnapshot")
+
+SNAPSHOT_PATH = os.getenv("NGTA_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_snapshot.bin"))
+WATCH_PATH = os.getenv("NGTA_WATCH_PATH", SNAPSHOT_PATH + ".watch")
+
+
+def timeframe_path(timeframe, path=SNAPSHOT_PATH):
+    """Snapshot file of one intraday timeframe's table (one file per timeframe, next to the daily one)."""
+    return f"{path}.{timeframe}"
+
+# Header: magic, layout version, seq, payload length, snapshot version, heartbeat (unix time)
+MAGIC = b"NGTA"
+LAYOUT = 1
+HEADER = struct.Struct("<4sIQQQd")
+HEADER_SIZE = 64
+SEQ_OFFSET = 8 # seq is written on its own to open/close a write
+BODY_OFFSET = 16 # length, version, heartbeat: only rewritten while seq is odd
+BODY = struct.Struct("<QQd")
+
+
+class SharedSnapshotWriter:
+    """
+    Publishes MarketStore snapshots into an mmap'd file for reader processes.
+    Sequence lock: seq is odd while the payload is being written and even once it is
+    complete, so a reader that sees the same even seq before and after its copy has a
+    consistent snapshot. Payload: one JSON meta line, then one pre-encoded row per line.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, initial_size=1 << 20):
+        self.path = path
+        self.seq = 0
+        self.version = None
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.truncate(HEADER_SIZE + initial_size)
+        os.replace(tmp, path) # readers of a previous scanner run reopen on the new inode
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        HEADER.pack_into(self._map, 0, MAGIC, LAYOUT, 0, 0, 0, time.time())
+
+    def write(self, snap, status=None):
+        """
+        Writes `snap` (a market_store.Snapshot) unless that version is already published.
+        `status` may be a callable, so costly status is only built when a write happens.
+        """
+        if snap.version == self.version:
+            return self.heartbeat()
+        if callable(status):
+            status = status()
+        meta = encode_json({
+            "version": snap.version,
+            "origin": snap.origin,
+            "row_versions": [snap.row_versions[row['symbol']] for row in snap.rows],
+            "status": status or {},
+        })
+        payload = b"\n".join((meta,) + snap.encoded)
+
+        needed = HEADER_SIZE + len(payload)
+        if needed > len(self._map):
+            self._grow(needed)
+
+        self.seq += 1 # odd: write in progress
+        struct.pack_into("<Q", self._map, SEQ_OFFSET, self.seq)
+        self._map[HEADER_SIZE:needed] = payload
+        BODY.pack_into(self._map, BODY_OFFSET, len(payload), snap.version, time.time())
+        self.seq += 1 # even: consistent, published last so it never vouches for an old length
+        struct.pack_into("<Q", self._map, SEQ_OFFSET, self.seq)
+        self.version = snap.version
+
+    def heartbeat(self):
+        """Refreshes the heartbeat so readers can tell a quiet market from a dead scanner."""
+        struct.pack_into("<d", self._map, HEADER.size - 8, time.time())
+
+    def _grow(self, needed):
+        size = max(needed, len(self._map) * 2)
+        self.seq += 1
+        struct.pack_into("<Q", self._map, SEQ_OFFSET, self.seq)
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self.seq += 1
+        struct.pack_into("<Q", self._map, SEQ_OFFSET, self.seq)
+        logger.info(f"Snapshot file grown to {size} bytes")
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class SharedSnapshotReader:
+    """
+    Read-only view of the scanner's published snapshot, with the parts of the
+    MarketStore interface the API uses (publish, snapshot, changed_since, version, rows).
+    The payload is copied and decoded only when the published version changes.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, stale_after=60):
+        self.path = path
+        self.stale_after = stale_after
+        self._file = None
+        self._map = None
+        self._inode = None
+        self._replaced = False # a new file (restarted scanner) may reuse version numbers
+        self._snapshot = Snapshot(0, (), (), {})
+        self.rows = {}
+        self.status = {}
+        self.heartbeat = 0.0
+        self.retries = 0
+
+    def _open(self):
+        """(Re)maps the file when it first appears, is replaced by a new scanner, or grows."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if self._map is not None and st.st_ino == self._inode and st.st_size == len(self._map):
+            return True
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._replaced = self._replaced or st.st_ino != self._inode
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._inode = st.st_ino
+        return True
+
+    def _read_header(self):
+        magic, layout, seq, length, version, heartbeat = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or layout != LAYOUT:
+            return None
+        return seq, length, version, heartbeat
+
+    @property
+    def version(self):
+        if not self._open():
+            return self._snapshot.version
+        head = self._read_header()
+        return head[2] if head else self._snapshot.version
+
+    @property
+    def alive(self):
+        """True while the scanner process keeps its heartbeat fresh."""
+        self.publish()
+        return time.time() - self.heartbeat < self.stale_after
+
+    def publish(self):
+        """Current Snapshot; re-read from the file only when its version moved."""
+        if not self._open():
+            return self._snapshot
+        for _ in range(100):
+            head = self._read_header()
+            if head is None:
+                return self._snapshot
+            seq, length, version, heartbeat = head
+            if seq % 2 == 0:
+                if version == self._snapshot.version and not self._replaced:
+                    self.heartbeat = heartbeat
+                    return self._snapshot
+                if HEADER_SIZE + length <= len(self._map):
+                    payload = self._map[HEADER_SIZE:HEADER_SIZE + length]
+                    if self._read_header()[0] == seq:
+                        try:
+                            snap = self._load(payload)
+                        except (ValueError, KeyError, TypeError, IndexError) as e:
+                            logger.debug(f"Snapshot copy at seq {seq} did not decode, retrying: {e}")
+                        else:
+                            self.heartbeat = heartbeat
+                            return snap
+            # Writer busy (or the file grew, or the copy was bad): retry
+            self.retries += 1
+            time.sleep(0.001)
+            self._open()
+        return self._snapshot
+
+    def _load(self, payload):
+        lines = payload.split(b"\n")
+        meta = _loads(lines[0])
+        encoded = tuple(lines[1:])
+        rows = tuple(_loads(line) for line in encoded)
+        row_versions = {row['symbol']: v for row, v in zip(rows, meta['row_versions'])}
+        self._snapshot = Snapshot(meta['version'], rows, encoded, row_versions, meta.get('origin'))
+        self._replaced = False
+        self.rows = {row['symbol']: row for row in rows}
+        self.status = meta.get('status') or {}
+        return self._snapshot
+
+    def snapshot(self):
+        snap = self.publish()
+        return snap.version, list(snap.rows)
+
+    def changed_since(self, version):
+        snap = self.publish()
+        return snap.version, [row for row in snap.rows if snap.row_versions[row['symbol']] > version]
+
+
+class WatchRequests:
+    """
+    Watchlist requests from API workers to the scanner, through an append-only file.
+    send() appends lines of comma separated tokens (O_APPEND writes smaller than PIPE_BUF do
+    not interleave between processes) and skips tokens it sent less than `resend_after` seconds ago.
+    receive() (scanner) returns the tokens appended since its last call and rotates the
+    file once it grows past `max_size`.
+    """
+    LINE_LIMIT = 4000 # bytes, below PIPE_BUF
+
+    def __init__(self, path=WATCH_PATH, resend_after=60, max_size=1 << 20):
+        self.path = path
+        self.resend_after = resend_after
+        self.max_size = max_size
+        self._sent = {} # token -> last send time (API side)
+        self._offset = None # read position (scanner side)
+        self._inode = None
+
+    def send(self, tokens):
+        now = time.time()
+        fresh = [str(t) for t in tokens if now - self._sent.get(str(t), 0) >= self.resend_after]
+        if not fresh:
+            return
+        lines, line = [], ""
+        for token in fresh:
+            if len(line) + len(token) + 2 > self.LINE_LIMIT:
+                lines.append(line + "\n")
+                line = ""
+            line = f"{line},{token}" if line else token
+        lines.append(line + "\n")
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                for line in lines:
+                    os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.warning(f"Watch request not forwarded: {e}")
+            return
+        for token in fresh:
+            self._sent[token] = now
+
+    def receive(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._offset = 0
+            return []
+        if self._offset is None: # first call: requests from before this scanner started are stale
+            self._offset, self._inode = st.st_size, st.st_ino
+            return []
+        if st.st_ino != self._inode:
+            self._offset, self._inode = 0, st.st_ino
+        if st.st_size <= self._offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        complete = data.rfind(b"\n") + 1 # leave a partially written line for the next call
+        self._offset += complete
+        tokens = [t for line in data[:complete].decode(errors="ignore").splitlines() for t in line.split(",") if t]
+        if self._offset > self.max_size:
+            self._rotate()
+        return tokens
+
+    def _rotate(self):
+        """Moves the file aside; writers recreate it on their next send."""
+        old = f"{self.path}.{os.getpid()}.old"
+        try:
+            os.replace(self.path, old)
+            os.remove(old)
+        except OSError:
+            pass
+        self._offset, self._inode = 0, None
@@ -0,0 +1,119 @@
+import os
+import socket
+import uuid
+import logging
+import httpx
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("SmartApiAsync")
+
+ROOT_URL = "https://apiconnect.angelone.in"
+ROUTES = {
+    "login": "/rest/auth/angelbroking/user/v1/loginByPassword",
+    "token": "/rest/auth/angelbroking/jwt/v1/generateTokens",
+    "candle": "/rest/secure/angelbroking/historical/v1/getCandleData",
+    "ltp": "/rest/secure/angelbroking/order/v1/getLtpData",
+    "quote": "/rest/secure/angelbroking/market/v1/quote",
+}
+
+
+class SmartApiError(Exception):
+    """Non-JSON or transport-level failure from the SmartAPI REST endpoints."""
+
+
+def _local_ip():
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return "127.0.0.1"
+
+
+class AsyncSmartApi:
+    """
+    Asyncio SmartAPI client over one pooled httpx.AsyncClient (HTTP keep-alive).
+    Covers the calls the app makes: login, token refresh, candles, LTP and batch quotes.
+    Responses are the same JSON payloads SmartConnect returns, so callers (and the
+    scheduler's rate-limit detection) treat both clients alike.
+    Every in-flight request is a coroutine, not a thread; `max_connections` bounds the sockets.
+    Pass `transport` (e.g. httpx.ASGITransport(app=fake)) to talk to a local fake server.
+    """
+
+    def __init__(self, api_key=None, root_url=ROOT_URL, max_connections=50, max_keepalive=20,
+                 timeout=10.0, transport=None):
+        self.api_key = api_key or os.getenv("ANGEL_API_KEY")
+        self.root_url = root_url
+        self.jwt_token = None
+        self.refresh_token = None
+        self.feed_token = None
+        self.client_code = None
+        self._client = httpx.AsyncClient(
+            base_url=root_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=timeout,
+            transport=transport,
+        )
+        self._headers = {
+            "Content-type": "application/json",
+            "Accept": "application/json",
+            "X-ClientLocalIP": _local_ip(),
+            "X-ClientPublicIP": os.getenv("ANGEL_PUBLIC_IP", "106.193.147.98"),
+            "X-MACAddress": ":".join(f"{(uuid.getnode() >> i) & 0xff:02x}" for i in range(40, -1, -8)),
+            "X-PrivateKey": self.api_key or "",
+            "X-UserType": "USER",
+            "X-SourceID": "WEB",
+        }
+
+    def use_session(self, session_data):
+        """Adopts tokens from a SmartConnect generateSession() payload."""
+        jwt = session_data.get('jwtToken') or ""
+        self.jwt_token = jwt[7:] if jwt.startswith("Bearer ") else jwt
+        self.refresh_token = session_data.get('refreshToken')
+        self.feed_token = session_data.get('feedToken')
+        self.client_code = session_data.get('clientcode', self.client_code)
+
+    async def _post(self, route, payload, auth=True):
+        headers = self._headers
+        if auth and self.jwt_token:
+            headers = {**headers, "Authorization": f"Bearer {self.jwt_token}"}
+        try:
+            r = await self._client.post(ROUTES[route], json=payload, headers=headers)
+        except httpx.HTTPError as e:
+            raise SmartApiError(f"{route}: {e}") from e
+        try:
+            return r.json()
+        except ValueError:
+            # Throttling comes back as plain text, keep the wording for is_rate_limit_error
+            raise SmartApiError(f"{route}: HTTP {r.status_code} {r.text[:200]}")
+
+    async def login(self, client_code, password, totp):
+        """Password + TOTP login. Returns the payload with data.jwtToken as 'Bearer ...', like generateSession."""
+        res = await self._post("login", {"clientcode": client_code, "password": password, "totp": totp}, auth=False)
+        if res.get('status') and res.get('data'):
+            data = res['data']
+            self.client_code = client_code
+            self.use_session({**data, "clientcode": client_code})
+            data['jwtToken'] = f"Bearer {self.jwt_token}"
+            data['clientcode'] = client_code
+        return res
+
+    async def generate_token(self, refresh_token=None):
+        """New jwt/feed token from the refresh token."""
+        res = await self._post("token", {"refreshToken": refresh_token or self.refresh_token})
+        if res.get('status') and res.get('data'):
+            self.jwt_token = res['data'].get('jwtToken', self.jwt_token)
+            self.feed_token = res['data'].get('feedToken', self.feed_token)
+            self.refresh_token = res['data'].get('refreshToken', self.refresh_token)
+        return res
+
+    async def get_candle_data(self, params):
+        return await self._post("candle", {k: v for k, v in params.items() if v is not None})
+
+    async def ltp_data(self, exchange, tradingsymbol, symboltoken):
+        return await self._post("ltp", {"exchange": exchange, "tradingsymbol": tradingsymbol, "symboltoken": symboltoken})
+
+    async def get_market_data(self, mode, exchange_tokens):
+        return await self._post("quote", {"mode": mode, "exchangeTokens": exchange_tokens})
+
+    async def aclose(self):
+        await self._client.aclose()
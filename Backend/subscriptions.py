@@ -0,0 +1,119 @@
+import threading
+import logging
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Subscriptions")
+
+# SmartWebSocketV2 feed modes
+LTP = 1
+QUOTE = 2 # + open/high/low/prev close/volume
+SNAP_QUOTE = 3 # + open interest, circuit limits, 52w high/low, depth
+
+# SmartWebSocketV2 exchange types
+NSE_CM = 1
+NSE_FO = 2
+
+
+class SubscriptionManager:
+    """
+    Keeps the websocket subscriptions in line with what the app wants, sending only deltas.
+    Callers declare named groups (e.g. "scanner", "options:NIFTY") of tokens with a mode;
+    a token wanted by several groups is subscribed once, in the richest mode asked for.
+    After a (re)connect everything is subscribed again from this bookkeeping.
+    """
+
+    def __init__(self, batch_size=500):
+        self._lock = threading.RLock()
+        self.batch_size = batch_size
+        self.ws = None
+        self.connected = False
+        self._groups = {} # group -> {(exchange_type, token): mode}
+        self._active = {} # (exchange_type, token) -> mode subscribed on the live socket
+        self.sent = {"subscribe": 0, "unsubscribe": 0}
+
+    def set_group(self, group, tokens, exchange_type=NSE_CM, mode=LTP):
+        """Declares the full token set for `group` (replacing the previous one) and syncs."""
+        with self._lock:
+            self._groups[group] = {(exchange_type, str(t)): mode for t in tokens}
+            self.sync()
+
+    def drop_group(self, group):
+        with self._lock:
+            if self._groups.pop(group, None) is not None:
+                self.sync()
+
+    def _target(self):
+        target = {}
+        for wanted in self._groups.values():
+            for key, mode in wanted.items():
+                if mode > target.get(key, 0):
+                    target[key] = mode
+        return target
+
+    def _send(self, action, changes):
+        # Group by (mode, exchange type) -> one request per mode with a tokenList per exchange
+        by_mode = {}
+        for (exchange_type, token), mode in changes.items():
+            by_mode.setdefault(mode, {}).setdefault(exchange_type, []).append(token)
+        fn = self.ws.subscribe if action == "subscribe" else self.ws.unsubscribe
+        for mode, by_exchange in by_mode.items():
+            for exchange_type, tokens in by_exchange.items():
+                for i in range(0, len(tokens), self.batch_size):
+                    chunk = tokens[i:i + self.batch_size]
+                    fn(f"{action[:5]}{mode}", mode, [{"exchangeType": exchange_type, "tokens": chunk}])
+                    self.sent[action] += len(chunk)
+
+    def sync(self):
+        """Sends the subscribe/unsubscribe deltas between what is wanted and what is active."""
+        with self._lock:
+            if self.ws is None or not self.connected:
+                return
+            target = self._target()
+            to_unsub = {k: m for k, m in self._active.items() if target.get(k) != m}
+            to_sub = {k: m for k, m in target.items() if self._active.get(k) != m}
+            try:
+                if to_unsub:
+                    self._send("unsubscribe", to_unsub)
+                    for k in to_unsub: self._active.pop(k, None)
+                if to_sub:
+                    self._send("subscribe", to_sub)
+                    self._active.update(to_sub)
+            except Exception as e:
+                logger.error(f"Subscription sync failed: {e}")
+                return
+            if to_sub or to_unsub:
+                logger.info(f"WebSocket: +{len(to_sub)} / -{len(to_unsub)} subscriptions ({len(self._active)} active)")
+
+    def attach(self, ws):
+        """Binds a new websocket instance (nothing is subscribed on it yet)."""
+        with self._lock:
+            self.ws = ws
+            self.connected = False
+            self._active = {}
+
+    def on_connected(self):
+        with self._lock:
+            self.connected = True
+            self._active = {} # a fresh connection starts with no subscriptions
+            self.sync()
+
+    def on_disconnected(self):
+        with self._lock:
+            self.connected = False
+            self._active = {}
+
+    def stats(self):
+        with self._lock:
+            by_mode = {}
+            for (exchange_type, _), mode in self._active.items():
+                key = f"exchange_{exchange_type}_mode_{mode}"
+                by_mode[key] = by_mode.get(key, 0) + 1
+            return {
+                "connected": self.connected,
+                "active": len(self._active),
+                "wanted": len(self._target()),
+                "groups": {g: len(t) for g, t in self._groups.items()},
+                "by_mode": by_mode,
+                "sent": dict(self.sent),
+            }
@@ -0,0 +1,64 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+
+# With several API workers (uvicorn --workers N) point PROMETHEUS_MULTIPROC_DIR at an empty
+# directory before start-up so /metrics aggregates every process instead of whichever answered.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+FAST = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+UPSTREAM = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CYCLE = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# --- SmartAPI (recorded by api_scheduler for every REST call) ---
+UPSTREAM_SECONDS = Histogram("ngta_smartapi_call_seconds", "SmartAPI call latency per attempt",
+                             ["endpoint"], buckets=UPSTREAM)
+UPSTREAM_WAIT_SECONDS = Histogram("ngta_smartapi_wait_seconds", "Time queued in the scheduler before a call is admitted",
+                                  ["endpoint"], buckets=UPSTREAM)
+UPSTREAM_ATTEMPTS = Histogram("ngta_smartapi_attempts", "Attempts needed per logical call (1 = no retry)",
+                              ["endpoint"], buckets=(1, 2, 3, 5))
+UPSTREAM_CALLS = Counter("ngta_smartapi_calls", "SmartAPI calls by outcome (ok, rate_limited, error)",
+                         ["endpoint", "outcome"])
+UPSTREAM_RETRIES = Counter("ngta_smartapi_retries", "SmartAPI retries after a rate-limit response", ["endpoint"])
+
+# --- Scanner ---
+SCAN_CYCLE_SECONDS = Histogram("ngta_scan_cycle_seconds", "One scanner pass over the due symbols: fetch, store, metrics, publish",
+                               ["mode"], buckets=CYCLE)
+METRICS_SECONDS = Histogram("ngta_calculate_metrics_seconds", "One vectorized calculate_metrics_batch pass",
+                            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+SCAN_UNIVERSE = Gauge("ngta_scan_universe_symbols", "Symbols the scanner tried to fetch last cycle")
+SCAN_DROPPED = Gauge("ngta_scan_dropped_symbols", "Symbols whose last candle refresh returned nothing")
+SCAN_STALENESS = Gauge("ngta_scan_staleness_seconds", "Oldest candle refresh per scan tier", ["tier"])
+CACHE_ROWS = Gauge("ngta_market_cache_rows", "Rows in the market table")
+
+# --- Ticks ---
+TICK_LAG_SECONDS = Histogram("ngta_tick_lag_seconds", "Exchange timestamp to market-table update",
+                             buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+SUBSCRIBED_TOKENS = Gauge("ngta_ws_subscribed_tokens", "Tokens subscribed on the market-data websocket")
+TICK_QUEUE_DEPTH = Gauge("ngta_tick_queue_depth", "Ticks waiting in the ingest buffer")
+TICKS_DROPPED = Gauge("ngta_ticks_dropped", "Ticks dropped by the full ingest buffer since start")
+
+# --- API ---
+HANDLER_SECONDS = Histogram("ngta_handler_seconds", "Handler time (excluding network)", ["handler"], buckets=FAST)
+
+
+def observe_tick_lag(batch, now=None):
+    """Lag of each applied tick from its exchange timestamp (ms since epoch)."""
+    now = now or time.time()
+    for tick in batch.values():
+        ts = tick.get('exchange_timestamp')
+        if ts:
+            TICK_LAG_SECONDS.observe(max(0.0, now - ts / 1000.0))
+
+
+def render():
+    """(body, content type) in the Prometheus text format."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
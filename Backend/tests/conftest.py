@@ -0,0 +1,38 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+
+from replay import FakeSmartConnect, FakeWebSocket # noqa: E402
+
+TOKENS = [str(t) for t in range(2000, 2030)]
+
+
+@pytest.fixture(scope="session")
+def api():
+    """The offline SmartConnect stand-in (synthetic, deterministic candles per token)."""
+    return FakeSmartConnect()
+
+
+@pytest.fixture(scope="session")
+def history(api):
+    """{token: ~285 daily candles} fetched through the fake SmartConnect."""
+    to_date = datetime.now()
+    from_date = to_date - timedelta(days=400)
+    out = {}
+    for token in TOKENS:
+        res = api.getCandleData({"exchange": "NSE", "symboltoken": token, "interval": "ONE_DAY",
+                                 "fromdate": from_date.strftime("%Y-%m-%d %H:%M"),
+                                 "todate": to_date.strftime("%Y-%m-%d %H:%M")})
+        out[token] = res['data']
+    return out
+
+
+@pytest.fixture
+def ws():
+    """A fake SmartWebSocketV2; tests call synthetic_tick on it directly."""
+    return FakeWebSocket()
@@ -0,0 +1,103 @@
+import time
+import asyncio
+import threading
+
+from api_scheduler import TokenBucket, SmartApiScheduler, HIGH, LOW
+
+RATE_LIMITED = {"status": False, "message": "Access denied because of exceeding access rate", "errorcode": "AB1019", "data": None}
+OK = {"status": True, "message": "SUCCESS", "data": {}}
+
+
+def test_token_bucket_bursts_then_refills_at_the_rate():
+    bucket = TokenBucket(rate=4, capacity=2)
+    now = bucket.stamp
+    assert bucket.try_take(now) == 0 and bucket.try_take(now) == 0
+    assert bucket.try_take(now) == 0.25 # one token every 1/rate seconds
+    assert bucket.try_take(now + 0.25) == 0
+    assert bucket.try_take(now + 10) == 0 and bucket.try_take(now + 10) == 0 # refill stops at capacity
+    assert bucket.try_take(now + 10) > 0
+    bucket.drain()
+    assert bucket.try_take(now + 10) == 0.25
+
+
+def test_calls_are_held_to_the_endpoint_rate():
+    scheduler = SmartApiScheduler(limits={"quote": 20}, max_concurrency=8, initial_concurrency=8)
+    start = time.monotonic()
+    for _ in range(30):
+        scheduler.call("quote", lambda: OK)
+    assert time.monotonic() - start >= 0.45 # 20 from the burst, 10 more at 20/s
+    assert scheduler.stats()["endpoints"]["quote"]["calls"] == 30
+    assert scheduler.stats()["endpoints"]["quote"]["throttled"] > 0
+
+
+def test_aimd_window_halves_on_rate_limit_and_grows_back():
+    scheduler = SmartApiScheduler(limits={}, max_concurrency=8, min_concurrency=1, initial_concurrency=8)
+    responses = iter([RATE_LIMITED, OK])
+    assert scheduler.call("quote", lambda: next(responses), retries=2) == OK
+    counters = scheduler.stats()["endpoints"]["quote"]
+    assert counters["rate_limited"] == 1 and counters["retries"] == 1 and counters["failures"] == 0
+    window = scheduler.stats()["concurrency_limit"]
+    assert 4 < window < 5 # 8 / 2, then one additive step
+
+    for _ in range(3):
+        scheduler.call("quote", lambda: RATE_LIMITED, retries=1)
+    assert scheduler.stats()["concurrency_limit"] == 1 # floored at min_concurrency
+    assert scheduler.stats()["endpoints"]["quote"]["failures"] == 3
+
+    for _ in range(200):
+        scheduler.call("quote", lambda: OK)
+    assert scheduler.stats()["concurrency_limit"] == 8 # capped at max_concurrency
+
+
+def test_rate_limit_exceptions_are_retried_then_raised():
+    scheduler = SmartApiScheduler(limits={}, initial_concurrency=4)
+
+    def fail():
+        raise Exception("Too many requests")
+
+    try:
+        scheduler.call("historical", fail, retries=2)
+    except Exception as e:
+        assert "Too many" in str(e)
+    else:
+        raise AssertionError("expected the last error to be raised")
+    counters = scheduler.stats()["endpoints"]["historical"]
+    assert counters == {"calls": 2, "throttled": 0, "rate_limited": 2, "retries": 1, "failures": 1}
+
+
+def test_high_priority_is_admitted_before_waiting_low():
+    scheduler = SmartApiScheduler(limits={}, max_concurrency=1, initial_concurrency=1)
+    hold, order = threading.Event(), []
+    first = threading.Thread(target=scheduler.call, args=("quote", hold.wait))
+    first.start()
+    while scheduler.stats()["in_flight"] == 0: time.sleep(0.001)
+
+    low = threading.Thread(target=scheduler.call, args=("quote", lambda: order.append("low")), kwargs={"priority": LOW})
+    low.start()
+    while scheduler.stats()["waiting_low"] == 0: time.sleep(0.001)
+    high = threading.Thread(target=scheduler.call, args=("quote", lambda: order.append("high")), kwargs={"priority": HIGH})
+    high.start()
+    while scheduler.stats()["waiting_high"] == 0: time.sleep(0.001)
+
+    hold.set()
+    for t in (first, low, high): t.join(5)
+    assert order == ["high", "low"]
+
+
+def test_async_calls_share_the_window():
+    scheduler = SmartApiScheduler(limits={}, max_concurrency=3, initial_concurrency=3)
+    peak, running = [0], [0]
+
+    async def fetch():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return OK
+
+    async def run():
+        return await asyncio.gather(*(scheduler.acall("quote", fetch) for _ in range(12)))
+
+    assert asyncio.run(run()) == [OK] * 12
+    assert peak[0] == 3
+    assert scheduler.stats()["in_flight"] == 0
@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from bar_builder import BarBuilder, TIMEFRAMES, IST, bar_start
+from subscriptions import NSE_CM
+
+TOKENS = ["2885", "1594", "11536"]
+OPEN = int(datetime(2026, 10, 16, 9, 15, tzinfo=IST).timestamp())
+
+
+def tick_stream(ws, mode=2, seconds=3 * 3600 - 1, seed=5):
+    """Batches of fake websocket ticks ({(exchange_type, token): tick}) spread over `seconds` after the open."""
+    rng = np.random.default_rng(seed)
+    ts = OPEN
+    batches = []
+    while True:
+        ts += int(rng.integers(1, 40))
+        if ts > OPEN + seconds: break
+        batch = {}
+        for token in TOKENS:
+            if rng.random() < 0.8:
+                tick = ws.synthetic_tick(NSE_CM, token, mode, rng)
+                tick['exchange_timestamp'] = ts * 1000
+                batch[(NSE_CM, token)] = tick
+        batches.append(batch)
+    return batches
+
+
+def brute_force(batches, token, seconds):
+    """[start, o, h, l, c, v] per bar from every tick of one token."""
+    bars = {}
+    last_volume = None
+    for batch in batches:
+        tick = batch.get((NSE_CM, token))
+        if tick is None: continue
+        start = bar_start(tick['exchange_timestamp'] / 1000.0, seconds)
+        price = tick['last_traded_price'] / 100.0
+        day_volume = tick.get('volume_trade_for_the_day')
+        traded = 0 if day_volume is None or last_volume is None else day_volume - last_volume
+        if day_volume is not None: last_volume = day_volume
+        bar = bars.get(start)
+        if bar is None:
+            bars[start] = [start, price, price, price, price, traded]
+        else:
+            bar[2], bar[3], bar[4] = max(bar[2], price), min(bar[3], price), price
+            bar[5] += traded
+    return [bars[k] for k in sorted(bars)]
+
+
+def stamp(start):
+    return datetime.fromtimestamp(start, IST).strftime("%Y-%m-%dT%H:%M:%S+05:30")
+
+
+@pytest.mark.parametrize("timeframe", list(TIMEFRAMES))
+def test_bars_match_brute_force(ws, timeframe):
+    batches = tick_stream(ws)
+    builder = BarBuilder()
+    for batch in batches:
+        builder.apply_ticks(batch)
+    for token in TOKENS:
+        want = brute_force(batches, token, TIMEFRAMES[timeframe])
+        got = builder.candles(token, timeframe)
+        assert len(got) == len(want)
+        for g, w in zip(got, want):
+            assert g[0] == stamp(w[0])
+            assert g[1:5] == pytest.approx(w[1:5])
+            assert g[5] == w[5]
+
+
+def test_60m_bars_follow_the_session_open(ws):
+    builder = BarBuilder()
+    for batch in tick_stream(ws):
+        builder.apply_ticks(batch)
+    starts = [c[0][11:16] for c in builder.candles(TOKENS[0], "60m")]
+    assert starts == ["09:15", "10:15", "11:15"]
+
+
+def test_ring_keeps_the_newest_bars(ws):
+    batches = tick_stream(ws)
+    builder = BarBuilder(depth=5)
+    for batch in batches:
+        builder.apply_ticks(batch)
+    want = brute_force(batches, TOKENS[1], TIMEFRAMES["1m"])[-5:]
+    got = builder.candles(TOKENS[1], "1m")
+    assert [g[0] for g in got] == [stamp(w[0]) for w in want]
+    assert [g[4] for g in got] == pytest.approx([w[4] for w in want])
+    assert builder.candles(TOKENS[1], "1m", limit=2) == got[-2:] # the newest bars
+
+
+def test_arrays_are_right_aligned_for_the_metrics_engine(ws):
+    builder = BarBuilder()
+    batches = tick_stream(ws, seconds=600)
+    for batch in batches:
+        builder.apply_ticks(batch)
+    tokens, opens, highs, lows, closes, volumes, starts, lengths = builder.arrays("5m", TOKENS + ["missing"])
+    assert tokens == TOKENS
+    for i, token in enumerate(tokens):
+        want = brute_force(batches, token, TIMEFRAMES["5m"])
+        k = int(lengths[i])
+        assert k == len(want)
+        assert np.isnan(closes[i, :-k]).all()
+        assert closes[i, -k:] == pytest.approx([w[4] for w in want])
+        assert list(starts[i, -k:]) == [w[0] for w in want]
+
+
+def test_ltp_ticks_and_other_segments(ws):
+    builder = BarBuilder()
+    batches = tick_stream(ws, mode=1, seconds=600)
+    for batch in batches:
+        nfo = ws.synthetic_tick(2, "40001", 3, np.random.default_rng(1))
+        builder.apply_ticks({**batch, (2, "40001"): nfo})
+    assert builder.candles("40001", "1m") == [] # bars are built for the cash segment only
+    assert all(c[5] == 0 for c in builder.candles(TOKENS[0], "1m")) # LTP ticks carry no volume
+    assert builder.stats()["tokens"] == len(TOKENS)
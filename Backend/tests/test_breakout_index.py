@@ -0,0 +1,48 @@
+from breakout_index import BreakoutIndex
+
+PERIODS = [1, 2, 3, 7, 10, 16, 30, 50, 64, 100, 250]
+
+
+def brute_force(candles, period):
+    """The scanner's original slice-and-scan lookup."""
+    if len(candles) < period + 2:
+        return None, None
+    past = candles[-(period + 1):-1]
+    return max(c[2] for c in past), min(c[3] for c in past)
+
+
+def test_query_matches_brute_force_for_every_length(history):
+    candles = next(iter(history.values()))
+    for n in range(0, len(candles) + 1, 7):
+        index = BreakoutIndex(candles[:n])
+        for period in PERIODS + [p for p in (n - 2, n - 1, n) if p > 0]:
+            assert index.prior_high_low(period) == brute_force(candles[:n], period), (n, period)
+
+
+def test_incremental_sync_matches_a_fresh_build(history):
+    candles = next(iter(history.values()))
+    index = BreakoutIndex(candles[:20])
+    for n in range(21, len(candles) + 1):
+        index.sync(candles[:n])
+        if n % 25 == 0 or n == len(candles):
+            fresh = BreakoutIndex(candles[:n])
+            assert len(index) == len(fresh) == n - 1
+            for period in PERIODS:
+                assert index.prior_high_low(period) == fresh.prior_high_low(period), (n, period)
+
+
+def test_intraday_updates_to_today_do_not_touch_the_table(history):
+    candles = [list(c) for c in next(iter(history.values()))]
+    index = BreakoutIndex(candles)
+    before = [index.prior_high_low(p) for p in PERIODS]
+    candles[-1][2] *= 10 # today's high moves, no day closed
+    index.sync(candles)
+    assert [index.prior_high_low(p) for p in PERIODS] == before
+
+
+def test_rewritten_history_rebuilds(history):
+    a, b = list(history.values())[:2]
+    index = BreakoutIndex(a)
+    index.sync(b[:100]) # older last day than what was indexed
+    for period in PERIODS:
+        assert index.prior_high_low(period) == brute_force(b[:100], period)
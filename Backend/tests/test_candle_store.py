@@ -0,0 +1,39 @@
+from candle_store import CandleStore
+
+
+def test_upsert_merges_and_replaces_today(tmp_path, history):
+    candles = next(iter(history.values()))
+    store = CandleStore(str(tmp_path / "candles.db"))
+    store.upsert("1", candles[:-1])
+    assert store.last_timestamp("1") == candles[-2][0]
+
+    today = list(candles[-1])
+    store.upsert("1", [candles[-2], today])
+    today[4] += 1.0 # intraday: the same day's candle again with a new close
+    store.upsert("1", [today])
+    got = store.get_candles("1")
+    assert len(got) == len(candles)
+    assert got[-1] == today
+    assert store.get_candles("1", since=candles[-3][0][:10]) == got[-3:]
+    assert store.tokens() == ["1"]
+
+
+def test_reads_survive_a_restart(tmp_path, history):
+    candles = next(iter(history.values()))
+    path = str(tmp_path / "candles.db")
+    CandleStore(path).upsert("1", candles)
+    assert CandleStore(path).get_candles("1") == [list(c) for c in candles]
+
+
+def test_invalidate_picks_up_another_writer(tmp_path, history):
+    """API workers read what the scanner process writes."""
+    candles = next(iter(history.values()))
+    path = str(tmp_path / "candles.db")
+    scanner, worker = CandleStore(path), CandleStore(path)
+    scanner.upsert("1", candles[:-5])
+    assert len(worker.get_candles("1")) == len(candles) - 5
+
+    scanner.upsert("1", candles[-5:]) # five more days closed
+    assert len(worker.get_candles("1")) == len(candles) - 5 # cached
+    worker.invalidate("1")
+    assert worker.get_candles("1") == [list(c) for c in candles]
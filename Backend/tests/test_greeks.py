@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+import pytest
+
+from greeks import norm_cdf, bs_price, implied_vol, greeks, max_pain, chain_analytics
+
+SPOT = 24_000.0
+STRIKES = np.arange(21_000.0, 27_001.0, 500.0)
+
+
+def reference_price(spot, strike, t, vol, is_call, rate=0.065):
+    """Scalar Black-Scholes on math.erf."""
+    cdf = lambda x: 0.5 * (1 + math.erf(x / math.sqrt(2)))
+    d1 = (math.log(spot / strike) + (rate + vol * vol / 2) * t) / (vol * math.sqrt(t))
+    d2 = d1 - vol * math.sqrt(t)
+    if is_call:
+        return spot * cdf(d1) - strike * math.exp(-rate * t) * cdf(d2)
+    return strike * math.exp(-rate * t) * cdf(-d2) - spot * cdf(-d1)
+
+
+def test_norm_cdf_matches_erf():
+    x = np.linspace(-8, 8, 1601)
+    want = [0.5 * (1 + math.erf(v / math.sqrt(2))) for v in x]
+    assert norm_cdf(x) == pytest.approx(want, abs=2e-7)
+
+
+def test_prices_match_the_reference_and_parity():
+    t, vol = 20 / 365, 0.18
+    calls = bs_price(SPOT, STRIKES, t, vol, True)
+    puts = bs_price(SPOT, STRIKES, t, vol, False)
+    assert calls == pytest.approx([reference_price(SPOT, k, t, vol, True) for k in STRIKES], abs=1e-2)
+    assert calls - puts == pytest.approx(SPOT - STRIKES * math.exp(-0.065 * t), abs=1e-2)
+
+
+@pytest.mark.parametrize("days", [1, 7, 30, 365])
+def test_implied_vol_recovers_the_input(days):
+    t = days / 365
+    vols = np.linspace(0.05, 1.5, STRIKES.size)
+    for is_call in (True, False):
+        prices = bs_price(SPOT, STRIKES, t, vols, is_call)
+        iv = implied_vol(prices, SPOT, STRIKES, t, np.full(STRIKES.size, is_call))
+        priced = ~np.isnan(iv) # deep wings with no time value fall outside the bounds
+        assert priced.sum() >= STRIKES.size // 2
+        assert bs_price(SPOT, STRIKES[priced], t, iv[priced], is_call) == pytest.approx(prices[priced], abs=1e-3)
+
+
+def test_prices_outside_the_bounds_have_no_iv():
+    t = 30 / 365
+    iv = implied_vol([0.0, SPOT + 1, 1500.0, 100.0], SPOT, [24_000, 24_000, 22_000, 24_000], [t, t, t, 0.0], [True, True, True, True])
+    assert np.isnan(iv[0]) and np.isnan(iv[1]) # at or above the bounds
+    assert np.isnan(iv[2]) # below intrinsic value
+    assert np.isnan(iv[3]) # expired
+
+
+def test_greeks_match_finite_differences():
+    t, vol, h = 15 / 365, 0.2, 1e-3
+    for is_call in (True, False):
+        g = greeks(SPOT, STRIKES, t, vol, is_call)
+        price = lambda s=SPOT, tt=t, v=vol: bs_price(s, STRIKES, tt, v, is_call)
+        ds = SPOT * h
+        assert g["delta"] == pytest.approx((price(s=SPOT + ds) - price(s=SPOT - ds)) / (2 * ds), abs=1e-4)
+        assert g["gamma"] == pytest.approx((price(s=SPOT + ds) - 2 * price() + price(s=SPOT - ds)) / ds ** 2, abs=1e-5)
+        assert g["vega"] == pytest.approx((price(v=vol + h) - price(v=vol - h)) / (2 * h) / 100, abs=1e-3)
+        assert g["theta"] == pytest.approx(-(price(tt=t + h) - price(tt=t - h)) / (2 * h) / 365, abs=1e-2)
+    nan = greeks(SPOT, STRIKES[:2], t, [np.nan, 0.2], True)
+    assert np.isnan(nan["delta"][0]) and np.isfinite(nan["delta"][1])
+
+
+def test_max_pain_matches_brute_force():
+    rng = np.random.default_rng(3)
+    ce_oi, pe_oi = rng.integers(0, 10_000, STRIKES.size), rng.integers(0, 10_000, STRIKES.size)
+    payout = lambda s: sum(max(s - k, 0) * c + max(k - s, 0) * p for k, c, p in zip(STRIKES, ce_oi, pe_oi))
+    assert max_pain(STRIKES, ce_oi, pe_oi) == min(STRIKES, key=payout)
+    assert max_pain([], [], []) is None
+
+
+def test_chain_analytics():
+    t, vol = 10 / 365, 0.16
+    ce_ltp = bs_price(SPOT, STRIKES, t, vol, True)
+    pe_ltp = bs_price(SPOT, STRIKES, t, vol, False)
+    ce_ltp[0] = 0 # no quote yet
+    ce_oi, pe_oi = np.full(STRIKES.size, 100.0), np.full(STRIKES.size, 150.0)
+    ce, pe, stats = chain_analytics(SPOT, STRIKES, t, ce_ltp, pe_ltp, ce_oi, pe_oi)
+    assert np.isnan(ce["iv"][0]) and np.isnan(ce["delta"][0])
+    atm = int(np.argmin(np.abs(STRIKES - SPOT)))
+    assert ce["iv"][atm] == pytest.approx(vol, abs=1e-4) and pe["iv"][atm] == pytest.approx(vol, abs=1e-4)
+    assert ce["delta"][atm] - pe["delta"][atm] == pytest.approx(1.0)
+    assert stats["atm_iv"] == pytest.approx(vol, abs=1e-4)
+    assert stats["pcr_oi"] == pytest.approx(1.5) and stats["pcr_volume"] is None
+    assert stats["max_pain"] == max_pain(STRIKES, ce_oi, pe_oi)
@@ -0,0 +1,65 @@
+import random
+
+from market_store import MarketStore
+
+
+def rows(n):
+    return [{"symbol": f"SYM{i}", "strength_score": float(i), "ltp": 100.0 + i} for i in range(n)]
+
+
+def test_versions_and_changed_since():
+    store = MarketStore()
+    v1 = store.update_rows(rows(5))
+    assert v1 == 1 and store.update_rows([]) == 1
+    assert store.update_fields("SYM2", {"ltp": 1.0}) and not store.update_fields("NOPE", {"ltp": 1.0})
+    v3 = store.update_many_fields({"SYM3": {"ltp": 2.0}, "SYM4": {"ltp": 3.0}, "NOPE": {"ltp": 4.0}})
+    assert v3 == store.version == 3
+    version, changed = store.changed_since(v1)
+    assert version == 3 and sorted(r['symbol'] for r in changed) == ["SYM2", "SYM3", "SYM4"]
+    assert store.changed_since(3) == (3, [])
+    assert "NOPE" not in store.rows
+
+
+def test_rows_are_replaced_not_mutated():
+    store = MarketStore()
+    store.update_rows(rows(3))
+    _, held = store.snapshot()
+    store.update_fields("SYM1", {"ltp": 0.0, "rsi": 70.0})
+    assert held[1] == {"symbol": "SYM1", "strength_score": 1.0, "ltp": 101.0}
+    assert store.rows["SYM1"] == {"symbol": "SYM1", "strength_score": 1.0, "ltp": 0.0, "rsi": 70.0}
+
+
+def test_snapshot_plus_deltas_rebuild_the_table():
+    """What a /god-mode/stream client does: one snapshot event, then apply each delta event by symbol."""
+    rng = random.Random(7)
+    store = MarketStore()
+    store.update_rows(rows(50))
+    version, first = store.snapshot()
+    client = {row['symbol']: row for row in first}
+    for _ in range(30):
+        for _ in range(rng.randint(1, 5)): # several writes coalesced into one event
+            store.update_many_fields({f"SYM{rng.randrange(50)}": {"ltp": rng.random()} for _ in range(rng.randint(1, 8))})
+        if rng.random() < 0.2:
+            store.update_rows([{"symbol": f"NEW{rng.randrange(5)}", "strength_score": 0.0, "ltp": 1.0}])
+        version, changed = store.changed_since(version)
+        client.update({row['symbol']: row for row in changed})
+        assert client == store.rows
+
+
+def test_publish_once_per_version_and_reencode_only_changed_rows():
+    store = MarketStore()
+    store.update_rows(rows(20))
+    first = store.publish()
+    assert store.publish() is first
+    assert [r['strength_score'] for r in first.rows] == sorted((float(i) for i in range(20)), reverse=True)
+    assert first.data_json == b"[" + b",".join(first.encoded) + b"]"
+
+    store.update_fields("SYM5", {"strength_score": 99.0})
+    second = store.publish()
+    assert second.version == store.version and second.origin == first.origin
+    assert second.rows[0]['symbol'] == "SYM5" and b'"strength_score":99.0' in second.encoded[0]
+    reused = {r['symbol']: e for r, e in zip(first.rows, first.encoded)}
+    for row, encoded in zip(second.rows, second.encoded):
+        assert (encoded is reused[row['symbol']]) == (row['symbol'] != "SYM5") # untouched rows keep their bytes
+    assert second.row_versions["SYM5"] == store.version and second.row_versions["SYM4"] == 1
+    assert first.rows[0]['symbol'] == "SYM19" # an older snapshot is never modified
@@ -0,0 +1,139 @@
+import math
+
+import pandas as pd
+import pytest
+
+from breakout_index import BreakoutIndex
+from metrics_engine import calculate_metrics_batch
+
+# Histories that hit every edge of the per-symbol rules: too short, no RSI yet,
+# no breakout levels yet, and partial breakout coverage
+LENGTHS = [3, 5, 6, 14, 15, 27, 40, 101, 252, None]
+
+
+def legacy_metrics(symbol, token, hist_data):
+    """The scanner's original per-symbol pandas calculation, kept as the reference."""
+    if len(hist_data) < 5: return None
+
+    c0 = hist_data[-1][4]
+    c1 = hist_data[-2][4]
+    c2 = hist_data[-3][4]
+    c3 = hist_data[-4][4]
+
+    change_current = ((c0 - c1) / c1) * 100
+    change_1d = ((c1 - c2) / c2) * 100
+    change_2d = ((c2 - c3) / c3) * 100
+    change_3d = ((c3 - hist_data[-5][4]) / hist_data[-5][4]) * 100
+    avg_3d = (change_current + change_1d + change_2d + change_3d) / 4.0
+
+    def get_dom(candle): return "Buyers" if candle[4] > candle[1] else "Sellers"
+    doms = [get_dom(hist_data[-k]) for k in range(1, 5)]
+    bulls = doms.count("Buyers")
+    avg_dom_3d = "Buyers" if bulls >= 3 else "Sellers" if bulls <= 1 else "Balance"
+
+    s = pd.Series([x[4] for x in hist_data])
+    delta = s.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    rsi = 100 - (100 / (1 + gain / loss))
+    cur_rsi = rsi.iloc[-1] if not pd.isna(rsi.iloc[-1]) else 50
+
+    e12 = s.ewm(span=12, adjust=False).mean()
+    e26 = s.ewm(span=26, adjust=False).mean()
+    macd = e12 - e26
+    sig = macd.ewm(span=9, adjust=False).mean()
+    hist = macd - sig
+    h_val, h_prev = hist.iloc[-1], hist.iloc[-2]
+    macd_sig = "Neutral"
+    if h_val > 0: macd_sig = "Bullish Growing" if h_val > h_prev else "Bullish Waning"
+    elif h_val < 0: macd_sig = "Bearish Growing" if h_val < h_prev else "Bearish Waning"
+
+    score = 50
+    if cur_rsi > 50: score += 10
+    if cur_rsi > 70: score -= 5
+    if macd.iloc[-1] > sig.iloc[-1]: score += 15
+    if change_current > 0: score += 10
+    if doms[0] == "Buyers": score += 5
+    sentiment = "Neutral"
+    if score > 75: sentiment = "STRONG BUY"
+    elif score > 60: sentiment = "Bullish"
+    elif score < 30: sentiment = "STRONG SELL"
+    elif score < 40: sentiment = "Bearish"
+
+    def get_high_low(period):
+        if len(hist_data) < period + 2: return None, None
+        past_data = hist_data[-(period + 1):-1]
+        return max(x[2] for x in past_data), min(x[3] for x in past_data)
+
+    def check_breakout(max_h, min_l):
+        if max_h and c0 > max_h: return "Bullish Breakout"
+        if min_l and c0 < min_l: return "Bearish Breakout"
+        return "Consolidating"
+
+    row = {
+        "symbol": symbol, "token": token, "ltp": c0,
+        "change_pct": round(change_current, 2),
+        "rsi": round(cur_rsi, 2), "strength_score": round(score, 1),
+        "sentiment": sentiment,
+        "change_current": round(change_current, 2),
+        "change_1d": round(change_1d, 2),
+        "change_2d": round(change_2d, 2),
+        "change_3d": round(change_3d, 2),
+        "avg_3d": round(avg_3d, 2),
+        "avg_dom_3d": avg_dom_3d,
+        "dom_current": doms[0], "dom_1d": doms[1], "dom_2d": doms[2], "dom_3d": doms[3],
+        "macd_signal": macd_sig,
+    }
+    for label, period in [("1d", 1), ("10d", 10), ("30d", 30), ("50d", 50), ("100d", 100), ("52w", 250)]:
+        h, l = get_high_low(period)
+        row[f"breakout_{label}"] = check_breakout(h, l)
+        row[f"high_{label}"], row[f"low_{label}"] = h, l
+    return row
+
+
+def assert_same_row(got, want):
+    assert got.keys() == want.keys()
+    for key, value in want.items():
+        if isinstance(value, float):
+            # Rounded to 2 places on both sides; float noise may flip the last digit
+            assert got[key] == pytest.approx(value, abs=0.011), key
+        else:
+            assert got[key] == value, key
+
+
+@pytest.fixture(scope="module")
+def items(history):
+    out = []
+    for i, (token, candles) in enumerate(sorted(history.items())):
+        length = LENGTHS[i % len(LENGTHS)]
+        out.append((f"SYM{token}", token, candles[-length:] if length else candles))
+    return out
+
+
+def test_batch_matches_legacy_per_symbol(items):
+    rows = {row['token']: row for row in calculate_metrics_batch(items)}
+    for symbol, token, candles in items:
+        want = legacy_metrics(symbol, token, candles)
+        if want is None:
+            assert token not in rows
+        else:
+            assert_same_row(rows[token], want)
+
+
+def test_breakout_index_levels_match_slicing(items):
+    indexes = {token: BreakoutIndex(candles) for _, token, candles in items}
+    sliced = calculate_metrics_batch(items)
+    indexed = calculate_metrics_batch(items, indexes=indexes)
+    assert indexed == sliced
+
+
+def test_tick_state_reproduces_batch_on_the_last_close(items):
+    """IndicatorState.update(today's close) is the O(1) path; it must land where a full recompute does."""
+    rows, states = calculate_metrics_batch(items, with_state=True)
+    for row in rows:
+        fields = states[row['token']].update(row['ltp'])
+        for key, value in fields.items():
+            if isinstance(value, float) and not math.isnan(value):
+                assert value == pytest.approx(row[key], abs=0.011), key
+            else:
+                assert value == row[key], key
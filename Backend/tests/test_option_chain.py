@@ -0,0 +1,133 @@
+from datetime import date, timedelta
+
+import pytest
+
+from replay import FakeWebSocket
+from subscriptions import SubscriptionManager, NSE_CM, NSE_FO, LTP, SNAP_QUOTE
+from option_chain import OptionChainService, resolve_expiry, expiry_label
+
+TODAY = date.today()
+EXPIRIES = [TODAY + timedelta(days=d) for d in (3, 10, 17, 45)]
+STRIKES = [float(k) for k in range(23_000, 25_001, 100)]
+SPOT_TOKEN = "99926000"
+
+
+class Scrips:
+    """The slice of ScripMaster the chain service uses: NIFTY options, tokens numbered by strike."""
+
+    def get_expiries(self, name):
+        return EXPIRIES if name == "NIFTY" else []
+
+    def get_strikes(self, name, expiry):
+        return STRIKES
+
+    def get_fno_tokens_for_chain(self, name, expiry, strikes, is_index=True):
+        assert is_index
+        return {f"{int(k)}_{o}": f"{int(k)}{1 if o == 'CE' else 2}" for k in strikes for o in ("CE", "PE")}
+
+
+class Quotes:
+    def __init__(self, spot):
+        self.spot = spot
+        self.calls = []
+
+    def __call__(self, instruments, mode):
+        self.calls.append((mode, len(instruments)))
+        out = {}
+        for exchange, token in instruments:
+            if token == SPOT_TOKEN:
+                out[(exchange, token)] = {"ltp": self.spot}
+            else:
+                strike, is_call = int(token[:-1]), token[-1] == "1"
+                out[(exchange, token)] = {"ltp": max(self.spot - strike, 0) + 50 if is_call else max(strike - self.spot, 0) + 50,
+                                          "opnInterest": 1000, "tradeVolume": 10, "close": 60}
+        return out
+
+
+@pytest.fixture
+def subscriptions():
+    manager = SubscriptionManager()
+    manager.attach(FakeWebSocket())
+    manager.on_connected()
+    return manager
+
+
+def service(subscriptions, quotes, **kwargs):
+    return OptionChainService(Scrips, subscriptions, quotes, lambda name: SPOT_TOKEN, width=3, **kwargs)
+
+
+def test_resolve_expiry():
+    assert resolve_expiry(EXPIRIES, "nearest") == resolve_expiry(EXPIRIES, "weekly") == EXPIRIES[0]
+    assert resolve_expiry(EXPIRIES, "next") == EXPIRIES[1]
+    first = EXPIRIES[0]
+    assert resolve_expiry(EXPIRIES, "monthly") == [e for e in EXPIRIES if (e.year, e.month) == (first.year, first.month)][-1]
+    assert resolve_expiry(EXPIRIES, "nearest", today=EXPIRIES[-1] + timedelta(days=1)) is None
+
+
+def test_first_request_seeds_and_subscribes(subscriptions):
+    quotes = Quotes(24_040.0)
+    chains = service(subscriptions, quotes)
+    res = chains.get_chain("nifty 50")
+    assert res["status"] == "success" and res["expiry"] == expiry_label(EXPIRIES[0])
+    assert [row["strike"] for row in res["chain"]] == [23_700.0 + 100 * i for i in range(7)]
+    assert [row["type"] for row in res["chain"]][2:5] == ["ITM", "ATM", "OTM"]
+    assert quotes.calls == [("LTP", 1), ("FULL", 14)] # spot, then every leg in one batch
+    assert res["chain"][3]["ce_iv"] is not None and res["analytics"]["pcr_oi"] == 1.0
+
+    ws = subscriptions.ws
+    assert ws.subscribed[(NSE_CM, SPOT_TOKEN)] == LTP
+    assert sorted(t for (ex, t), mode in ws.subscribed.items() if ex == NSE_FO and mode == SNAP_QUOTE) == \
+        sorted(f"{23_700 + 100 * i}{leg}" for i in range(7) for leg in (1, 2))
+
+    # Served from memory while the feed is up: same cached response, no more REST
+    assert chains.get_chain("NIFTY") is res
+    assert len(quotes.calls) == 2
+
+
+def test_ticks_update_legs_and_move_the_window(subscriptions):
+    chains = service(subscriptions, Quotes(24_040.0))
+    first = chains.get_chain("NIFTY")
+
+    chains.apply_ticks({(NSE_FO, "240001"): {"last_traded_price": 12_345, "open_interest": 7},
+                        (NSE_CM, "240001"): {"last_traded_price": 1}}) # same number, cash segment: not a leg
+    res = chains.get_chain("NIFTY")
+    assert res is not first and res["version"] > first["version"]
+    row = next(r for r in res["chain"] if r["strike"] == 24_000.0)
+    assert row["ce_ltp"] == 123.45 and row["ce_oi"] == 7
+
+    chains.apply_ticks({(NSE_CM, SPOT_TOKEN): {"last_traded_price": 24_110 * 100}}) # ATM moves one strike
+    assert [r["strike"] for r in chains.get_chain("NIFTY")["chain"]][0] == 23_700.0
+    chains.apply_ticks({(NSE_CM, SPOT_TOKEN): {"last_traded_price": 24_260 * 100}}) # two strikes: recentre
+    res = chains.get_chain("NIFTY")
+    assert res["spot_price"] == 24_260.0
+    assert [r["strike"] for r in res["chain"]] == [24_000.0 + 100 * i for i in range(7)]
+    assert (NSE_FO, "237001") not in subscriptions.ws.subscribed
+    assert subscriptions.ws.subscribed[(NSE_FO, "246001")] == SNAP_QUOTE
+    assert next(r for r in res["chain"] if r["strike"] == 24_000.0)["ce_ltp"] == 123.45 # kept across the move
+
+
+def test_rest_fallback_while_the_feed_is_down(subscriptions):
+    quotes = Quotes(24_040.0)
+    chains = service(subscriptions, quotes, rest_interval=60)
+    chains.get_chain("NIFTY")
+    subscriptions.on_disconnected()
+    chains.chains[("NIFTY", EXPIRIES[0])].rest_refreshed = 0
+    quotes.spot = 24_060.0
+    res = chains.get_chain("NIFTY")
+    assert res["spot_price"] == 24_060.0 and res["live"] is False
+    calls = len(quotes.calls)
+    chains.get_chain("NIFTY")
+    assert len(quotes.calls) == calls # at most once per rest_interval
+
+
+def test_errors_and_idle_chains(subscriptions):
+    chains = service(subscriptions, Quotes(24_040.0), idle_ttl=60)
+    assert chains.get_chain("SBIN")["message"] == "No options listed for symbol"
+    assert chains.get_chain("NIFTY", "01JAN20")["message"] == "Expiry not found"
+    assert chains.get_chain("NIFTY", expiry_label(EXPIRIES[1]))["expiry"] == expiry_label(EXPIRIES[1])
+
+    chains.chains[("NIFTY", EXPIRIES[1])].last_access -= 120
+    chains.get_chain("NIFTY")
+    assert chains.stats()["chains"] == [f"NIFTY {expiry_label(EXPIRIES[0])}"]
+    assert chains.stats()["legs"] == 14
+    assert len([k for k in subscriptions.ws.subscribed if k[0] == NSE_FO]) == 14
@@ -0,0 +1,46 @@
+from api_scheduler import SmartApiScheduler
+from quotes import chunk_instruments, fetch_quotes, MAX_TOKENS_PER_REQUEST
+
+EXPIRED = {"status": False, "message": "Invalid Token", "errorcode": "AG8001", "data": None}
+
+
+def scheduler():
+    return SmartApiScheduler(limits={}, max_concurrency=4, initial_concurrency=4)
+
+
+def test_chunks_hold_at_most_50_unique_tokens():
+    instruments = [("NSE", t) for t in range(120)] + [("NFO", t) for t in range(30)] + [("NSE", 5)]
+    chunks = chunk_instruments(instruments)
+    assert [sum(len(v) for v in c.values()) for c in chunks] == [MAX_TOKENS_PER_REQUEST] * 3
+    assert chunks[2] == {"NSE": [str(t) for t in range(100, 120)], "NFO": [str(t) for t in range(30)]}
+
+
+def test_one_call_per_chunk(api):
+    before = api.calls.get("getMarketData", 0)
+    quotes = fetch_quotes(api, scheduler(), [("NSE", str(t)) for t in range(3000, 3120)], mode="OHLC")
+    assert api.calls["getMarketData"] - before == 3
+    assert len(quotes) == 120
+    q = quotes[("NSE", "3000")]
+    assert q['symboltoken'] == "3000" and q['tradingsymbol'] == q['tradingSymbol']
+
+
+def test_auth_error_is_reported_once_per_call():
+    class Expired:
+        def getMarketData(self, mode, tokens):
+            return EXPIRED
+
+    dropped = []
+    quotes = fetch_quotes(Expired(), scheduler(), [("NSE", str(t)) for t in range(120)],
+                          on_auth_error=lambda: dropped.append(1))
+    assert quotes == {}
+    assert dropped == [1]
+
+
+def test_other_errors_keep_the_session():
+    class Failing:
+        def getMarketData(self, mode, tokens):
+            return {"status": False, "message": "Something went wrong", "errorcode": "AB1004", "data": None}
+
+    dropped = []
+    assert fetch_quotes(Failing(), scheduler(), [("NSE", "1")], on_auth_error=lambda: dropped.append(1)) == {}
+    assert dropped == []
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+import fake_smartapi
+from replay import Recorder, RecordingAsyncSmartApi, FakeSmartConnect, FakeAsyncSmartApi, load_rest
+from smartapi_async import AsyncSmartApi
+
+
+def candle_params(token, days=30):
+    to_date = datetime.now()
+    return {"exchange": "NSE", "symboltoken": token, "interval": "ONE_DAY",
+            "fromdate": (to_date - timedelta(days=days)).strftime("%Y-%m-%d %H:%M"),
+            "todate": to_date.strftime("%Y-%m-%d %H:%M")}
+
+
+def test_async_client_recording_replays_through_the_fake(tmp_path):
+    directory = str(tmp_path / "rec")
+    recorder = Recorder(directory)
+
+    async def record():
+        api = RecordingAsyncSmartApi(AsyncSmartApi("key", root_url="http://fake",
+                                                   transport=httpx.ASGITransport(app=fake_smartapi.app)), recorder)
+        await api.login("C1", "pw", "123456") # passes through, not recorded
+        candles = await api.get_candle_data(candle_params("2885"))
+        quotes = await api.get_market_data("FULL", {"NSE": ["2885", "1594"]})
+        ltp = await api.ltp_data("NSE", "SBIN-EQ", "3045")
+        await api.aclose()
+        return candles, quotes, ltp
+
+    candles, quotes, ltp = asyncio.run(record())
+    recorder.close()
+
+    recorded, ltps, quoted = load_rest(directory)
+    assert recorded[("2885", "ONE_DAY")] == candles['data']
+    assert quoted[("NSE", "1594")] == quotes['data']['fetched'][1]
+    assert ltps["3045"] == ltp['data']
+
+    replay = FakeSmartConnect(directory)
+    assert replay.getCandleData(candle_params("2885"))['data'] == candles['data']
+    assert replay.getMarketData("FULL", {"NSE": ["2885"]})['data']['fetched'] == quotes['data']['fetched'][:1]
+    assert replay.ltpData("NSE", "SBIN-EQ", "3045")['data'] == ltp['data']
+
+
+def test_fake_async_client_replays_the_recording(tmp_path):
+    directory = str(tmp_path / "rec")
+    recorder = Recorder(directory)
+    bar = [(datetime.now() - timedelta(days=1)).strftime("%Y-%m-%dT00:00:00+05:30"), 1, 2, 0.5, 1.5, 100]
+    recorder.rest("getCandleData", [candle_params("2885")], {"status": True, "data": [bar]})
+    recorder.close()
+
+    async def replay():
+        api = FakeAsyncSmartApi(FakeSmartConnect(directory, latency=0.001))
+        res = await api.login("C1", "pw", "123456")
+        assert res['status'] and api.jwt_token
+        candles = await api.get_candle_data(candle_params("2885"))
+        quotes = await api.get_market_data("OHLC", {"NSE": ["2885", "1594"]}) # not recorded: synthesized
+        await api.aclose()
+        return candles, quotes
+
+    candles, quotes = asyncio.run(replay())
+    assert candles['data'] == [bar]
+    assert [q['symbolToken'] for q in quotes['data']['fetched']] == ["2885", "1594"]
@@ -0,0 +1,98 @@
+import gzip
+import json
+
+import pytest
+from starlette.requests import Request
+
+import response_encoding
+from response_encoding import ResponseEncoder, Variant, PLAIN, negotiate, columnar, encode_payload, compress, COMPRESS_MIN
+
+ROWS = [{"symbol": f"SYM{i}", "ltp": 100.0 + i, "rsi": 50 + i % 7} for i in range(200)]
+
+
+def request(query="", accept="", encoding=""):
+    headers = [(b"accept", accept.encode()), (b"accept-encoding", encoding.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": query.encode(), "headers": headers})
+
+
+@pytest.mark.parametrize("query, accept, encoding, want", [
+    ("", "", "", PLAIN),
+    ("layout=columns", "application/json", "gzip, deflate", Variant("columns", "json", "gzip")),
+    ("layout=bogus", "application/x-msgpack", "gzip, br", Variant("rows", "msgpack", "br")),
+    ("", "*/*", "br;q=0, gzip;q=0.5", Variant("rows", "json", "gzip")),
+    ("", "", "identity", PLAIN),
+])
+def test_negotiate(query, accept, encoding, want):
+    assert negotiate(request(query, accept, encoding)) == want
+
+
+def test_negotiate_without_optional_codecs(monkeypatch):
+    monkeypatch.setattr(response_encoding, "msgpack", None)
+    monkeypatch.setattr(response_encoding, "brotli", None)
+    assert negotiate(request("", "application/msgpack", "br, gzip")) == Variant("rows", "json", "gzip")
+    assert negotiate(request(), layout="columns").layout == "columns" # explicit layout wins over the query
+
+
+def test_variant_tags_and_media_types():
+    assert PLAIN.plain and PLAIN.tag == "" and PLAIN.media_type == "application/json"
+    v = Variant("columns", "msgpack", "br")
+    assert v.tag == "-columns-msgpack-br" and v.media_type == "application/msgpack"
+
+
+def test_columnar_keeps_every_field():
+    rows = [{"a": 1, "b": 2}, {"a": 3, "c": 4}, {"b": 5}]
+    out = columnar({"data": rows, "count": 3, "empty": []})
+    assert out == {"data": {"a": [1, 3, None], "b": [2, None, 5], "c": [None, 4, None]}, "count": 3, "empty": []}
+
+
+@pytest.mark.parametrize("variant", [Variant(l, f, "identity") for l in ("rows", "columns") for f in ("json", "msgpack")])
+def test_encode_payload_round_trips(variant):
+    payload = {"data": ROWS, "count": len(ROWS)}
+    body = encode_payload(payload, variant)
+    decoded = response_encoding.msgpack.unpackb(body) if variant.fmt == "msgpack" else json.loads(body)
+    assert decoded == (columnar(payload) if variant.layout == "columns" else payload)
+
+
+def test_compress():
+    body = encode_payload({"data": ROWS}, PLAIN)
+    assert compress(b"x" * (COMPRESS_MIN - 1), "gzip") == (b"x" * (COMPRESS_MIN - 1), "identity")
+    packed, coding = compress(body, "gzip")
+    assert coding == "gzip" and gzip.decompress(packed) == body and len(packed) < len(body)
+    packed, coding = compress(body, "br")
+    assert coding == "br" and response_encoding.brotli.decompress(packed) == body
+
+
+def test_encoder_builds_once_per_version():
+    encoder = ResponseEncoder()
+    variant = Variant("columns", "json", "gzip")
+    built = []
+
+    def build():
+        built.append(1)
+        return encode_payload({"data": ROWS}, variant)
+
+    first = encoder.render("god-mode", 1, variant, build)
+    assert encoder.render("god-mode", 1, variant, build) == first
+    assert len(built) == 1
+    encoder.render("god-mode", 1, PLAIN, lambda: encode_payload({"data": ROWS}, PLAIN)) # another representation
+    encoder.render("god-mode", 2, variant, build) # new version
+    assert len(built) == 2
+    stats = encoder.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 3 and stats["entries"] == 2
+
+
+def test_encoder_evicts_least_recently_used():
+    encoder = ResponseEncoder(max_bytes=4 * 1000)
+    blob = lambda: b"x" * 900 # below COMPRESS_MIN: stored as is
+    for key in ("a", "b", "c", "d"):
+        encoder.render(key, 1, PLAIN, blob)
+    encoder.render("a", 1, PLAIN, blob) # touch a
+    encoder.render("e", 1, PLAIN, blob)
+    assert encoder.stats()["cached_bytes"] <= 4000
+    misses = encoder.stats()["misses"]
+    encoder.render("a", 1, PLAIN, blob)
+    assert encoder.stats()["misses"] == misses # a survived
+    encoder.render("b", 1, PLAIN, blob)
+    assert encoder.stats()["misses"] == misses + 1 # b was evicted
+    encoder.render("huge", 1, PLAIN, lambda: b"y" * 1001) # over a quarter of the budget: never cached
+    assert ("huge", PLAIN) not in encoder._entries
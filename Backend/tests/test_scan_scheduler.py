@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from scan_scheduler import ScanScheduler, staleness_from_state, INDEX, WATCHLIST, HOT, COLD, RETRY_AFTER
+
+INTERVALS = {INDEX: 10, WATCHLIST: 20, HOT: 40, COLD: 300}
+
+
+@pytest.fixture
+def now():
+    return time.time() + 1 # set_universe and watch stamp with the wall clock
+
+
+def targets(n):
+    return [{"symbol": f"SYM{i}", "token": str(i)} for i in range(n)]
+
+
+def scheduler(hot=()):
+    s = ScanScheduler(intervals=INTERVALS, is_hot=lambda token: token in hot)
+    s.set_universe(targets(8), index_tokens=["0", "1"])
+    return s
+
+
+def refresh_all(s, now):
+    for item in s.take_due(now=now):
+        s.done(item['token'], True, now=now)
+
+
+def test_tiers_set_the_next_refresh(now):
+    s = scheduler(hot={"2"})
+    s.watch(["3"])
+    assert [s.tier(str(t)) for t in range(5)] == [INDEX, INDEX, HOT, WATCHLIST, COLD]
+    assert len(s.take_due(now=now)) == 8 # new tokens are due at once
+    for t in range(8):
+        s.done(str(t), True, now=now)
+    assert s.take_due(now=now + 9) == []
+    assert {x['token'] for x in s.take_due(now=now + 10)} == {"0", "1"}
+    assert [x['token'] for x in s.take_due(now=now + 20)] == ["3"]
+    assert [x['token'] for x in s.take_due(now=now + 40)] == ["2"]
+    assert {x['token'] for x in s.take_due(now=now + 300)} == {"4", "5", "6", "7"}
+
+
+def test_most_overdue_first_and_limit(now):
+    s = scheduler()
+    refresh_all(s, now)
+    assert len(s.take_due(now=now + 10)) == 2
+    s.done("1", True, now=now + 10)
+    s.done("0", True, now=now + 12) # due after token 1
+    assert [x['token'] for x in s.take_due(limit=1, now=now + 25)] == ["1"]
+    assert [x['token'] for x in s.take_due(limit=1, now=now + 25)] == ["0"]
+    assert s.take_due(now=now + 25) == []
+
+
+def test_failures_retry_sooner_and_are_counted(now):
+    s = scheduler()
+    refresh_all(s, now)
+    assert s.failing == 0
+    assert len(s.take_due(now=now + 300)) == 8
+    s.done("6", False, now=now + 300)
+    assert s.failing == 1
+    assert s.next_due_in(now=now + 300) == RETRY_AFTER # not the cold interval
+    s.take_due(now=now + 300 + RETRY_AFTER)
+    s.done("6", True, now=now + 300 + RETRY_AFTER)
+    assert s.failing == 0
+    assert s.next_due_in(now=now + 300 + RETRY_AFTER) == INTERVALS[COLD]
+
+
+def test_watch_pulls_a_cold_token_forward(now):
+    s = scheduler()
+    refresh_all(s, now)
+    s.watch(["5"])
+    assert s.next_due_in(now=now) == 10
+    assert "5" in [x['token'] for x in s.take_due(now=now + 20)] # watchlist interval, not cold
+
+
+def test_universe_changes(now):
+    s = scheduler()
+    refresh_all(s, now)
+    s.set_universe(targets(4) + [{"symbol": "NEW", "token": "99"}], index_tokens=["0"])
+    assert [x['token'] for x in s.take_due(now=now + 1)] == ["99"]
+    assert s.stats()["universe"] == 5
+    s.done("7", True, now=now + 1) # dropped from the universe: ignored
+    assert {x['token'] for x in s.take_due(now=now + 10_000)} == {"0", "1", "2", "3"}
+
+
+def test_staleness_ages_are_computed_by_the_reader(now):
+    s = scheduler(hot={"2"})
+    refresh_all(s, now)
+    state = s.staleness_state(now=now)
+    report = staleness_from_state(state, now=now + 60)
+    assert report[INDEX]["symbols"] == 2 and report[HOT]["symbols"] == 1 and report[COLD]["symbols"] == 5
+    assert report[INDEX]["age_p50"] == report[INDEX]["age_max"] == 60.0
+    assert report[INDEX]["overdue"] == 2 and report[HOT]["overdue"] == 1 and report[COLD]["overdue"] == 0
+    assert staleness_from_state(state, now=now)[INDEX]["overdue"] == 0
+    assert s.staleness(now=now + 60) == report
+
+
+def test_staleness_state_is_reused_within_max_age(now):
+    walked = []
+    s = ScanScheduler(intervals=INTERVALS, is_hot=lambda token: walked.append(token) or False)
+    s.set_universe(targets(8))
+    first = s.staleness_state(now=now, max_age=5)
+    calls = len(walked)
+    assert s.staleness_state(now=now + 4, max_age=5) is first
+    assert len(walked) == calls
+    assert s.staleness_state(now=now + 5, max_age=5) is not first
+    assert s.staleness_state(now=now + 6) is not first # max_age=0 always rebuilds
@@ -0,0 +1,121 @@
+import math
+
+import pytest
+
+from market_store import MarketStore
+from metrics_engine import calculate_metrics_batch
+from screener import Screener, ScreenError
+
+QUERY = 'rsi > 50 and (breakout_10d == "Bullish Breakout" or change_pct > 0) and avg_dom_3d in ("Buyers", "Balance")'
+RANK = "strength_score + rsi / 10"
+
+
+def brute_force(rows, order="desc"):
+    """QUERY and RANK written out in plain Python over the row dicts."""
+    hits = [r for r in rows
+            if r['rsi'] > 50 and (r['breakout_10d'] == "Bullish Breakout" or r['change_pct'] > 0)
+            and r['avg_dom_3d'] in ("Buyers", "Balance")]
+    ranked = sorted(hits, key=lambda r: r['strength_score'] + r['rsi'] / 10, reverse=order == "desc")
+    return [r['symbol'] for r in ranked]
+
+
+def full_run(snap, query=QUERY, rank=RANK, order="desc"):
+    rows, _, _ = Screener().run(snap, query, rank, order)
+    return [r['symbol'] for r in rows]
+
+
+@pytest.fixture
+def store(history):
+    store = MarketStore()
+    store.update_rows(calculate_metrics_batch([(f"SYM{t}", t, c) for t, c in history.items()]))
+    return store
+
+
+def test_matches_brute_force(store):
+    snap = store.publish()
+    rows, encoded, values = Screener().run(snap, QUERY, RANK, "desc")
+    assert [r['symbol'] for r in rows] == brute_force(snap.rows)
+    assert [snap.encoded[snap.rows.index(r)] for r in rows] == encoded
+    assert list(values) == pytest.approx([r['strength_score'] + r['rsi'] / 10 for r in rows])
+    asc, _, _ = Screener().run(snap, QUERY, RANK, "asc")
+    assert [r['symbol'] for r in asc] == brute_force(snap.rows, "asc")
+
+
+def test_incremental_runs_match_full_runs(store):
+    screener = Screener()
+    screener.run(store.publish(), QUERY, RANK)
+    assert screener.counters["full"] == 1
+
+    symbols = sorted(store.rows)
+    for step in range(1, 6):
+        # Live ticks move a few rows in and out of the screen
+        changed = symbols[step::7]
+        store.update_many_fields({sym: {"rsi": 80.0 if step % 2 else 20.0, "change_pct": step - 3.0} for sym in changed})
+        snap = store.publish()
+        before = screener.counters["rows_evaluated"]
+        rows, _, _ = screener.run(snap, QUERY, RANK)
+        assert screener.counters["rows_evaluated"] - before == len(changed)
+        assert [r['symbol'] for r in rows] == full_run(snap) == brute_force(snap.rows)
+    assert screener.counters["full"] == 1
+    assert screener.counters["incremental"] == 5
+
+
+def test_new_symbols_and_scanner_restart(store, history):
+    screener = Screener()
+    screener.run(store.publish(), QUERY, RANK)
+
+    extra = calculate_metrics_batch([(f"NEW{t}", t, c) for t, c in list(history.items())[:5]])
+    store.update_rows(extra)
+    snap = store.publish()
+    rows, _, _ = screener.run(snap, QUERY, RANK)
+    assert [r['symbol'] for r in rows] == full_run(snap)
+    assert screener.counters["full"] == 1
+
+    # A restarted scanner publishes from version 1 again with fewer rows
+    restarted = MarketStore()
+    restarted.update_rows(extra)
+    snap = restarted.publish()
+    rows, _, _ = screener.run(snap, QUERY, RANK)
+    assert [r['symbol'] for r in rows] == full_run(snap) == brute_force(snap.rows)
+    assert screener.counters["full"] == 2
+
+
+def test_restarted_scanner_ahead_of_the_old_version(store, history):
+    screener = Screener()
+    screener.run(store.publish(), QUERY, RANK)
+
+    # Same symbols, different values, and the new table already counted past the old version
+    restarted = MarketStore()
+    restarted.update_rows([{**row, "rsi": 100.0 - row['rsi']} for row in store.publish().rows])
+    for _ in range(store.version + 1):
+        restarted.update_fields(next(iter(restarted.rows)), {"change_pct": 1.0})
+    snap = restarted.publish()
+    assert snap.version > store.version and len(snap.rows) == len(store.rows)
+    rows, _, _ = screener.run(snap, QUERY, RANK)
+    assert [r['symbol'] for r in rows] == brute_force(snap.rows)
+    assert screener.counters["full"] == 2
+
+
+def test_nan_ranks_sort_last(store):
+    store.update_many_fields({sym: {"rsi": None} for sym in sorted(store.rows)[:3]})
+    _, _, values = Screener().run(store.publish(), "strength_score >= 0", "rsi")
+    nans = [math.isnan(v) for v in values]
+    assert nans == sorted(nans) and sum(nans) == 3
+
+
+def test_redundant_brackets_are_not_nesting(store):
+    query = "(" * 150 + "rsi" + ")" * 150 + " > 50"
+    assert full_run(store.publish(), query, "rsi") == full_run(store.publish(), "rsi > 50", "rsi")
+
+
+@pytest.mark.parametrize("query, rank", [
+    ("rsi >", "rsi"),
+    ("no_such_field > 1", "rsi"),
+    ("__import__('os')", "rsi"),
+    ("rsi > 50", "sentiment"),
+    ("-" * 1500 + "rsi > 0", "rsi"), # overflowed the parser's recursion limit
+    (" + ".join(["rsi"] * 400) + " > 0", "rsi"),
+])
+def test_bad_expressions(store, query, rank):
+    with pytest.raises(ScreenError):
+        Screener().run(store.publish(), query, rank)
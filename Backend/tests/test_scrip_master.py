@@ -0,0 +1,122 @@
+import os
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scrip_master import ScripMaster
+
+
+def record(token, symbol, name, exch="NSE", inst="", expiry="", strike="-1.000000", lotsize="1"):
+    return {"token": str(token), "symbol": symbol, "name": name, "expiry": expiry, "strike": strike,
+            "lotsize": lotsize, "instrumenttype": inst, "exch_seg": exch, "tick_size": "5.000000"}
+
+
+def master(expiry="26DEC2024", strikes=(2400, 2500)):
+    rows = [record(2885, "RELIANCE-EQ", "RELIANCE"), record(1594, "INFY-EQ", "INFY"),
+            record(50001, f"RELIANCE{expiry[:5]}{expiry[-2:]}FUT", "RELIANCE", "NFO", "FUTSTK", expiry)]
+    for i, strike in enumerate(strikes):
+        for j, otype in enumerate(("CE", "PE")):
+            rows.append(record(60000 + 2 * i + j, f"RELIANCE{expiry[:5]}{expiry[-2:]}{strike}{otype}", "RELIANCE",
+                               "NFO", "OPTSTK", expiry, f"{strike * 100:.6f}", "250"))
+    return json.dumps(rows).encode()
+
+
+class Upstream(BaseHTTPRequestHandler):
+    """Serves `body` with an ETag; mode "fail" answers 500, "partial" drops the connection half way."""
+    body, etag, mode, requests = b"[]", '"v1"', "ok", []
+
+    def do_GET(self):
+        cls = type(self)
+        cls.requests.append(dict(self.headers))
+        if cls.mode == "fail":
+            self.send_response(500)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == cls.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", cls.etag)
+        self.send_header("Content-Length", str(len(cls.body)))
+        self.end_headers()
+        self.wfile.write(cls.body[:len(cls.body) // 2] if cls.mode == "partial" else cls.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    Upstream.body, Upstream.etag, Upstream.mode, Upstream.requests = master(), '"v1"', "ok", []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/OpenAPIScripMaster.json"
+    server.shutdown()
+    server.server_close()
+
+
+def scrips(url, tmp_path, **kwargs):
+    return ScripMaster(url=url, file_path=str(tmp_path / "master.json"), cache_dir=str(tmp_path / "cache"),
+                       background=False, **kwargs)
+
+
+def leftovers(tmp_path):
+    return [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_download_builds_the_indexes(upstream, tmp_path):
+    sm = scrips(upstream, tmp_path)
+    assert sm.ready.is_set()
+    assert sm.get_equity_token("RELIANCE") == "2885"
+    assert sm.get_all_fno_tokens() == [{"symbol": "RELIANCE", "token": "2885"}]
+    assert sm.get_expiries("RELIANCE") == [date(2024, 12, 26)]
+    assert sm.get_strikes("RELIANCE", "26DEC24") == [2400.0, 2500.0]
+    assert sm.get_fno_tokens_for_chain("RELIANCE", "26DEC24", [2500], is_index=False) == {"2500_CE": "60002", "2500_PE": "60003"}
+    assert json.load(open(sm.meta_path))["etag"] == '"v1"'
+    assert os.path.exists(tmp_path / "cache" / "meta.json")
+
+    # A second process maps the cache instead of parsing the JSON
+    reader = scrips(upstream, tmp_path, owner=False)
+    assert reader.get_strikes("RELIANCE", "26DEC2024") == [2400.0, 2500.0]
+    assert len(Upstream.requests) == 1 # load-only instances never download
+
+
+def test_refresh_swaps_in_a_newer_master(upstream, tmp_path):
+    sm = scrips(upstream, tmp_path)
+    old_index = sm.index
+
+    sm.refresh() # unchanged upstream: conditional request, nothing rewritten
+    assert Upstream.requests[-1]["If-None-Match"] == '"v1"'
+    assert sm.index is old_index
+
+    Upstream.body, Upstream.etag = master("30JAN2025", strikes=(2400, 2500, 2600)), '"v2"'
+    sm.refresh()
+    assert sm.index is not old_index
+    assert sm.get_expiries("RELIANCE") == [date(2025, 1, 30)]
+    assert sm.get_strikes("RELIANCE", "30JAN25") == [2400.0, 2500.0, 2600.0]
+    assert sm.get_strikes("RELIANCE", "26DEC24") == []
+    assert json.load(open(sm.meta_path))["etag"] == '"v2"'
+    assert scrips(upstream, tmp_path, owner=False).get_expiries("RELIANCE") == [date(2025, 1, 30)] # cache rebuilt too
+    assert leftovers(tmp_path) == []
+
+
+@pytest.mark.parametrize("mode", ["fail", "partial"])
+def test_failed_download_keeps_the_previous_file(upstream, tmp_path, mode):
+    sm = scrips(upstream, tmp_path)
+    before = open(sm.file_path, "rb").read()
+    old_index = sm.index
+
+    Upstream.body, Upstream.etag, Upstream.mode = master("30JAN2025"), '"v2"', mode
+    sm.refresh() # logged, not raised
+    assert open(sm.file_path, "rb").read() == before
+    assert json.load(open(sm.meta_path))["etag"] == '"v1"'
+    assert sm.index is old_index
+    assert leftovers(tmp_path) == []
+
+    Upstream.mode = "ok"
+    sm.refresh()
+    assert sm.get_expiries("RELIANCE") == [date(2025, 1, 30)]
@@ -0,0 +1,126 @@
+import json
+import time
+import base64
+import asyncio
+import threading
+
+import pytest
+
+from session_manager import SessionManager, SessionError, jwt_expiry, is_auth_error
+
+SECRET = "JBSWY3DPEHPK3PXP"
+
+
+def jwt(exp):
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{claims}.signature"
+
+
+class Api:
+    """SmartConnect login calls: slow enough for callers to pile up, scripted by `fail`."""
+
+    def __init__(self, ttl=3600, delay=0.05):
+        self.ttl, self.delay = ttl, delay
+        self.logins = self.refreshes = 0
+        self.fail = False
+        self.refresh_fails = False
+
+    def generateSession(self, client_code, password, totp):
+        time.sleep(self.delay)
+        self.logins += 1
+        if self.fail:
+            return {"status": False, "message": "Invalid totp", "errorcode": "AB1050", "data": None}
+        return {"status": True, "data": {"jwtToken": f"Bearer {jwt(time.time() + self.ttl)}", "refreshToken": "r",
+                                         "feedToken": f"feed-{self.logins}"}}
+
+    def generateToken(self, refresh_token):
+        self.refreshes += 1
+        if self.refresh_fails:
+            raise ConnectionError("reset")
+        return {"status": True, "data": {"jwtToken": jwt(time.time() + self.ttl), "feedToken": f"feed-r{self.refreshes}"}}
+
+
+def manager(api, **kwargs):
+    return SessionManager(api, client_code="C1", password="pw", totp_secret=SECRET, **kwargs)
+
+
+def test_jwt_expiry_and_auth_errors():
+    assert jwt_expiry(f"Bearer {jwt(1234)}") == jwt_expiry(jwt(1234)) == 1234
+    assert jwt_expiry("not-a-jwt") is None
+    assert is_auth_error({"status": False, "errorcode": "AG8001", "message": "Invalid Token"})
+    assert is_auth_error({"status": False, "errorcode": "", "message": "Invalid Token"})
+    assert not is_auth_error({"status": False, "errorcode": "AB1019", "message": "Access denied because of exceeding access rate"})
+    assert not is_auth_error({"status": True, "data": {}})
+
+
+def test_concurrent_callers_share_one_login():
+    api = Api()
+    sessions = manager(api)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sessions.ensure())) for _ in range(20)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert api.logins == 1
+    assert len(results) == 20 and all(r is results[0] for r in results)
+    assert sessions.counters["shared"] > 0
+    assert 3500 < sessions.stats()["expires_in"] <= 3600 # from the JWT's exp claim
+
+    async def many():
+        return await asyncio.gather(*(sessions.ensure_async() for _ in range(10)))
+    assert all(r is results[0] for r in asyncio.run(many()))
+    assert api.logins == 1
+
+
+def test_invalidate_only_drops_the_session_it_names():
+    api = Api(delay=0)
+    sessions = manager(api)
+    old = sessions.ensure()["jwtToken"]
+    sessions.invalidate(old)
+    new = sessions.ensure()["jwtToken"]
+    assert api.logins == 2
+    sessions.invalidate(old) # a late auth error from a request that used the old token
+    assert sessions.valid and sessions.ensure()["jwtToken"] == new
+    assert api.logins == 2
+
+
+def test_failed_logins_back_off():
+    api = Api(delay=0)
+    api.fail = True
+    sessions = manager(api)
+    with pytest.raises(SessionError, match="Invalid totp"):
+        sessions.ensure()
+    with pytest.raises(SessionError, match="backing off"):
+        sessions.ensure()
+    assert api.logins == 1 and sessions.stats()["failures"] == 1
+    api.fail = False
+    assert sessions.login()["feedToken"] == "feed-2" # an explicit login skips the backoff
+    with pytest.raises(SessionError, match="Missing credentials"):
+        SessionManager(Api(), client_code="C1", password="", totp_secret=SECRET).ensure()
+
+
+def test_refresh_keeps_the_refresh_token_and_tells_listeners():
+    api = Api(delay=0)
+    sessions = manager(api)
+    seen = []
+    sessions.on_session(lambda data, feed_changed: seen.append((data["feedToken"], feed_changed)))
+    sessions.ensure()
+    session = sessions.refresh()
+    assert api.refreshes == 1 and api.logins == 1
+    assert session["jwtToken"].startswith("Bearer ") and session["refreshToken"] == "r"
+    assert seen == [("feed-1", True), ("feed-r1", True)]
+
+    api.refresh_fails = True
+    sessions.refresh() # falls back to a full login
+    assert api.logins == 2 and seen[-1] == ("feed-2", True)
+
+
+def test_background_refresh_ahead_of_expiry():
+    api = Api(ttl=5, delay=0)
+    sessions = manager(api, refresh_ahead=4.9) # due 0.1s after each login/refresh
+    sessions.ensure()
+    sessions.start()
+    deadline = time.time() + 3
+    while api.refreshes < 2 and time.time() < deadline:
+        time.sleep(0.02)
+    assert api.refreshes >= 2 and api.logins == 1
+    api.ttl = 3600 # let the daemon thread go back to sleep
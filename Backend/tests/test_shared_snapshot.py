@@ -0,0 +1,162 @@
+import struct
+import threading
+import multiprocessing
+
+from market_store import MarketStore
+from shared_snapshot import SharedSnapshotWriter, SharedSnapshotReader, SEQ_OFFSET
+
+
+def table(n, stamp=0):
+    store = MarketStore()
+    store.update_rows([{"symbol": f"SYM{i}", "strength_score": float(i % 97), "stamp": stamp} for i in range(n)])
+    return store
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "snap.bin")
+    store = table(50)
+    writer = SharedSnapshotWriter(path)
+    reader = SharedSnapshotReader(path)
+    assert reader.publish().version == 0 # nothing published yet
+
+    snap = store.publish()
+    writer.write(snap, {"scanner": "Running"})
+    got = reader.publish()
+    assert got.version == snap.version
+    assert got.rows == snap.rows
+    assert got.encoded == snap.encoded
+    assert got.row_versions == snap.row_versions
+    assert got.origin == store.origin
+    assert reader.status == {"scanner": "Running"}
+    assert reader.alive
+    writer.close()
+
+
+def test_status_is_only_built_for_a_new_version(tmp_path):
+    path = str(tmp_path / "snap.bin")
+    store = table(5)
+    writer = SharedSnapshotWriter(path)
+    built = []
+    for _ in range(3):
+        writer.write(store.publish(), lambda: built.append(1) or {"n": len(built)})
+    assert built == [1]
+    store.update_fields("SYM1", {"strength_score": 99.0})
+    writer.write(store.publish(), lambda: built.append(1) or {"n": len(built)})
+    reader = SharedSnapshotReader(path)
+    assert reader.publish().version == store.version
+    assert reader.status == {"n": 2}
+    writer.close()
+
+
+def test_reader_keeps_the_last_snapshot_while_a_write_is_open(tmp_path):
+    path = str(tmp_path / "snap.bin")
+    store = table(5)
+    writer = SharedSnapshotWriter(path)
+    writer.write(store.publish())
+    reader = SharedSnapshotReader(path)
+    first = reader.publish()
+
+    # A writer that died (or is still copying) between the two seq bumps
+    struct.pack_into("<Q", writer._map, SEQ_OFFSET, writer.seq + 1)
+    assert reader.publish() is first
+    assert reader.retries > 0
+
+    store.update_fields("SYM2", {"strength_score": 50.0})
+    writer.write(store.publish()) # completes with an even seq again
+    assert reader.publish().version == store.version
+    writer.close()
+
+
+def test_file_growth_and_scanner_restart(tmp_path):
+    path = str(tmp_path / "snap.bin")
+    writer = SharedSnapshotWriter(path, initial_size=256)
+    reader = SharedSnapshotReader(path)
+    big = table(2000)
+    writer.write(big.publish())
+    assert len(reader.publish().rows) == 2000
+
+    # A restarted scanner starts over at a lower version on a new file
+    writer.close()
+    writer = SharedSnapshotWriter(path)
+    small = table(3, stamp=1)
+    writer.write(small.publish())
+    snap = reader.publish()
+    assert snap.version == small.version
+    assert [row['stamp'] for row in snap.rows] == [1, 1, 1]
+    writer.close()
+
+
+def test_concurrent_reader_never_sees_a_torn_snapshot(tmp_path):
+    path = str(tmp_path / "snap.bin")
+    store = table(300)
+    writer = SharedSnapshotWriter(path, initial_size=1024)
+    writer.write(store.publish())
+    done = threading.Event()
+
+    def write():
+        for stamp in range(1, 300):
+            store.update_many_fields({f"SYM{i}": {"stamp": stamp} for i in range(300)})
+            writer.write(store.publish())
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    reader = SharedSnapshotReader(path)
+    seen = set()
+    while not done.is_set():
+        snap = reader.publish()
+        stamps = {row['stamp'] for row in snap.rows}
+        assert len(stamps) == 1 # every row from the same write
+        assert len(snap.rows) == 300
+        seen.add(snap.version)
+    thread.join()
+    assert reader.publish().version == store.version
+    assert len(seen) > 1
+    writer.close()
+
+
+def _write_varying_sizes(path, ready, count):
+    writer = SharedSnapshotWriter(path, initial_size=1 << 20)
+    stores = [table(n, stamp=n) for n in (10, 400, 37, 1200)]
+    ready.set()
+    for i in range(count):
+        store = stores[i % len(stores)]
+        store.update_fields("SYM1", {"strength_score": float(i)})
+        writer.write(store.publish())
+    writer.close()
+
+
+def test_payload_length_changes_under_a_writer_process(tmp_path):
+    """A reader racing a writer in another process (the scanner/api split) never decodes a mixed header."""
+    path = str(tmp_path / "snap.bin")
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    proc = ctx.Process(target=_write_varying_sizes, args=(path, ready, 3000))
+    proc.start()
+    assert ready.wait(30)
+    reader = SharedSnapshotReader(path)
+    reads = 0
+    while proc.is_alive():
+        snap = reader.publish()
+        if snap.rows:
+            assert {row['stamp'] for row in snap.rows} == {len(snap.rows)}
+            reads += 1
+    proc.join()
+    assert proc.exitcode == 0
+    assert reads
+
+
+def test_a_bad_copy_is_retried_not_raised(tmp_path):
+    path = str(tmp_path / "snap.bin")
+    store = table(5)
+    writer = SharedSnapshotWriter(path)
+    writer.write(store.publish())
+    reader = SharedSnapshotReader(path)
+    first = reader.publish()
+
+    # A consistent-looking header over a payload that does not decode
+    writer._map[64:96] = b"\x00garbage" * 4
+    struct.pack_into("<QQQ", writer._map, SEQ_OFFSET, writer.seq + 2, 32, first.version + 1)
+    assert reader.publish() is first
+    assert reader.retries > 0
+    writer.close()
@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+import fake_smartapi
+from api_scheduler import SmartApiScheduler, is_rate_limit_error
+from quotes import fetch_quotes_async
+from smartapi_async import AsyncSmartApi, SmartApiError
+
+
+def client(transport=None):
+    return AsyncSmartApi("key", root_url="http://fake", transport=transport or httpx.ASGITransport(app=fake_smartapi.app))
+
+
+def run(scenario):
+    """Runs scenario(api) against the fake server and closes the client."""
+    async def go():
+        api = client()
+        try:
+            return await scenario(api)
+        finally:
+            await api.aclose()
+    return asyncio.run(go())
+
+
+def test_login_adopts_the_session():
+    async def scenario(api):
+        res = await api.login("C1", "pw", "123456")
+        assert res['status'] and res['data']['jwtToken'] == f"Bearer {api.jwt_token}"
+        assert api.client_code == "C1" and api.feed_token == "feed-token"
+        refreshed = await api.generate_token()
+        assert refreshed['status'] and api.jwt_token.startswith("jwt-refreshed-")
+    run(scenario)
+
+
+def test_login_rejected():
+    async def scenario(api):
+        res = await api.login("C1", "pw", "")
+        assert res['status'] is False and res['errorcode'] == "AB1050"
+        assert api.jwt_token is None
+    run(scenario)
+
+
+def test_candles_and_ltp():
+    to_date = datetime.now()
+    params = {"exchange": "NSE", "symboltoken": "2885", "interval": "ONE_DAY", "fromdate": (to_date - timedelta(days=30)).strftime("%Y-%m-%d %H:%M"),
+              "todate": to_date.strftime("%Y-%m-%d %H:%M"), "unused": None}
+
+    async def scenario(api):
+        return await api.get_candle_data(params), await api.ltp_data("NSE", "SBIN-EQ", "3045")
+
+    candles, ltp = run(scenario)
+    assert candles['data'] == [c for c in fake_smartapi.synthetic_candles("2885") if c[0][:10] >= params["fromdate"][:10]]
+    assert len(candles['data'][0]) == 6
+    assert ltp['data']['symboltoken'] == "3045" and ltp['data']['tradingsymbol'] == "SBIN-EQ"
+
+
+def test_quotes_are_batched_50_per_request():
+    instruments = [("NSE", str(t)) for t in range(5000, 5120)] + [("NFO", "40001")]
+    scheduler = SmartApiScheduler(limits={}, initial_concurrency=4)
+    before = fake_smartapi.app.state.calls.get("quote", 0)
+
+    async def scenario(api):
+        return await fetch_quotes_async(api, scheduler, instruments, mode="FULL")
+
+    quotes = run(scenario)
+    assert fake_smartapi.app.state.calls["quote"] - before == 3
+    assert set(quotes) == set(instruments)
+    assert quotes[("NFO", "40001")]['symboltoken'] == "40001"
+    assert "tradeVolume" in quotes[("NSE", "5000")]
+
+
+def test_rate_limited_responses(monkeypatch):
+    monkeypatch.setattr(fake_smartapi, "RATE_LIMIT", 2)
+    monkeypatch.setattr(fake_smartapi, "_windows", {})
+
+    async def scenario(api):
+        return [await api.get_market_data("LTP", {"NSE": ["2885"]}) for _ in range(5)]
+
+    responses = run(scenario)
+    limited = [r for r in responses if r['status'] is False]
+    assert limited and all(r['errorcode'] == "AB1019" and is_rate_limit_error(r) for r in limited)
+    assert responses[0]['status'] # the first call of a window always goes through
+
+
+def test_non_json_and_transport_errors_raise():
+    def plain_text(request):
+        return httpx.Response(429, text="Too many requests")
+
+    def unreachable(request):
+        raise httpx.ConnectError("Name or service not known", request=request)
+
+    async def call(transport):
+        api = client(transport)
+        try:
+            await api.get_market_data("LTP", {"NSE": ["2885"]})
+        finally:
+            await api.aclose()
+
+    with pytest.raises(SmartApiError) as e:
+        asyncio.run(call(httpx.MockTransport(plain_text)))
+    assert "HTTP 429" in str(e.value) and is_rate_limit_error(e.value) # the scheduler still backs off
+    with pytest.raises(SmartApiError, match="quote: Name or service not known"):
+        asyncio.run(call(httpx.MockTransport(unreachable)))
@@ -0,0 +1,81 @@
+import pytest
+
+from replay import FakeWebSocket
+from subscriptions import SubscriptionManager, LTP, QUOTE, SNAP_QUOTE, NSE_CM, NSE_FO
+
+
+class CountingWebSocket(FakeWebSocket):
+    """Keeps the fake's subscribed set and logs every request sent."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def subscribe(self, correlation_id, mode, token_list):
+        self.requests.append(("subscribe", mode, token_list))
+        super().subscribe(correlation_id, mode, token_list)
+
+    def unsubscribe(self, correlation_id, mode, token_list):
+        self.requests.append(("unsubscribe", mode, token_list))
+        super().unsubscribe(correlation_id, mode, token_list)
+
+
+@pytest.fixture
+def manager():
+    m = SubscriptionManager(batch_size=3)
+    m.attach(CountingWebSocket())
+    m.on_connected()
+    return m
+
+
+def test_only_deltas_are_sent(manager):
+    ws = manager.ws
+    manager.set_group("scanner", ["1", "2", "3", "4"], NSE_CM, QUOTE)
+    assert ws.subscribed == {(NSE_CM, t): QUOTE for t in "1234"}
+    assert [len(r[2][0]["tokens"]) for r in ws.requests] == [3, 1] # batched
+    ws.requests.clear()
+
+    manager.set_group("scanner", ["2", "3", "4", "5"], NSE_CM, QUOTE)
+    assert ws.requests == [("unsubscribe", QUOTE, [{"exchangeType": NSE_CM, "tokens": ["1"]}]),
+                           ("subscribe", QUOTE, [{"exchangeType": NSE_CM, "tokens": ["5"]}])]
+    ws.requests.clear()
+    manager.set_group("scanner", ["5", "4", "3", "2"], NSE_CM, QUOTE)
+    assert ws.requests == []
+
+
+def test_shared_tokens_take_the_richest_mode(manager):
+    ws = manager.ws
+    manager.set_group("scanner", ["1", "2"], NSE_CM, LTP)
+    manager.set_group("watch", ["2"], NSE_CM, SNAP_QUOTE)
+    manager.set_group("options:NIFTY", ["2"], NSE_FO, SNAP_QUOTE) # same number, other segment
+    assert ws.subscribed == {(NSE_CM, "1"): LTP, (NSE_CM, "2"): SNAP_QUOTE, (NSE_FO, "2"): SNAP_QUOTE}
+
+    manager.drop_group("watch")
+    assert ws.subscribed[(NSE_CM, "2")] == LTP # back down to what is still wanted
+    manager.drop_group("options:NIFTY")
+    assert set(ws.subscribed) == {(NSE_CM, "1"), (NSE_CM, "2")}
+    assert manager.stats()["by_mode"] == {f"exchange_{NSE_CM}_mode_{LTP}": 2}
+
+
+def test_reconnect_subscribes_everything_again(manager):
+    manager.set_group("scanner", ["1", "2"], NSE_CM, QUOTE)
+    manager.on_disconnected()
+    manager.set_group("watch", ["9"], NSE_CM, LTP) # remembered while disconnected
+    assert manager.stats()["active"] == 0 and manager.stats()["wanted"] == 3
+
+    fresh = CountingWebSocket()
+    manager.attach(fresh)
+    manager.on_connected()
+    assert fresh.subscribed == {(NSE_CM, "1"): QUOTE, (NSE_CM, "2"): QUOTE, (NSE_CM, "9"): LTP}
+    assert all(action == "subscribe" for action, _, _ in fresh.requests)
+
+
+def test_failed_send_is_retried_on_the_next_sync(manager):
+    ws = manager.ws
+    real = ws.subscribe
+    ws.subscribe = lambda *args: (_ for _ in ()).throw(ConnectionError("socket closed"))
+    manager.set_group("scanner", ["1"], NSE_CM, QUOTE)
+    assert manager.stats()["active"] == 0
+    ws.subscribe = real
+    manager.sync()
+    assert ws.subscribed == {(NSE_CM, "1"): QUOTE}
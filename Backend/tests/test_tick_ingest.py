@@ -0,0 +1,55 @@
+import time
+import threading
+
+from tick_ingest import TickIngestor
+from subscriptions import NSE_CM
+
+
+def tick(token, ltp, exchange_type=NSE_CM):
+    return {"exchange_type": exchange_type, "token": token, "last_traded_price": ltp}
+
+
+def test_drain_keeps_the_last_tick_per_token():
+    ingestor = TickIngestor(lambda batch: None)
+    for i in range(10):
+        ingestor.push(tick("2885", 100 + i))
+        ingestor.push(tick("2885", 500 + i, exchange_type=2)) # same token number, other segment
+    ingestor.push(tick("1594", 7))
+    batch = ingestor.drain()
+    assert set(batch) == {(NSE_CM, "2885"), (2, "2885"), (NSE_CM, "1594")}
+    assert batch[(NSE_CM, "2885")]["last_traded_price"] == 109
+    assert batch[(2, "2885")]["last_traded_price"] == 509
+    assert ingestor.drain() == {}
+
+
+def test_full_buffer_drops_the_oldest():
+    ingestor = TickIngestor(lambda batch: None, capacity=5)
+    for i in range(8):
+        ingestor.push(tick(str(i), i))
+    assert ingestor.stats()["dropped"] == 3 and ingestor.stats()["queue_depth"] == 5
+    assert sorted(t for _, t in ingestor.drain()) == ["3", "4", "5", "6", "7"]
+
+
+def test_consumer_applies_coalesced_batches():
+    applied, done = {}, threading.Event()
+
+    def apply(batch):
+        applied.update(batch)
+        if batch.get((NSE_CM, "last")): done.set()
+        if (NSE_CM, "bad") in batch: raise ValueError("bad tick") # logged, the consumer keeps going
+
+    ingestor = TickIngestor(apply, interval=0.01)
+    ingestor.start()
+    ingestor.push(tick("bad", 1))
+    time.sleep(0.05)
+    for i in range(1000):
+        ingestor.push(tick(str(i % 10), i))
+    ingestor.push(tick("last", 1))
+    assert done.wait(2)
+    ingestor.stop()
+    ingestor._thread.join(1) # counters are written after apply returns
+    assert applied[(NSE_CM, "9")]["last_traded_price"] == 999
+    stats = ingestor.stats()
+    assert stats["received"] == 1002 and stats["dropped"] == 0 and stats["queue_depth"] == 0
+    assert stats["applied"] + stats["coalesced"] == 1002
+    assert stats["applied"] < 1002 # ticks were coalesced, not applied one by one
@@ -0,0 +1,88 @@
+import time
+import threading
+import collections
+import logging
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("TickIngest")
+
+
+class TickIngestor:
+    """
+    Decouples the websocket thread from the market table.
+    - push() runs on the websocket thread: one append to a bounded ring buffer, nothing else
+    - a consumer thread drains the buffer every `interval` seconds, keeps only the
+      last tick per (exchange_type, token) and hands the batch to `apply_batch`
+    - when the buffer is full the oldest tick is dropped and counted
+    """
+
+    def __init__(self, apply_batch, capacity=100_000, interval=0.05):
+        self.apply_batch = apply_batch # callable({(exchange_type, token): tick})
+        self.interval = interval
+        self._buffer = collections.deque(maxlen=capacity)
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Written by the websocket thread only
+        self.received = 0
+        self.dropped = 0
+        # Written by the consumer thread only
+        self.applied = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.ticks_per_sec = 0.0
+
+    def push(self, tick):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(tick)
+        self.received += 1
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="TickIngest")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def drain(self):
+        """Pops everything buffered so far and returns the last tick per token."""
+        latest = {}
+        for _ in range(len(self._buffer)):
+            tick = self._buffer.popleft()
+            latest[(tick.get('exchange_type'), tick.get('token'))] = tick
+        return latest
+
+    def _run(self):
+        last_received, last_time = self.received, time.monotonic()
+        while not self._stop.wait(self.interval):
+            batch = self.drain()
+            if batch:
+                try:
+                    self.apply_batch(batch)
+                except Exception as e:
+                    logger.error(f"Tick batch failed: {e}")
+                self.applied += len(batch)
+                self.batches += 1
+                self.last_batch_size = len(batch)
+
+            now = time.monotonic()
+            if now - last_time >= 1.0:
+                rate = (self.received - last_received) / (now - last_time)
+                self.ticks_per_sec = 0.7 * self.ticks_per_sec + 0.3 * rate
+                last_received, last_time = self.received, now
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "applied": self.applied,
+            "coalesced": max(0, self.received - self.dropped - self.applied - len(self._buffer)),
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "queue_depth": len(self._buffer),
+            "ticks_per_sec": round(self.ticks_per_sec, 1),
+        }
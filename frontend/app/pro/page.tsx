@@ -1,8 +1,8 @@
 "use client";
 
-import { useEffect, useState, useMemo } from "react";
-import axios from "axios";
+import { useState, useMemo } from "react";
 import { Filter, ArrowUpDown, Brain, TrendingUp, TrendingDown, Minus, Activity, ArrowUp, ArrowDown, X, SlidersHorizontal } from "lucide-react";
+import { useGodModeStream } from "@/lib/useGodModeStream";
 
 export default function ProScannerPage() {
     const [data, setData] = useState<any[]>([]);
@@ -38,23 +38,11 @@ export default function ProScannerPage() {
 
     const API_URL = "http://localhost:8000";
 
-    useEffect(() => {
-        fetchData();
-        const interval = setInterval(fetchData, 5000); // Poll every 5s
-        return () => clearInterval(interval);
-    }, []);
-
-    const fetchData = async () => {
-        try {
-            const res = await axios.get(`${API_URL}/god-mode`);
-            if (res.data.status === "success") {
-                setData(res.data.data);
-                setLoading(false);
-            }
-        } catch (err) {
-            console.error("Failed to fetch", err);
-        }
-    };
+    // Snapshot + per-symbol deltas pushed by the backend (replaces 5s polling)
+    useGodModeStream(API_URL, (rows) => {
+        setData(rows);
+        setLoading(false);
+    });
 
     // Handler for Column Header Clicks
     const handleSort = (key: string) => {
@@ -3,6 +3,7 @@
 import { useEffect, useState } from "react";
 import axios from "axios";
 import { TrendingUp, RefreshCw, Zap, ArrowUpDown, Info } from "lucide-react";
+import { useGodModeStream } from "@/lib/useGodModeStream";
 
 interface StockData {
     token: string;
@@ -97,10 +98,11 @@ export default function MarketPlusPage() {
 
     useEffect(() => {
         fetchData();
-        const interval = setInterval(() => fetchData(true), 5000);
-        return () => clearInterval(interval);
     }, []);
 
+    // Live updates pushed by the backend (replaces 5s polling)
+    useGodModeStream(API_URL, setData);
+
     const MomentumRunners = () => {
         const gainers = [...data].filter(i => i.change_pct > 0).sort((a, b) => b.change_pct - a.change_pct).slice(0, 4);
         const losers = [...data].filter(i => i.change_pct < 0).sort((a, b) => a.change_pct - b.change_pct).slice(0, 4);
@@ -3,6 +3,7 @@
 import { useEffect, useState } from "react";
 import axios from "axios";
 import { RefreshCw, AlertCircle, ShieldCheck, TrendingUp, TrendingDown, Minus } from "lucide-react";
+import { useGodModeStream } from "@/lib/useGodModeStream";
 
 export default function StrengthPage() {
     const [data, setData] = useState<any[]>([]);
@@ -42,19 +43,15 @@ export default function StrengthPage() {
     const API_URL = "http://localhost:8000";
 
     // Auto-check login status on mount
-    // Auto-check login status on mount & Start Polling
     useEffect(() => {
         fetchGodMode();
+    }, []);
 
-        // Poll every 1 second for Real-Time updates
-        const interval = setInterval(() => {
-            if (isLoggedIn) {
-                fetchGodMode(true); // Silent refresh
-            }
-        }, 1000);
-
-        return () => clearInterval(interval);
-    }, [isLoggedIn]);
+    // Real-Time updates pushed by the backend once logged in (replaces 1s polling)
+    useGodModeStream(API_URL, (rows) => {
+        setData(rows);
+        setLastUpdated(new Date().toLocaleTimeString());
+    }, isLoggedIn);
 
     const handleLogin = async () => {
         setLoading(true);
@@ -0,0 +1,42 @@
+"use client";
+
+import { useEffect, useRef } from "react";
+
+/**
+ * Subscribes to the backend's /god-mode/stream Server-Sent Events feed.
+ * The first "snapshot" event carries every row; "delta" events carry only the
+ * rows that changed, which are merged by symbol. `onUpdate` always receives the
+ * full table sorted by strength score, same as /god-mode.
+ */
+export function useGodModeStream(apiUrl: string, onUpdate: (rows: any[]) => void, enabled = true) {
+    const onUpdateRef = useRef(onUpdate);
+    onUpdateRef.current = onUpdate;
+
+    useEffect(() => {
+        if (!enabled) return;
+
+        const rows = new Map<string, any>();
+        const source = new EventSource(`${apiUrl}/god-mode/stream`);
+
+        const publish = () => {
+            const sorted = Array.from(rows.values()).sort((a, b) => b.strength_score - a.strength_score);
+            onUpdateRef.current(sorted);
+        };
+
+        source.addEventListener("snapshot", (e) => {
+            rows.clear();
+            for (const row of JSON.parse((e as MessageEvent).data).data) rows.set(row.symbol, row);
+            publish();
+        });
+
+        source.addEventListener("delta", (e) => {
+            for (const row of JSON.parse((e as MessageEvent).data).data) rows.set(row.symbol, row);
+            publish();
+        });
+
+        // EventSource reconnects on its own and the server starts again with a snapshot
+        source.onerror = (err) => console.error("God-mode stream error", err);
+
+        return () => source.close();
+    }, [apiUrl, enabled]);
+}